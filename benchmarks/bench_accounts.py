@@ -0,0 +1,61 @@
+"""
+Multi-account login throughput against the local stand-in servers.
+
+    python -m benchmarks.bench_accounts --accounts 200 --workers 16 --otp-delay 0.5
+
+Logs every account in through one AccountManager and reports wall time, logins per
+second, per-login latency percentiles and how many threads the client side needed
+(the stand-in servers run a thread per connection, those aren't counted).
+"""
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import wait
+
+from src.accounts import AccountManager
+
+from .bench_login import percentile
+from .standin import StandIn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--otp-delay", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added per ERP request")
+    args = parser.parse_args()
+
+    from iitkgp_erp_login.logger import logger
+    logger.setLevel(logging.WARNING)
+
+    with StandIn(accounts=args.accounts, otp_delay=args.otp_delay, latency=args.latency) as standin:
+        manager = AccountManager(max_workers=args.workers, client_factory=standin.client)
+        for creds in standin.accounts:
+            manager.add(creds)
+
+        latencies = []
+        peak_threads = 0
+        start = time.perf_counter()
+        futures = manager.login_all()
+        for future in futures.values():
+            future.add_done_callback(lambda f, t0=start: latencies.append(time.perf_counter() - t0))
+        pending = set(futures.values())
+        while pending:
+            done, pending = wait(pending, timeout=0.1)
+            client_threads = sum(1 for t in threading.enumerate() if t.name.startswith("erp-account"))
+            peak_threads = max(peak_threads, client_threads)
+        elapsed = time.perf_counter() - start
+        ok = sum(1 for f in futures.values() if not f.exception() and f.result())
+        manager.stop()
+
+    print(f"{args.accounts} accounts, {args.workers} workers: {ok} logged in in {elapsed:.2f}s "
+          f"({ok / elapsed:.1f} logins/s)")
+    print(f"time to logged in: p50 {percentile(latencies, 50):.2f}s  p95 {percentile(latencies, 95):.2f}s  "
+          f"p99 {percentile(latencies, 99):.2f}s")
+    print(f"peak client threads: {peak_threads}")
+
+
+if __name__ == "__main__":
+    main()
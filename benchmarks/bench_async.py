@@ -0,0 +1,84 @@
+"""
+Many logins and keepalive probes on one asyncio event loop, against the local stand-ins.
+
+    python -m benchmarks.bench_async --accounts 50 --probes 5000 --otp-delay 0.5
+
+Logs every account in concurrently with AsyncERPClient, then probes the sessions
+``--probes`` times in total (bypassing the probe cache) and reports wall time, latency
+percentiles and peak Python memory (the stand-in servers share the process, so that
+figure includes them).
+"""
+import argparse
+import asyncio
+import logging
+import time
+import tracemalloc
+
+from .bench_login import percentile
+from .standin import StandIn
+
+
+async def run(standin: StandIn, probes: int, concurrency: int):
+    clients = [standin.async_client() for _ in standin.accounts]
+
+    async def login(client, creds):
+        t0 = time.perf_counter()
+        ok = await client.login_with_credentials(creds)
+        return ok, time.perf_counter() - t0
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login(c, creds) for c, creds in zip(clients, standin.accounts)),
+                                   return_exceptions=True)
+    login_elapsed = time.perf_counter() - start
+    login_times = [r[1] for r in results if isinstance(r, tuple) and r[0]]
+    login_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+
+    gate = asyncio.Semaphore(concurrency)
+    probe_times = []
+
+    async def probe(client):
+        async with gate:
+            t0 = time.perf_counter()
+            alive = await client.is_session_alive(max_age=0)
+            probe_times.append(time.perf_counter() - t0)
+            return alive
+
+    start = time.perf_counter()
+    alive = await asyncio.gather(*(probe(clients[i % len(clients)]) for i in range(probes)))
+    probe_elapsed = time.perf_counter() - start
+    probe_memory = tracemalloc.get_traced_memory()[1]
+
+    for client in clients:
+        await client.close()
+    return login_elapsed, login_times, login_memory, probe_elapsed, probe_times, sum(alive), probe_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--probes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200, help="probes in flight at once")
+    parser.add_argument("--otp-delay", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added per ERP request")
+    args = parser.parse_args()
+
+    from iitkgp_erp_login.logger import logger
+    logger.setLevel(logging.WARNING)
+
+    with StandIn(accounts=args.accounts, otp_delay=args.otp_delay, latency=args.latency) as standin:
+        tracemalloc.start()
+        (login_elapsed, login_times, login_memory, probe_elapsed, probe_times,
+         alive, probe_memory) = asyncio.run(run(standin, args.probes, args.concurrency))
+        tracemalloc.stop()
+
+    print(f"{len(login_times)}/{args.accounts} logged in in {login_elapsed:.2f}s  "
+          f"p50 {percentile(login_times, 50):.2f}s  p95 {percentile(login_times, 95):.2f}s  "
+          f"peak {login_memory / 1e6:.1f} MB")
+    print(f"{args.probes} probes ({alive} alive) in {probe_elapsed:.2f}s = {args.probes / probe_elapsed:.0f}/s  "
+          f"p50 {percentile(probe_times, 50) * 1000:.1f}ms  p99 {percentile(probe_times, 99) * 1000:.1f}ms  "
+          f"peak {probe_memory / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
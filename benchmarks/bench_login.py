@@ -0,0 +1,145 @@
+"""
+End-to-end login latency against the local stand-in servers.
+
+    python -m benchmarks.bench_login --runs 50 --otp-delay 0.5 --latency 0.05 --failure-rate 0.02
+
+Reports p50/p95/p99 per login stage and overall, failures by stage, and the HTTP request,
+retry and timeout counters. --metrics PATH also writes what the spans collected, in the
+Prometheus text format the app exports. Latency and failure rate apply to every ERP route unless given
+per route as route=value (routes: homepage, question, otp, signin, welcome), e.g.
+``--latency otp=0.4 --latency 0.05``.
+"""
+import argparse
+import logging
+import time
+from collections import defaultdict
+
+from src.transport import TransportMetrics
+
+from .standin import StandIn
+
+# Status messages from ERPClient.login_with_credentials that open each stage. The token,
+# question and mailbox stages run together, so they show up as one "pre_otp" stage
+STAGE_MARKERS = [
+    ("Initiating login", "prelogin"),
+    ("Connecting to mailbox", "pre_otp"),
+    ("Requesting OTP", "request_otp"),
+    ("Listening for new OTP", "otp_wait"),
+    ("Submitting valid OTP", "signin"),
+]
+STAGES = [name for _, name in STAGE_MARKERS] + ["total"]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def _route_values(items: list[str]) -> float | dict:
+    if not items:
+        return 0.0
+    values = {}
+    for item in items:
+        route, sep, value = item.rpartition("=")
+        values[route if sep else "*"] = float(value)
+    return values if set(values) != {"*"} else values["*"]
+
+
+class StageTimer:
+    """Turns the status callback into stage boundaries."""
+
+    def __init__(self):
+        self.marks: list[tuple[str, float]] = []
+
+    def __call__(self, message: str):
+        for marker, stage in STAGE_MARKERS:
+            if message.startswith(marker):
+                self.marks.append((stage, time.perf_counter()))
+                return
+
+    def durations(self, end: float) -> dict[str, float]:
+        out = {}
+        for (stage, start), (_, stop) in zip(self.marks, self.marks[1:] + [("", end)]):
+            out[stage] = stop - start
+        if self.marks:
+            out["total"] = end - self.marks[0][1]
+        return out
+
+    @property
+    def current(self) -> str:
+        return self.marks[-1][0] if self.marks else "prelogin"
+
+
+def run(args) -> dict:
+    samples = defaultdict(list)
+    failures = defaultdict(int)
+    metrics = TransportMetrics()
+    erp_options = dict(otp_delay=args.otp_delay, latency=_route_values(args.latency),
+                       failure_rate=_route_values(args.failure_rate), seed=args.seed)
+
+    with StandIn(idle=not args.no_idle, imap_latency=args.imap_latency, **erp_options) as standin:
+        creds = standin.creds()
+        for _ in range(args.runs):
+            client = standin.client()
+            client.session.metrics = client.metrics = metrics
+            timer = StageTimer()
+            try:
+                ok = client.login_with_credentials(creds, status_callback=timer)
+            except Exception:
+                ok = False
+            end = time.perf_counter()
+            if not ok:
+                failures[timer.current] += 1
+                continue
+            for stage, seconds in timer.durations(end).items():
+                samples[stage].append(seconds)
+        imap_logins = standin.imap.logins
+
+    return {"samples": samples, "failures": failures, "imap_logins": imap_logins, "http": metrics.snapshot()}
+
+
+def report(result: dict, runs: int):
+    samples, failures = result["samples"], result["failures"]
+    print(f"{runs} logins, {len(samples['total'])} ok, {sum(failures.values())} failed, "
+          f"{result['imap_logins']} IMAP logins")
+    print(f"{'stage':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'failed':>8}")
+    for stage in STAGES:
+        values = samples.get(stage, [])
+        print(f"{stage:<14}" + "".join(f"{percentile(values, p) * 1000:>10.1f}" for p in (50, 95, 99))
+              + f"{failures.get(stage, 0):>8}")
+    print()
+    print(f"{'http stage':<14}" + "".join(f"{kind:>10}" for kind in TransportMetrics.KINDS))
+    for stage, counts in sorted(result["http"].items()):
+        print(f"{stage:<14}" + "".join(f"{counts[kind]:>10}" for kind in TransportMetrics.KINDS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--otp-delay", type=float, default=0.5, help="seconds between OTP request and mail delivery")
+    parser.add_argument("--latency", action="append", default=[], help="seconds added per ERP request [route=]value")
+    parser.add_argument("--failure-rate", action="append", default=[], help="fraction of ERP requests that 503 [route=]value")
+    parser.add_argument("--imap-latency", type=float, default=0.0, help="seconds added per IMAP command")
+    parser.add_argument("--no-idle", action="store_true", help="stand-in IMAP server without IDLE support")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--metrics", help="write the span metrics (Prometheus text format) here")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        from iitkgp_erp_login.logger import logger
+        logger.setLevel(logging.WARNING)
+    report(run(args), args.runs)
+    if args.metrics:
+        from src.telemetry import TELEMETRY
+        TELEMETRY.write_prometheus(args.metrics)
+        p95 = {stage: TELEMETRY.quantile(stage, 0.95) for stage in ("login", "otp_wait")}
+        print(f"\nspan p95: login {p95['login'] or 0:.2f}s, otp_wait {p95['otp_wait'] or 0:.2f}s "
+              f"(from histogram buckets), written to {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Bytes and CPU per OTP extraction: full RFC822 download vs BODYSTRUCTURE + BODY.PEEK.
+
+    python -m benchmarks.bench_otp_extract [--mails 200] [--rounds 20]
+"""
+import argparse
+import email
+import time
+
+from src.otp_extract import MAX_BODY_BYTES, extract_otp, fetch_item, pick_text_part
+
+from .mailcorpus import body_section, bodystructure, corpus
+
+
+def legacy_extract(raw: bytes):
+    """What ERPClient did before: parse the whole message and take the last digit token."""
+    msg = email.message_from_bytes(raw)
+    body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            if part.get_content_type() == "text/plain":
+                body = part.get_payload(decode=True).decode()
+                break
+    else:
+        body = msg.get_payload(decode=True).decode()
+    parts = [p for p in body.split() if p.isdigit()]
+    return parts[-1] if parts else None
+
+
+def partial_extract(structure_line: bytes, section: bytes):
+    structure = fetch_item([structure_line], "BODYSTRUCTURE")
+    part = pick_text_part(structure)
+    return extract_otp(section, part) if part else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mails", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    mails = corpus(args.mails)
+    legacy_inputs = []
+    partial_inputs = []
+    for otp, msg in mails:
+        legacy_inputs.append((otp, msg.as_bytes()))
+        structure_line = f"1 (UID 1 BODYSTRUCTURE {bodystructure(msg)})".encode()
+        part = pick_text_part(fetch_item([structure_line], "BODYSTRUCTURE"))
+        section = body_section(msg, part.spec)[:MAX_BODY_BYTES] if part else b""
+        partial_inputs.append((otp, structure_line, section))
+
+    def run(label, fn, inputs, wire_bytes):
+        correct = 0
+        start = time.process_time()
+        for _ in range(args.rounds):
+            correct = sum(1 for item in inputs if fn(*item[1:]) == item[0])
+        cpu = (time.process_time() - start) / (args.rounds * len(inputs))
+        print(f"{label:<10} {wire_bytes / len(inputs):>10.0f} B/mail {cpu * 1e6:>10.1f} us/mail"
+              f"   {correct}/{len(inputs)} OTPs found")
+
+    print(f"{len(mails)} mails, {args.rounds} rounds")
+    run("rfc822", legacy_extract, legacy_inputs, sum(len(raw) for _, raw in legacy_inputs))
+    run("partial", partial_extract, partial_inputs,
+        sum(len(line) + len(section) for _, line, section in partial_inputs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Bytes and wall time per session probe, for each probe mode, logged in and logged out.
+
+    python -m benchmarks.bench_probe [--probes 200] [--latency 0.02]
+"""
+import argparse
+import logging
+import time
+
+import requests
+
+from src.probe import PROBE_MODES, probe_session
+
+from .bench_login import percentile
+from .standin import StandIn
+
+
+class ByteCounter:
+    """Response hook adding up what the client actually read: status line, headers, body."""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, r, *args, **kwargs):
+        self.total += len(f"HTTP/1.1 {r.status_code} {r.reason}\r\n")
+        self.total += sum(len(k) + len(v) + 4 for k, v in r.headers.items()) + 2
+        raw_read = r.raw.read
+
+        def counting_read(*a, **kw):
+            data = raw_read(*a, **kw)
+            self.total += len(data or b"")
+            return data
+
+        r.raw.read = counting_read
+        return r
+
+
+def measure(session: requests.Session, mode: str, probes: int) -> tuple[list[float], float, bool]:
+    counter = ByteCounter()
+    session.hooks["response"] = [counter]
+    times = []
+    result = None
+    for _ in range(probes):
+        start = time.perf_counter()
+        result = probe_session(session, mode)
+        times.append(time.perf_counter() - start)
+    session.hooks["response"] = []
+    return times, counter.total / probes, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added per ERP request")
+    args = parser.parse_args()
+
+    from iitkgp_erp_login.logger import logger
+    logger.setLevel(logging.WARNING)
+
+    with StandIn(otp_delay=0.05, latency=args.latency) as standin:
+        client = standin.client()
+        client.login_with_credentials(standin.creds())
+        logged_out = requests.Session()
+        standin.route(logged_out)
+
+        print(f"{args.probes} probes per row")
+        print(f"{'state':<12}{'mode':<8}{'bytes/probe':>12}{'p50 ms':>9}{'p95 ms':>9}  result")
+        for state, session in (("logged in", client.session), ("logged out", logged_out)):
+            for mode in PROBE_MODES:
+                times, per_probe, result = measure(session, mode, args.probes)
+                print(f"{state:<12}{mode:<8}{per_probe:>12.0f}{percentile(times, 50) * 1000:>9.2f}"
+                      f"{percentile(times, 95) * 1000:>9.2f}  {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+sessionToken extraction: full BeautifulSoup parse vs the streaming scanner.
+
+    python -m benchmarks.bench_token [--kb 80] [--rounds 50]
+
+"bs4" is what iitkgp_erp_login does: read the whole homepage and parse it. "stream" feeds
+the page in CHUNK_SIZE pieces and stops once the hidden input has gone past. "fallback" is
+a page the fast path can't read (the token on a non-input tag), so it pays for both. The
+"http" rows fetch the token from the stand-in ERP over loopback, end to end.
+"""
+import argparse
+import secrets
+import time
+
+import iitkgp_erp_login.erp as erp
+from bs4 import BeautifulSoup as bs
+
+from src.session_token import CHUNK_SIZE, get_sessiontoken, scan_session_token
+
+from .fake_erp import _LOGIN_PAGE, HOMEPAGE_URL, homepage_markup
+from .standin import StandIn
+
+
+def chunked(page: bytes):
+    for i in range(0, len(page), CHUNK_SIZE):
+        yield page[i:i + CHUNK_SIZE]
+
+
+def full_parse(page: bytes):
+    return bs(page.decode(), 'html.parser').find(id='sessionToken')['value'], len(page)
+
+
+def stream(page: bytes):
+    scanner = scan_session_token(chunked(page))
+    return scanner.token, scanner.bytes_read
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", type=int, default=80, help="homepage size")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    token = secrets.token_hex(20)
+    before, after = homepage_markup(args.kb)
+    page = _LOGIN_PAGE.format(before=before, after=after, token=token, home=HOMEPAGE_URL).encode()
+    odd_page = page.replace(b"<input type=\"hidden\" id=\"sessionToken\"", b"<button id=\"sessionToken\"")
+
+    print(f"homepage {len(page) / 1024:.0f} KiB, {args.rounds} rounds")
+    print(f"{'':<10}{'bytes read':>12}{'ms/page':>10}")
+
+    def run(label, fn, html):
+        start = time.process_time()
+        for _ in range(args.rounds):
+            found, read = fn(html)
+        ms = (time.process_time() - start) / args.rounds * 1000
+        status = "" if found == token else "   token NOT found"
+        print(f"{label:<10}{read:>12}{ms:>10.2f}{status}")
+
+    run("bs4", full_parse, page)
+    run("stream", stream, page)
+    run("fallback", stream, odd_page)
+
+    with StandIn(homepage_kb=args.kb) as standin:
+        session = standin.client().session
+        for label, fn in (("http bs4", erp.get_sessiontoken), ("http stream", get_sessiontoken)):
+            fn(session)  # warm the connection pool
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                fn(session)
+            ms = (time.perf_counter() - start) / args.rounds * 1000
+            print(f"{label:<22}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Vault unlock and save cost for each KDF setting.
+
+    python -m benchmarks.bench_vault --saves 20
+
+Unlock has to derive the key, so its cost is the KDF's. A save with the key cached at
+unlock only encrypts and writes; "save (re-derive)" is what every save used to cost.
+Saves are flushed straight away, so the numbers include the fsync'd write. "burst" is
+--saves set_state calls in a row, which the write-behind queue turns into one write.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from src.encryption import make_fernet
+from src.storage import StorageManager
+
+SETTINGS = {
+    "pbkdf2 100k": {"name": "pbkdf2-sha256", "iterations": 100_000},
+    "pbkdf2 480k": {"name": "pbkdf2-sha256", "iterations": 480_000},
+    "pbkdf2 1.2M": {"name": "pbkdf2-sha256", "iterations": 1_200_000},
+    "scrypt 2^14": {"name": "scrypt", "n": 2 ** 14, "r": 8, "p": 1},
+    "scrypt 2^15": {"name": "scrypt", "n": 2 ** 15, "r": 8, "p": 1},
+}
+
+CREDS = {
+    "roll_number": "21CS10000",
+    "erp_password": "hunter2",
+    "security_answers": {"q1": "a1", "q2": "a2", "q3": "a3"},
+    "google_email": "someone@gmail.com",
+    "google_app_password": "abcd efgh ijkl mnop",
+}
+PIN = "123456"
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saves", type=int, default=20)
+    parser.add_argument("--unlocks", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'kdf':<14}{'unlock ms':>12}{'save ms':>12}{'save (re-derive) ms':>22}{'burst ms':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, kdf in SETTINGS.items():
+            path = os.path.join(tmp, f"{label.replace(' ', '_')}.json")
+            storage = StorageManager(path, kdf=kdf)
+            storage.init_vault(PIN)
+            storage.save_credentials(PIN, CREDS)
+
+            unlock = timed(lambda: StorageManager(path, kdf=kdf).unlock(PIN), args.unlocks)
+            def save():
+                storage.save_credentials(PIN, CREDS)
+                storage.flush()
+
+            def rederive_and_save():
+                storage._fernet = make_fernet(PIN, storage._salt, storage._vault_kdf)
+                save()
+
+            def burst():
+                for i in range(args.saves):
+                    storage.set_state("imap", {"uidnext": i})
+                storage.flush()
+
+            save_time = timed(save, args.saves)
+            rederive = timed(rederive_and_save, args.unlocks)
+            burst_time = timed(burst, 1)
+            print(f"{label:<14}{unlock * 1000:>12.1f}{save_time * 1000:>12.2f}{rederive * 1000:>22.1f}"
+                  f"{burst_time * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
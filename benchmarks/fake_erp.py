@@ -0,0 +1,307 @@
+"""
+An in-process stand-in for erp.iitkgp.ac.in, serving the endpoints the login flow touches.
+
+Paths come from ``iitkgp_erp_login.endpoints``; requests for the real host are routed here by
+mounting ``StandInAdapter`` on a ``requests.Session``. On a successful OTP request the OTP mail
+is delivered to a ``FakeIMAPServer`` after ``otp_delay`` seconds. Every route can be given extra
+latency and a failure rate (503s) to see how the client copes.
+"""
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import iitkgp_erp_login.erp_responses as erp_responses
+from iitkgp_erp_login.endpoints import HOMEPAGE_URL, LOGIN_URL, OTP_URL, SECRET_QUESTION_URL, WELCOMEPAGE_URL
+from iitkgp_erp_login.erp import session_alive
+from requests.adapters import HTTPAdapter
+
+from .mailcorpus import otp_message
+
+ERP_ORIGIN = "https://erp.iitkgp.ac.in"
+# What the installed library's session_alive() treats as "logged in", taken from the
+# library itself (not from src.probe) so bench_probe notices if the two ever disagree
+WELCOME_LENGTH = int(next(c for c in session_alive.__code__.co_consts if isinstance(c, str) and c.isdigit()))
+
+HOMEPAGE_PATH = urlsplit(HOMEPAGE_URL).path
+WELCOMEPAGE_PATH = urlsplit(WELCOMEPAGE_URL).path
+LOGIN_PATH = urlsplit(LOGIN_URL).path
+SECRET_QUESTION_PATH = urlsplit(SECRET_QUESTION_URL).path
+OTP_PATH = urlsplit(OTP_URL).path
+REDIRECT_PATH = "/SSOAdministration/ssoRedirect.htm"
+
+JSID_COOKIE = "JSID#/IIT_ERP3"
+
+# Route names used for latency / failure injection
+ROUTES = {
+    HOMEPAGE_PATH: "homepage",
+    WELCOMEPAGE_PATH: "welcome",
+    LOGIN_PATH: "signin",
+    SECRET_QUESTION_PATH: "question",
+    OTP_PATH: "otp",
+    REDIRECT_PATH: "signin",
+}
+
+_LOGIN_PAGE = (
+    "<!DOCTYPE html><html><head><title>IIT Kharagpur | ERP</title>"
+    "<link rel=\"stylesheet\" href=\"/IIT_ERP3/css/bootstrap.min.css\"></head><body>"
+    "{before}<form id=\"loginFrm\" method=\"post\" action=\"/SSOAdministration/auth.htm\">"
+    "<input type=\"hidden\" id=\"sessionToken\" name=\"sessionToken\" value=\"{token}\">"
+    "<input type=\"hidden\" id=\"requestedUrl\" name=\"requestedUrl\" value=\"{home}\">"
+    "<input type=\"text\" id=\"user_id\" name=\"user_id\"><input type=\"password\" id=\"password\" name=\"password\">"
+    "</form>{after}</body></html>"
+)
+
+# Roughly the real login page: menus and scripts above the form, notices and footer below
+_NAV_ITEM = "<li class=\"nav-item\"><a class=\"nav-link\" href=\"/IIT_ERP3/menu{i}.htm\">Menu item {i}</a></li>"
+_NOTICE = (
+    "<tr class=\"notice\"><td>{i}</td><td><a href=\"/IIT_ERP3/notices/{i}.pdf\" target=\"_blank\">"
+    "Notice {i} regarding academic matters</a></td><td><span class=\"badge\">new</span></td></tr>"
+)
+
+
+def homepage_markup(kb: int) -> tuple[str, str]:
+    """Tag-heavy filler of about ``kb`` KiB in total, split into (before the form, after it)."""
+    def fill(template, size):
+        parts, n, i = [], 0, 0
+        while n < size:
+            part = template.format(i=i)
+            parts.append(part)
+            n += len(part)
+            i += 1
+        return "".join(parts)
+
+    size = max(0, kb * 1024 - 600)
+    before = "<nav><ul class=\"navbar-nav\">" + fill(_NAV_ITEM, size // 3) + "</ul></nav>"
+    after = "<table class=\"notices\"><tbody>" + fill(_NOTICE, size - size // 3) + "</tbody></table>"
+    return before, after
+
+
+class Account:
+    def __init__(self, roll: str, password: str, answers: dict[str, str], email_addr: str):
+        self.roll = roll
+        self.password = password
+        self.answers = answers
+        self.email = email_addr
+
+
+class FakeERPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, imap=None, host: str = "127.0.0.1", port: int = 0, otp_delay: float = 0.5,
+                 latency: float | dict = 0.0, failure_rate: float | dict = 0.0, session_ttl: float | None = None,
+                 homepage_kb: int = 80, seed: int | None = None):
+        super().__init__((host, port), _Handler)
+        self.imap = imap
+        self.otp_delay = otp_delay
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.session_ttl = session_ttl
+        self.homepage_filler = homepage_markup(homepage_kb)
+        self.rng = random.Random(seed)
+
+        self.accounts: dict[str, Account] = {}
+        self.pending_otp: dict[str, str] = {}  # roll -> OTP
+        self.sessions: dict[str, tuple[str, float]] = {}  # ssoToken -> (roll, issued at)
+        self.hits: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_account(self, roll: str, password: str, answers: dict[str, str], email_addr: str, app_password: str = "app-pass"):
+        self.accounts[roll] = Account(roll, password, answers, email_addr)
+        if self.imap is not None:
+            self.imap.add_account(email_addr, app_password)
+
+    def expire_sessions(self):
+        """Logs everyone out, as the ERP does when it restarts."""
+        with self._lock:
+            self.sessions.clear()
+
+    def start(self) -> "FakeERPServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Probes hang up before reading the body on purpose, that's not an error here
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def _setting(self, value, route: str) -> float:
+        if isinstance(value, dict):
+            return value.get(route, value.get("*", 0.0))
+        return value
+
+    def session_for(self, sso: str | None) -> str | None:
+        with self._lock:
+            entry = self.sessions.get(sso) if sso else None
+            if entry is None:
+                return None
+            roll, issued = entry
+            if self.session_ttl is not None and time.monotonic() - issued > self.session_ttl:
+                del self.sessions[sso]
+                return None
+            return roll
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _cookies(self) -> dict[str, str]:
+        jar = {}
+        for header in self.headers.get_all("Cookie") or []:
+            for pair in header.split(";"):
+                name, _, value = pair.strip().partition("=")
+                if name:
+                    jar[name] = value
+        return jar
+
+    def _form(self) -> dict[str, str]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        return {k: v[-1] for k, v in parse_qs(body, keep_blank_values=True).items()}
+
+    def _reply(self, status: int, body: bytes | str = b"", content_type: str = "text/html;charset=UTF-8",
+               headers: list[tuple[str, str]] = ()):
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _inject(self, route: str) -> bool:
+        """Applies configured latency; returns True if this request should fail."""
+        server = self.server
+        with server._lock:
+            server.hits[route] = server.hits.get(route, 0) + 1
+        delay = server._setting(server.latency, route)
+        if delay:
+            time.sleep(delay)
+        rate = server._setting(server.failure_rate, route)
+        if rate and server.rng.random() < rate:
+            self._reply(503, "<html><body>Service Temporarily Unavailable</body></html>")
+            return True
+        return False
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = ROUTES.get(url.path, "other")
+        if self._inject(route):
+            return
+
+        if url.path == HOMEPAGE_PATH:
+            query = parse_qs(url.query)
+            if "ssoToken" in query and self.server.session_for(query["ssoToken"][0]):
+                sso = query["ssoToken"][0]
+                self._reply(200, "<html><body>ERP Dashboard</body></html>", headers=[
+                    ("Set-Cookie", f"ssoToken={sso}; Path=/"),
+                    ("Set-Cookie", f"{JSID_COOKIE}={secrets.token_hex(16).upper()}; Path=/IIT_ERP3"),
+                ])
+                return
+            page = _LOGIN_PAGE.format(before=self.server.homepage_filler[0], after=self.server.homepage_filler[1], token=secrets.token_hex(20),
+                                      home=HOMEPAGE_URL)
+            self._reply(200, page, headers=[("Set-Cookie", f"JSESSIONID={secrets.token_hex(16).upper()}; Path=/")])
+        elif url.path == WELCOMEPAGE_PATH:
+            if self.server.session_for(self._cookies().get("ssoToken")):
+                body = b"<html><body>Welcome to ERP</body></html>"
+                self._reply(200, body + b" " * (WELCOME_LENGTH - len(body)))
+            else:
+                self._reply(302, headers=[("Location", HOMEPAGE_URL)])
+        elif url.path == REDIRECT_PATH:
+            sso = parse_qs(url.query).get("ssoToken", [""])[0]
+            self._reply(302, headers=[("Location", f"{HOMEPAGE_URL}?ssoToken={sso}")])
+        else:
+            self._reply(404, "Not Found")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        route = ROUTES.get(url.path, "other")
+        form = self._form()
+        if self._inject(route):
+            return
+        server = self.server
+
+        if url.path == SECRET_QUESTION_PATH:
+            account = server.accounts.get(form.get("user_id", ""))
+            if account is None:
+                self._reply(200, "FALSE", content_type="text/plain")
+            else:
+                self._reply(200, server.rng.choice(list(account.answers)), content_type="text/plain")
+        elif url.path == OTP_PATH:
+            account = server.accounts.get(form.get("user_id", ""))
+            if account is None or form.get("password") != account.password:
+                msg = erp_responses.PASSWORD_MISMATCH_ERROR
+            elif form.get("answer") not in account.answers.values():
+                msg = erp_responses.ANSWER_MISMATCH_ERROR
+            else:
+                otp = f"{server.rng.randrange(10 ** 5, 10 ** 6)}"
+                with server._lock:
+                    server.pending_otp[account.roll] = otp
+                if server.imap is not None:
+                    server.imap.deliver(account.email, otp_message(otp, to=account.email), server.otp_delay)
+                msg = erp_responses.OTP_SENT_MESSAGE
+            self._reply(200, json.dumps({"msg": msg}), content_type="application/json")
+        elif url.path == LOGIN_PATH:
+            roll = form.get("user_id", "")
+            with server._lock:
+                expected = server.pending_otp.get(roll)
+                ok = expected is not None and form.get("email_otp") == expected
+                if ok:
+                    del server.pending_otp[roll]
+                    sso = secrets.token_hex(32)
+                    server.sessions[sso] = (roll, time.monotonic())
+            if not ok:
+                self._reply(200, f"<html><body>{erp_responses.OTP_MISMATCH_ERROR}</body></html>")
+                return
+            self._reply(302, headers=[("Location", f"{ERP_ORIGIN}{REDIRECT_PATH}?ssoToken={sso}")])
+        else:
+            self._reply(404, "Not Found")
+
+
+class StandInAdapter(HTTPAdapter):
+    """Sends requests for the real ERP origin to a local stand-in, keeping URLs (and cookies) as-is."""
+
+    def __init__(self, target: str, origin: str = ERP_ORIGIN, **kwargs):
+        super().__init__(**kwargs)
+        self.origin = origin
+        self.target = target.rstrip("/")
+
+    def send(self, request, **kwargs):
+        original = request
+        if request.url.startswith(self.origin):
+            request = request.copy()
+            request.url = self.target + request.url[len(self.origin):]
+        response = super().send(request, **kwargs)
+        response.url = original.url
+        response.request = original
+        return response
+
+
+def route_to(session, server: FakeERPServer):
+    """Points a requests.Session at the stand-in instead of erp.iitkgp.ac.in."""
+    session.mount(ERP_ORIGIN, StandInAdapter(server.url))
@@ -0,0 +1,284 @@
+"""
+A small in-process IMAP4rev1 server with just enough of the protocol for the OTP listener.
+
+Plain TCP on localhost, one INBOX per login, IDLE (optional), UID SEARCH/FETCH/STORE with
+BODYSTRUCTURE and partial BODY[] sections. Mail is "delivered" with ``deliver()``, optionally
+after a delay, and idling clients are woken with an untagged EXISTS like Gmail does.
+"""
+import socket
+import socketserver
+import threading
+import time
+from email.message import Message
+
+from src.otp_extract import parse_response
+
+from .mailcorpus import body_section, bodystructure
+
+
+class Mailbox:
+    def __init__(self, uidvalidity: int = 1):
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.messages: list[dict] = []
+        self.cond = threading.Condition()
+
+    def append(self, msg: Message):
+        with self.cond:
+            self.messages.append({"uid": self.uidnext, "msg": msg, "raw": msg.as_bytes(), "flags": set()})
+            self.uidnext += 1
+            self.cond.notify_all()
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, idle: bool = True, latency: float = 0.0):
+        super().__init__((host, port), _Handler)
+        self.idle = idle
+        self.latency = latency
+        self.mailboxes: dict[str, Mailbox] = {}
+        self.passwords: dict[str, str] = {}
+        self.logins = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def add_account(self, user: str, password: str) -> Mailbox:
+        with self._lock:
+            self.passwords[user] = password
+            return self.mailboxes.setdefault(user, Mailbox())
+
+    def deliver(self, user: str, msg: Message, delay: float = 0.0):
+        """Drops ``msg`` into the user's INBOX, now or ``delay`` seconds from now."""
+        mailbox = self.mailboxes[user]
+        if delay > 0:
+            timer = threading.Timer(delay, mailbox.append, (msg,))
+            timer.daemon = True
+            timer.start()
+        else:
+            mailbox.append(msg)
+
+    def start(self) -> "FakeIMAPServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _flatten(tokens):
+    for token in tokens:
+        if isinstance(token, list):
+            yield from _flatten(token)
+        else:
+            yield token
+
+
+def _in_set(value: int, spec: str, largest: int) -> bool:
+    for piece in spec.split(","):
+        lo, _, hi = piece.partition(":")
+        lo = largest if lo == "*" else int(lo)
+        hi = lo if not hi else (largest if hi == "*" else int(hi))
+        if min(lo, hi) <= value <= max(lo, hi):
+            return True
+    return False
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.user = None
+        self.mailbox: Mailbox = None
+        self.known = 0  # messages this client has been told about
+
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode()
+        self.wfile.write(line + b"\r\n")
+
+    def handle(self):
+        caps = "IMAP4rev1 UIDPLUS" + (" IDLE" if self.server.idle else "")
+        self.send(f"* OK [CAPABILITY {caps}] fake IMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.rstrip(b"\r\n").partition(b" ")
+            command, _, args = rest.partition(b" ")
+            tag = tag.decode()
+            command = command.decode().upper()
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            try:
+                if command == "UID":
+                    sub, _, args = args.partition(b" ")
+                    done = self.dispatch(tag, sub.decode().upper(), args, by_uid=True)
+                else:
+                    done = self.dispatch(tag, command, args, by_uid=False)
+            except Exception as e:
+                self.send(f"{tag} BAD {e}")
+                continue
+            if done:
+                return
+
+    def dispatch(self, tag, command, args, by_uid):
+        tokens = parse_response(args)
+        if command == "CAPABILITY":
+            self.send("* CAPABILITY IMAP4rev1 UIDPLUS" + (" IDLE" if self.server.idle else ""))
+        elif command == "LOGIN":
+            user, password = tokens[0], tokens[1]
+            if self.server.passwords.get(user) != password:
+                self.send(f"{tag} NO [AUTHENTICATIONFAILED] Invalid credentials")
+                return False
+            self.user = user
+            self.server.logins += 1
+        elif command in ("SELECT", "EXAMINE"):
+            self.mailbox = self.server.mailboxes[self.user]
+            with self.mailbox.cond:
+                self.known = len(self.mailbox.messages)
+            self.send(f"* FLAGS (\\Answered \\Flagged \\Draft \\Deleted \\Seen)")
+            self.send(f"* {self.known} EXISTS")
+            self.send(f"* OK [UIDVALIDITY {self.mailbox.uidvalidity}] UIDs valid")
+            self.send(f"* OK [UIDNEXT {self.mailbox.uidnext}] Predicted next UID")
+            self.send(f"{tag} OK [READ-WRITE] {command} completed")
+            return False
+        elif command == "STATUS":
+            box = self.server.mailboxes[self.user]
+            self.send(f'* STATUS "INBOX" (UIDNEXT {box.uidnext} UIDVALIDITY {box.uidvalidity})')
+        elif command == "NOOP":
+            self.report_new()
+        elif command == "IDLE" and self.server.idle:
+            self.idle()
+        elif command == "SEARCH":
+            self.send("* SEARCH " + " ".join(str(n) for n in self.search(tokens, by_uid)))
+        elif command == "FETCH":
+            self.fetch(tokens, by_uid)
+        elif command == "STORE":
+            self.store(tokens, by_uid)
+        elif command == "EXPUNGE":
+            self.expunge()
+        elif command == "CLOSE":
+            self.expunge(quiet=True)
+            self.mailbox = None
+        elif command == "LOGOUT":
+            self.send("* BYE logging out")
+            self.send(f"{tag} OK LOGOUT completed")
+            return True
+        else:
+            self.send(f"{tag} BAD unknown command {command}")
+            return False
+        self.send(f"{tag} OK {command} completed")
+        return False
+
+    def report_new(self):
+        with self.mailbox.cond:
+            count = len(self.mailbox.messages)
+        if count != self.known:
+            self.known = count
+            self.send(f"* {count} EXISTS")
+
+    def idle(self):
+        self.send("+ idling")
+        self.wfile.flush()
+        sock = self.connection
+        while True:
+            with self.mailbox.cond:
+                if len(self.mailbox.messages) == self.known:
+                    self.mailbox.cond.wait(0.05)
+            self.report_new()
+            sock.settimeout(0)
+            try:
+                peek = sock.recv(1, socket.MSG_PEEK)
+            except BlockingIOError:
+                peek = None
+            finally:
+                sock.settimeout(None)
+            if peek is not None:
+                line = self.rfile.readline()
+                if not line or line.strip().upper() == b"DONE":
+                    return
+
+    def selected(self, spec: str, by_uid: bool):
+        messages = self.mailbox.messages
+        if by_uid:
+            largest = messages[-1]["uid"] if messages else 0
+            return [(i + 1, m) for i, m in enumerate(messages) if _in_set(m["uid"], spec, largest)]
+        return [(i + 1, m) for i, m in enumerate(messages) if _in_set(i + 1, spec, len(messages))]
+
+    def search(self, tokens, by_uid):
+        flat = [t for t in _flatten(tokens) if not isinstance(t, bytes)]
+        with self.mailbox.cond:
+            matches = list(enumerate(self.mailbox.messages, 1))
+            i = 0
+            while i < len(flat):
+                key = str(flat[i]).upper()
+                if key == "UID":
+                    wanted = {id(m) for _, m in self.selected(flat[i + 1], True)}
+                    matches = [(n, m) for n, m in matches if id(m) in wanted]
+                    i += 2
+                elif key in ("FROM", "SUBJECT"):
+                    needle = flat[i + 1].lower()
+                    matches = [(n, m) for n, m in matches if needle in (m["msg"][key] or "").lower()]
+                    i += 2
+                elif key in ("SINCE", "BEFORE", "ON"):
+                    i += 2  # every message in here is recent
+                else:
+                    i += 1
+        return [m["uid"] if by_uid else n for n, m in matches]
+
+    def fetch(self, tokens, by_uid):
+        spec, items = tokens[0], tokens[1] if isinstance(tokens[1], list) else tokens[1:]
+        with self.mailbox.cond:
+            selected = self.selected(spec, by_uid)
+        for seq, m in selected:
+            out = [f"UID {m['uid']}".encode()]
+            for item in items:
+                name = item.upper()
+                if name == "BODYSTRUCTURE":
+                    out.append(b"BODYSTRUCTURE " + bodystructure(m["msg"]).encode())
+                elif name in ("RFC822", "BODY[]", "BODY.PEEK[]"):
+                    out.append(b"RFC822 {%d}\r\n" % len(m["raw"]) + m["raw"])
+                elif name.startswith(("BODY[", "BODY.PEEK[")):
+                    section = name[name.index("[") + 1:name.index("]")]
+                    data = body_section(m["msg"], section)
+                    label = f"BODY[{section}]"
+                    partial = name[name.index("]") + 1:]
+                    if partial.startswith("<"):
+                        start, _, length = partial[1:-1].partition(".")
+                        data = data[int(start):int(start) + int(length)] if length else data[int(start):]
+                        label += f"<{start}>"
+                    out.append(f"{label} {{{len(data)}}}\r\n".encode() + data)
+                elif name == "FLAGS":
+                    out.append(f"FLAGS ({' '.join(sorted(m['flags']))})".encode())
+            self.wfile.write(f"* {seq} FETCH (".encode() + b" ".join(out) + b")\r\n")
+
+    def store(self, tokens, by_uid):
+        spec, mode, flags = tokens[0], tokens[1].upper(), tokens[2]
+        flags = set(flags if isinstance(flags, list) else [flags])
+        with self.mailbox.cond:
+            for seq, m in self.selected(spec, by_uid):
+                if mode.startswith("+"):
+                    m["flags"] |= flags
+                elif mode.startswith("-"):
+                    m["flags"] -= flags
+                else:
+                    m["flags"] = set(flags)
+
+    def expunge(self, quiet: bool = False):
+        with self.mailbox.cond:
+            messages = self.mailbox.messages
+            for seq in range(len(messages), 0, -1):
+                if "\\Deleted" in messages[seq - 1]["flags"]:
+                    del messages[seq - 1]
+                    if not quiet:
+                        self.send(f"* {seq} EXPUNGE")
+            self.known = len(messages)
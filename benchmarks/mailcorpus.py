@@ -0,0 +1,122 @@
+"""Real-shaped ERP OTP mails, plus the bits of IMAP (BODYSTRUCTURE, BODY[n]) a server derives from them."""
+import os
+import random
+from email.message import EmailMessage, Message
+from email.utils import formatdate, make_msgid
+
+OTP_SUBJECT = "OTP for Sign In in ERP Portal of IIT Kharagpur"
+OTP_FROM = "ERP IIT Kharagpur <erpnoreply@iitkgp.ac.in>"
+
+_PLAIN = (
+    "Dear {name},\n\n"
+    "An OTP(valid for a short time) has been sent to your email id registered with ERP, IIT Kharagpur.\n"
+    "Your OTP for Sign In in ERP Portal of IIT Kharagpur is\n\n"
+    "{otp}\n\n"
+    "Please do not share this OTP with anyone.\n\n"
+    "Regards,\nERP Team, IIT Kharagpur\n"
+)
+
+_HTML = (
+    "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><style>body{{font-family:Arial}} "
+    ".otp{{font-size:22px;letter-spacing:4px}}</style></head><body>"
+    "<table width=\"100%\" cellpadding=\"0\" cellspacing=\"0\"><tr><td>"
+    "<img src=\"cid:logo\" alt=\"IIT Kharagpur\" width=\"120\"></td></tr>"
+    "<tr><td><p>Dear&nbsp;{name},</p><p>An OTP(valid for a short time) has been sent to your email id "
+    "registered with ERP, IIT Kharagpur.</p><p>Your OTP for Sign In in ERP Portal of IIT Kharagpur is</p>"
+    "<p class=\"otp\"><b>{otp}</b></p><p>Please do not share this OTP with anyone.</p>"
+    "<p>Regards,<br>ERP Team, IIT Kharagpur</p></td></tr></table></body></html>"
+)
+
+
+def _base(otp: str, to: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = OTP_SUBJECT
+    msg["From"] = OTP_FROM
+    msg["To"] = to
+    msg["Date"] = formatdate(localtime=True)
+    msg["Message-ID"] = make_msgid(domain="iitkgp.ac.in")
+    for i in range(12):
+        # Gmail stacks a pile of Received/ARC/DKIM headers on every delivered mail
+        msg[f"X-Received-{i}"] = f"by 2002:a05:{i:04x}:0:b0:3a1::{i:x} with SMTP id {random.getrandbits(64):x}"
+    return msg
+
+
+def otp_message(otp: str, shape: str = "alternative", to: str = "student@gmail.com", name: str = "Student") -> Message:
+    """Builds one OTP mail. ``shape`` is plain, plain-qp, alternative, html-only or mixed."""
+    msg = _base(otp, to)
+    text = _PLAIN.format(name=name, otp=otp)
+    markup = _HTML.format(name=name, otp=otp)
+
+    if shape == "plain":
+        msg.set_content(text, cte="7bit")
+    elif shape == "plain-qp":
+        msg.set_content(text, cte="quoted-printable")
+    elif shape == "html-only":
+        msg.set_content(markup, subtype="html", cte="base64")
+    elif shape in ("alternative", "mixed"):
+        msg.set_content(text, cte="quoted-printable")
+        msg.add_alternative(markup, subtype="html", cte="base64")
+        if shape == "mixed":
+            html_part = msg.get_payload()[1]
+            html_part.add_related(os.urandom(24 * 1024), "image", "png", cid="<logo>")
+            msg.add_attachment(os.urandom(60 * 1024), maintype="application", subtype="pdf",
+                               filename="ERP_Notice.pdf")
+    else:
+        raise ValueError(f"unknown shape {shape!r}")
+    return msg
+
+
+def corpus(count: int = 50, seed: int = 7) -> list[tuple[str, Message]]:
+    """A mix of shapes as they show up in real inboxes. Returns (otp, message) pairs."""
+    rng = random.Random(seed)
+    shapes = ["alternative"] * 5 + ["plain-qp"] * 2 + ["html-only"] * 2 + ["plain", "mixed"]
+    mails = []
+    for _ in range(count):
+        otp = f"{rng.randrange(10 ** 5, 10 ** 6)}"
+        mails.append((otp, otp_message(otp, rng.choice(shapes))))
+    return mails
+
+
+def _quote(value) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _encoded_payload(part: Message) -> bytes:
+    payload = part.get_payload(decode=False)
+    if isinstance(payload, str):
+        return payload.encode("utf-8", "surrogateescape")
+    return payload or b""
+
+
+def bodystructure(msg: Message) -> str:
+    """The BODYSTRUCTURE an IMAP server would report for ``msg``."""
+    if msg.is_multipart():
+        children = "".join(bodystructure(p) for p in msg.get_payload())
+        return f"({children} {_quote(msg.get_content_subtype())})"
+
+    params = []
+    for key, value in msg.get_params(header="content-type")[1:]:
+        params += [_quote(key), _quote(value)]
+    params_s = "(" + " ".join(params) + ")" if params else "NIL"
+    cte = (msg.get("Content-Transfer-Encoding") or "7bit").lower()
+    body = _encoded_payload(msg)
+    out = (f"({_quote(msg.get_content_maintype())} {_quote(msg.get_content_subtype())} {params_s} "
+           f"{_quote(msg.get('Content-ID'))} NIL {_quote(cte)} {len(body)}")
+    if msg.get_content_maintype() == "text":
+        out += " " + str(body.count(b"\n"))
+    return out + ")"
+
+
+def body_section(msg: Message, spec: str) -> bytes:
+    """The raw (still transfer-encoded) bytes of ``BODY[spec]``."""
+    part = msg
+    for index in spec.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(index) - 1]
+        elif index != "1":
+            raise KeyError(spec)
+    if part.is_multipart():
+        return part.as_bytes().split(b"\n\n", 1)[-1]
+    return _encoded_payload(part)
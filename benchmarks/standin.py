@@ -0,0 +1,80 @@
+"""Wires the fake ERP and fake IMAP servers together and hands out clients pointed at them."""
+from .fake_erp import FakeERPServer, route_to
+from .fake_imap import FakeIMAPServer
+
+QUESTIONS = {
+    "What is your pet's name?": "tommy",
+    "In which city were you born?": "kharagpur",
+    "What was the name of your first school?": "kv",
+}
+
+
+class StandIn:
+    """
+    Both stand-in servers plus any number of test accounts.
+
+        with StandIn(otp_delay=0.3) as standin:
+            client = standin.client()
+            client.login_with_credentials(standin.creds())
+    """
+
+    def __init__(self, accounts: int = 1, idle: bool = True, imap_latency: float = 0.0, **erp_options):
+        self.imap = FakeIMAPServer(idle=idle, latency=imap_latency)
+        self.erp = FakeERPServer(imap=self.imap, **erp_options)
+        self.accounts = []
+        for i in range(accounts):
+            self.add_account(f"21CS{10000 + i}")
+
+    def add_account(self, roll: str) -> dict:
+        creds = {
+            "roll_number": roll,
+            "erp_password": f"pw-{roll}",
+            "security_answers": dict(QUESTIONS),
+            "google_email": f"{roll.lower()}@gmail.com",
+            "google_app_password": "abcd efgh ijkl mnop",
+        }
+        self.erp.add_account(roll, creds["erp_password"], creds["security_answers"],
+                             creds["google_email"], creds["google_app_password"])
+        self.accounts.append(creds)
+        return creds
+
+    def creds(self, index: int = 0) -> dict:
+        return dict(self.accounts[index])
+
+    def imap_options(self) -> dict:
+        return {"host": "127.0.0.1", "port": self.imap.port, "use_ssl": False}
+
+    def route(self, session):
+        route_to(session, self.erp)
+
+    def client(self):
+        """A fresh ERPClient that talks to the stand-ins instead of the real ERP and Gmail."""
+        from src.erp_client import ERPClient
+
+        client = ERPClient()
+        self.route(client.session)
+        client.imap_options = self.imap_options()
+        return client
+
+    def async_client(self):
+        """A fresh AsyncERPClient pointed at the stand-ins. Create it inside the event loop."""
+        from src.async_client import AsyncERPClient
+
+        client = AsyncERPClient(origin=self.erp.url)
+        client.imap_options = self.imap_options()
+        return client
+
+    def start(self) -> "StandIn":
+        self.imap.start()
+        self.erp.start()
+        return self
+
+    def stop(self):
+        self.erp.stop()
+        self.imap.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -9,7 +9,7 @@ pip install pyinstaller
 
 echo Step 2: Building erp.exe...
 :: Windows uses ; for path separators in PyInstaller
-pyinstaller --noconfirm --onedir --windowed --name "erp" --icon "assets/logo.png" --add-data "assets;assets" --add-data "src;src" --collect-all customtkinter main.py
+pyinstaller --noconfirm --onedir --windowed --noupx --name "erp" --icon "assets/logo.png" --add-data "assets;assets" --add-data "src;src" --collect-all customtkinter main.py
 
 echo.
 echo ==========================================
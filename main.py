@@ -1,23 +1,88 @@
 import sys
+import time
+_STARTED = time.perf_counter()
 import logging
-from src.app import ERPApp
+import os
+
+def _option(name):
+    """The value after ``name`` (or in ``name=value``) on the command line, if given."""
+    for i, arg in enumerate(sys.argv):
+        if arg == name and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+        if arg.startswith(name + "="):
+            return arg[len(name) + 1:]
+    return None
 
 def main():
     debug_mode = "--debug" in sys.argv
     level = logging.DEBUG if debug_mode else logging.INFO
-    
+
     # Configure logging to show in terminal
     logging.basicConfig(
         level=level,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         stream=sys.stdout
     )
-    
+
     if debug_mode:
         logging.info("Debug mode enabled.")
-    
-    app = ERPApp()
+
+    # --metrics-port N / --metrics-file PATH: export login timings in the Prometheus text format
+    metrics_port = _option("--metrics-port")
+    metrics_file = _option("--metrics-file")
+    exporter = None
+    if metrics_port or metrics_file:
+        from src.telemetry import MetricsExporter
+        exporter = MetricsExporter(port=int(metrics_port) if metrics_port else None, path=metrics_file).start()
+
+    # --broker [--broker-port N]: share the live ERP session with local scripts (see src/broker.py)
+    broker_port = None
+    if "--broker" in sys.argv or _option("--broker-port"):
+        broker_port = int(_option("--broker-port") or 0)
+
+    # --add-account / --remove-account ROLL / --list-accounts: extra accounts to keep logged in
+    account_action = ("add" if "--add-account" in sys.argv else "remove" if _option("--remove-account")
+                      else "list" if "--list-accounts" in sys.argv else None)
+    if account_action:
+        from src.account_cli import run
+        pin_fd = _option("--pin-fd")
+        sys.exit(run(account_action, roll=_option("--remove-account"), pin_fd=int(pin_fd) if pin_fd else None))
+
+    # --daemon: no window at all, just keep the vault's accounts logged in
+    if "--daemon" in sys.argv:
+        from src.daemon import run
+        pin_fd = _option("--pin-fd")
+        code = run(pin_fd=int(pin_fd) if pin_fd else None, started=_STARTED, broker_port=broker_port)
+        if exporter:
+            exporter.stop()
+        sys.exit(code)
+
+    # --profile-startup: time every import up to the first drawn frame and print a report
+    profiler = None
+    if "--profile-startup" in sys.argv:
+        from src import startup_profile
+        startup_profile.PROCESS_START = _STARTED
+        profiler = startup_profile.ImportProfiler().install()
+
+    from src.app import ERPApp
+    app = ERPApp(broker_port=broker_port)
+
+    if profiler:
+        profiler.mark("window created")
+        app.update()
+        profiler.mark("first frame")
+        profiler.uninstall()
+        report = profiler.report()
+        print(report)
+        # Windowed (PyInstaller) builds have no console, so keep a copy on disk as well
+        data_dir = os.path.expanduser("~/.iitkgp_erp_manager")
+        os.makedirs(data_dir, exist_ok=True)
+        with open(os.path.join(data_dir, "startup_profile.txt"), "w") as f:
+            f.write(report + "\n")
+
     app.mainloop()
+    if exporter:
+        exporter.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,79 @@
+import getpass
+from typing import Dict, Optional
+
+from iitkgp_erp_login.logger import logger
+
+from .daemon import PIN_ENV, read_pin
+from .storage import StorageManager
+
+
+def _prompt_creds() -> Optional[Dict]:
+    roll = input("Roll Number: ").strip()
+    if not roll:
+        return None
+    creds = {
+        "roll_number": roll,
+        "erp_password": getpass.getpass("ERP Password: "),
+        "security_answers": {},
+        "google_email": input("Gmail Address (registered with ERP): ").strip(),
+        "google_app_password": getpass.getpass("Google App Password: ").strip(),
+        "otp_sources": ["imap"],
+    }
+    print("Security questions, exactly as the ERP shows them (empty question to finish):")
+    while len(creds["security_answers"]) < 3:
+        question = input(f"  Question {len(creds['security_answers']) + 1}: ").strip()
+        if not question:
+            break
+        creds["security_answers"][question] = getpass.getpass("  Answer: ").strip()
+    if not creds["security_answers"]:
+        return None
+    return creds
+
+
+def run(action: str, roll: Optional[str] = None, pin_fd: Optional[int] = None) -> int:
+    """
+    ``list``, ``add`` (prompts for the details) or ``remove`` ``roll`` among the extra
+    accounts the app and the daemon keep logged in next to the Settings one. Neither may be
+    running meanwhile: they'd write their own copy of the vault over the change.
+    """
+    storage = StorageManager()
+    if not storage.exists():
+        logger.error(f"No vault at {storage.filename}. Set one up with the GUI first.")
+        return 2
+    pin = read_pin(pin_fd)
+    if not pin:
+        logger.error(f"No PIN given (use --pin-fd, ${PIN_ENV} or run in a terminal).")
+        return 2
+    if not storage.unlock(pin):
+        logger.error("Wrong PIN or corrupted vault.")
+        return 1
+
+    primary = (storage.get_credentials() or {}).get('roll_number')
+    accounts = storage.get_accounts()
+    if action == "list":
+        for creds in accounts:
+            print(creds['roll_number'] + (" (Settings account)" if creds['roll_number'] == primary else ""))
+        return 0
+
+    if action == "add":
+        creds = _prompt_creds()
+        if creds is None:
+            logger.error("Need a roll number and at least one security question.")
+            return 2
+        if creds['roll_number'] == primary:
+            logger.error("That's the Settings account; change it in the GUI.")
+            return 2
+        accounts = [c for c in accounts if c['roll_number'] != creds['roll_number']] + [creds]
+    elif action == "remove":
+        if roll not in {c['roll_number'] for c in accounts} or roll == primary:
+            logger.error(f"No extra account {roll} in the vault.")
+            return 2
+        accounts = [c for c in accounts if c['roll_number'] != roll]
+    else:
+        raise ValueError(f"Unknown action: {action}")
+
+    storage.save_accounts(accounts)
+    if not storage.flush():
+        return 1
+    print(f"Vault now has {len(storage.get_accounts())} account(s).")
+    return 0
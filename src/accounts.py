@@ -0,0 +1,230 @@
+import heapq
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from iitkgp_erp_login.logger import logger
+
+from .erp_client import ERPClient
+
+
+class ScopedState:
+    """Gives each account its own corner of a shared state store."""
+
+    def __init__(self, store, prefix: str):
+        self.store = store
+        self.prefix = prefix
+
+    def get_state(self, name: str, default=None):
+        return self.store.get_state(f"{self.prefix}:{name}", default)
+
+    def set_state(self, name: str, value) -> bool:
+        return self.store.set_state(f"{self.prefix}:{name}", value)
+
+
+class Account:
+    def __init__(self, creds: Dict, client: ERPClient):
+        self.creds = creds
+        self.client = client
+        self.status = "Unknown"
+        self.last_error: Optional[str] = None
+        # Drops the liveness subscription that feeds ``status``, see AccountManager.remove()
+        self.unsubscribe: Optional[Callable[[], None]] = None
+
+    @property
+    def roll(self) -> str:
+        return self.creds['roll_number']
+
+
+class AccountManager:
+    """
+    Keeps many ERP accounts logged in from one process.
+
+    Every account gets its own ERPClient (and so its own session, liveness monitor and
+    login coordinator). The work itself runs on a bounded thread pool; a single scheduler
+    thread decides which account is due for a keepalive check next, so a few hundred
+    accounts cost ``max_workers + 1`` threads, not a few hundred.
+    """
+
+    def __init__(self, state_store=None, max_workers: int = 8, check_interval: float = 60,
+                 client_factory: Callable[[], ERPClient] = ERPClient):
+        self.state_store = state_store
+        self.check_interval = check_interval
+        self.client_factory = client_factory
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="erp-account")
+
+        self._accounts: Dict[str, Account] = {}
+        self._subscribers: list[Callable[[str, str], None]] = []
+        self._schedule: list[tuple[float, str]] = []
+        self._busy: set[str] = set()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    # --- registry ---
+
+    def add(self, creds: Dict, client: Optional[ERPClient] = None, delay: float = 0.0) -> Account:
+        """
+        Registers an account, using ``client`` if given (e.g. the one the GUI already has)
+        and checking it first after ``delay`` seconds. For a roll that's already registered
+        only the credentials are replaced.
+        """
+        roll = creds.get('roll_number')
+        if not roll:
+            raise ValueError("Missing Roll Number")
+        with self._cond:
+            existing = self._accounts.get(roll)
+            if existing is not None:
+                existing.creds = creds
+                return existing
+
+        client = client or self.client_factory()
+        if self.state_store is not None:
+            # The vault's own account keeps the unscoped state the GUI uses
+            get_credentials = getattr(self.state_store, "get_credentials", None)
+            primary = ((get_credentials and get_credentials()) or {}).get('roll_number')
+            client.state_store = self.state_store if roll == primary else ScopedState(self.state_store, roll)
+            client.load_state()
+        account = Account(creds, client)
+
+        with self._cond:
+            existing = self._accounts.get(roll)
+            if existing is not None:  # added by another thread meanwhile
+                existing.creds = creds
+                return existing
+            # A client that's already registered (the GUI's, say) keeps its one subscription
+            if not any(a.client is client for a in self._accounts.values()):
+                account.unsubscribe = client.liveness.subscribe(
+                    lambda alive, roll=roll: self._set_status(roll, "Online" if alive else "Offline")
+                )
+            self._accounts[roll] = account
+            heapq.heappush(self._schedule, (time.monotonic() + delay, roll))
+            self._cond.notify()
+        return account
+
+    def remove(self, roll: str):
+        with self._cond:
+            account = self._accounts.pop(roll, None)
+        if account is not None and account.unsubscribe is not None:
+            account.unsubscribe()
+
+    def get(self, roll: str) -> Optional[Account]:
+        return self._accounts.get(roll)
+
+    def accounts(self) -> list[Account]:
+        with self._cond:
+            return list(self._accounts.values())
+
+    def subscribe(self, callback: Callable[[str, str], None]) -> Callable[[], None]:
+        """Calls ``callback(roll, status)`` whenever an account's status changes. Returns an unsubscribe function."""
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    # --- work ---
+
+    def login(self, roll: str) -> Future:
+        """Queues a login for one account; the future resolves to login_with_credentials' result."""
+        account = self._accounts[roll]
+        return self.pool.submit(self._login, account)
+
+    def login_all(self) -> Dict[str, Future]:
+        return {account.roll: self.login(account.roll) for account in self.accounts()}
+
+    def _login(self, account: Account, refresh: bool = False) -> bool:
+        try:
+            ok = account.client.login_with_credentials(
+                account.creds, status_callback=lambda msg: self._set_status(account.roll, msg), refresh=refresh
+            )
+            account.last_error = None
+            return ok
+        except Exception as e:
+            account.last_error = str(e)
+            self._set_status(account.roll, f"Login failed: {e}")
+            raise
+
+    def _keepalive(self, account: Account) -> Optional[float]:
+        """One check for one account. Returns seconds until it should be looked at again."""
+        client = account.client
+        try:
+            if client.liveness.peek() is None and client.restore_session():
+                pass  # first look at this account, and the last run's session is still good
+            elif not client.is_session_alive():
+                self._login(account)
+            else:
+                refresh_in = client.seconds_until_refresh()
+                if refresh_in is not None and refresh_in <= 0:
+                    # Still logged in: the refresh must not cost that session if it fails
+                    self._login(account, refresh=True)
+        except Exception as e:
+            logger.error(f"Keepalive for {account.roll} failed: {e}")
+
+        refresh_in = client.seconds_until_refresh()
+        if refresh_in is not None and refresh_in > 0:
+            return max(5, min(self.check_interval, refresh_in))
+        return self.check_interval
+
+    def _set_status(self, roll: str, status: str):
+        account = self._accounts.get(roll)
+        if account is None or account.status == status:
+            return
+        account.status = status
+        for callback in list(self._subscribers):
+            try:
+                callback(roll, status)
+            except Exception as e:
+                logger.error(f"Account status subscriber failed: {e}")
+
+    # --- scheduler ---
+
+    def start(self):
+        """Starts keeping every registered account alive in the background."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="erp-account-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    now = time.monotonic()
+                    if self._schedule and self._schedule[0][0] <= now:
+                        due, roll = heapq.heappop(self._schedule)
+                        account = self._accounts.get(roll)
+                        if account is None or roll in self._busy:
+                            continue
+                        self._busy.add(roll)
+                        break
+                    timeout = self._schedule[0][0] - now if self._schedule else None
+                    self._cond.wait(timeout)
+                else:
+                    return
+            try:
+                self.pool.submit(self._check_and_reschedule, account)
+            except RuntimeError:
+                return  # pool shut down underneath us
+
+    def _check_and_reschedule(self, account: Account):
+        delay = self.check_interval
+        try:
+            delay = self._keepalive(account)
+        finally:
+            with self._cond:
+                self._busy.discard(account.roll)
+                if account.roll in self._accounts:
+                    heapq.heappush(self._schedule, (time.monotonic() + delay, account.roll))
+                    self._cond.notify()
@@ -1,14 +1,25 @@
+import logging
 import os
 import sys
-from PIL import Image, ImageTk
+import tkinter
 import customtkinter as ctk
 from .storage import StorageManager
-from .erp_client import ERPClient
 from .frames.auth import SetupFrame, LockFrame
-from .frames.main_view import MainViewFrame
+import queue
 import threading
 import time
 
+# The lock screen needs none of the ERP, mail or browser code. These are imported in the
+# background once it's up (see _preload), or on first use if that hasn't finished yet.
+PRELOAD_MODULES = ("src.erp_client", "src.frames.main_view")
+
+# How often work posted from other threads is picked up by the Tk thread
+UI_TICK_MS = 50
+# Most time one tick spends running posted callbacks; the rest wait for the next tick
+UI_BUDGET = 0.02
+# A tick this late means something blocked the Tk thread
+UI_STALL_WARN = 0.05
+
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
     try:
@@ -22,7 +33,7 @@ ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
 class ERPApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, broker_port=None):
         super().__init__()
 
         self.title("IIT KGP ERP Manager")
@@ -33,17 +44,24 @@ class ERPApp(ctk.CTk):
         try:
             icon_path = resource_path(os.path.join("assets", "logo.png"))
             if os.path.exists(icon_path):
-                # Use PIL to load the image
-                img = Image.open(icon_path)
-                icon = ImageTk.PhotoImage(img)
+                # Tk 8.6 reads PNG itself; PIL only as a fallback for older Tk builds
+                try:
+                    icon = tkinter.PhotoImage(file=icon_path)
+                except tkinter.TclError:
+                    from PIL import Image, ImageTk
+                    icon = ImageTk.PhotoImage(Image.open(icon_path))
                 self.wm_iconphoto(True, icon)
         except Exception as e:
             print(f"Warning: Could not load icon: {e}")
 
         # Logic Components
         self.storage = StorageManager()
-        self.client = ERPClient()
-        self.is_auto_login_active = False
+        self._client = None
+        # Keeps the Settings account and any extra ones logged in (see start_auto_login_service)
+        self.accounts = None
+        # Session broker for local scripts, started on unlock if a port was given (0 = any)
+        self.broker_port = broker_port
+        self.broker = None
 
         # Container
         self.container = ctk.CTkFrame(self)
@@ -52,7 +70,65 @@ class ERPApp(ctk.CTk):
         self.frames = {}
         self.current_frame = None
 
+        # Tk isn't thread safe: worker threads hand their UI updates over through post()
+        self._ui_queue = queue.SimpleQueue()
+        self._ui_tick_due = time.perf_counter()
+        self.ui_stall_max = 0.0
+
         self.init_app_state()
+        self.after(200, self._preload)
+        self._schedule_ui_tick()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from .erp_client import ERPClient
+            self._client = ERPClient()
+            self._client.state_store = self.storage
+        return self._client
+
+    def post(self, callback, delay_ms=0):
+        """Runs ``callback`` on the Tk thread (after ``delay_ms``). Safe from any thread, never blocks."""
+        self._ui_queue.put((callback, delay_ms))
+
+    def _schedule_ui_tick(self):
+        self._ui_tick_due = time.perf_counter() + UI_TICK_MS / 1000
+        self.after(UI_TICK_MS, self._drain_ui_queue)
+
+    def _drain_ui_queue(self):
+        started = time.perf_counter()
+        stall = started - self._ui_tick_due
+        if stall > UI_STALL_WARN:
+            self.ui_stall_max = max(self.ui_stall_max, stall)
+            logging.debug(f"UI thread was blocked for {stall * 1000:.0f} ms")
+        # Before running anything: a callback that opens a dialog doesn't return until it's
+        # closed, and the dialog's own event loop has to keep draining meanwhile
+        self._schedule_ui_tick()
+
+        deadline = started + UI_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                callback, delay_ms = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if delay_ms:
+                self.after(delay_ms, callback)
+                continue
+            try:
+                callback()
+            except Exception as e:
+                # e.g. a widget destroyed while its update was queued
+                print(f"UI callback failed: {e}")
+
+    def _preload(self):
+        def run():
+            import importlib
+            for name in PRELOAD_MODULES:
+                try:
+                    importlib.import_module(name)
+                except Exception as e:
+                    print(f"Preloading {name} failed: {e}")
+        threading.Thread(target=run, name="preload", daemon=True).start()
 
     def init_app_state(self):
         # Check vault
@@ -73,6 +149,7 @@ class ERPApp(ctk.CTk):
         elif frame_name == "LockFrame":
             frame = LockFrame(self.container, self)
         elif frame_name == "MainViewFrame":
+            from .frames.main_view import MainViewFrame
             frame = MainViewFrame(self.container, self)
         else:
             return
@@ -85,8 +162,10 @@ class ERPApp(ctk.CTk):
          # Try to unlock
          if self.storage.unlock(pin):
              self.pin = pin # Keep in memory for re-saving
-             self.show_frame("MainViewFrame")
+             self.client.load_state()
              self.start_auto_login_service()
+             self.show_frame("MainViewFrame")
+             self.start_broker()
              return True
          return False
 
@@ -94,46 +173,69 @@ class ERPApp(ctk.CTk):
         # Create vault
         self.storage.init_vault(pin)
         self.pin = pin
+        self.start_auto_login_service()
         self.show_frame("MainViewFrame")
+        self.start_broker()
 
     def start_auto_login_service(self):
-        if self.is_auto_login_active: return
-        self.is_auto_login_active = True
-        
-        thread = threading.Thread(target=self._auto_login_loop, daemon=True)
-        thread.start()
+        if self.accounts is not None: return
+        from .accounts import AccountManager
+
+        self.accounts = AccountManager(state_store=self.storage)
+        self.accounts.subscribe(lambda roll, status: print(f"[{roll}] {status}"))
+        self.sync_accounts()
+        self.accounts.start()
+
+    def sync_accounts(self):
+        """Brings the keepalive in line with the vault after the accounts in it changed."""
+        if self.accounts is None:
+            return
+        wanted = {creds['roll_number']: creds for creds in self.storage.get_accounts()}
+        primary = (self.storage.get_credentials() or {}).get('roll_number')
+        for account in self.accounts.accounts():
+            if account.roll not in wanted:
+                self.accounts.remove(account.roll)
+        for roll, creds in wanted.items():
+            if roll == primary:
+                # Shares the GUI's client; the first check waits so the UI's own initial
+                # login/launch goes first
+                self.accounts.add(creds, client=self.client, delay=15)
+            else:
+                self.accounts.add(creds)
         
-    def _auto_login_loop(self):
-        print("Auto-login service started (Delayed 15s)")
-        time.sleep(15) # Give UI time to perform initial login/launch
-        while True:
-            try:
-                if not self.client.is_session_alive():
-                    creds = self.storage.get_credentials()
-                    if creds and creds.get('roll_number'):
-                        print("Session dead. Attempting auto-login...")
-                        # We need to run this carefully, maybe update status in UI?
-                        # Since this is a thread, update via callback?
-                        try:
-                            self.client.login_with_credentials(creds)
-                            print("Auto-login successful")
-                        except Exception as e:
-                            print(f"Auto-login failed: {e}")
-                else:
-                    # Session alive
-                    pass
-            except Exception as e:
-                print(f"Auto-login loop error: {e}")
-            
-            time.sleep(60) # Check every minute
+    def start_broker(self):
+        if self.broker_port is None or self.broker is not None:
+            return
+        from .broker import SessionBroker
+
+        def accounts():
+            return {a.roll: (a.client, a.creds) for a in self.accounts.accounts()} if self.accounts else {}
+
+        try:
+            self.broker = SessionBroker(accounts, port=self.broker_port).start()
+        except OSError as e:
+            print(f"Could not start session broker: {e}")
 
     def on_closing(self):
+        if self.accounts is not None:
+            self.accounts.stop(wait=False)
+            # Keep the latest cookies so the next start can skip the OTP login
+            for account in self.accounts.accounts():
+                if account.client.session.cookies.get('ssoToken'):
+                    account.client.remember_session()
+
         # Cleanup current frame if it has logic
         if self.current_frame and hasattr(self.current_frame, "cleanup"):
             try:
                 self.current_frame.cleanup()
             except Exception as e:
                 print(f"Error during cleanup: {e}")
+
+        if self.broker is not None:
+            self.broker.stop()
+
+        # Vault writes are queued; don't leave the last ones behind
+        self.storage.flush()
         
         # Kill app
         self.destroy()
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import re
+import time
+from typing import Dict, Optional
+
+import aiohttp
+from yarl import URL
+
+import iitkgp_erp_login.erp_responses as erp_responses
+from iitkgp_erp_login.endpoints import HOMEPAGE_URL, LOGIN_URL, OTP_URL, SECRET_QUESTION_URL, WELCOMEPAGE_URL
+from iitkgp_erp_login.erp import ErpLoginError, get_login_details
+from iitkgp_erp_login.logger import logger
+
+from .async_imap import AsyncOTPListener
+from .probe import PROBE_TIMEOUT, WELCOME_CONTENT_LENGTH
+from .questions import find_answer, is_question
+from .session_token import CHUNK_SIZE, TokenScanner
+from .transport import DEFAULT_TIMEOUT, IDEMPOTENT_STAGES, STAGE_TIMEOUTS, stage_for
+
+ERP_ORIGIN = "https://erp.iitkgp.ac.in"
+MAX_REDIRECTS = 10
+
+_SSO_RE = re.compile(r'\?ssoToken=(.+)$')
+
+
+class AsyncERPClient:
+    """
+    ERPClient for asyncio code: the same login flow, OTP handling and liveness probe,
+    with every network wait a coroutine so one event loop can keep thousands of sessions
+    probed and run dozens of logins at once without a thread each.
+
+    Parsing and errors follow iitkgp_erp_login.erp, so callers see the same ErpLoginError
+    messages as with the blocking client.
+    """
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None, origin: Optional[str] = None):
+        self._session = session
+        self._own_session = session is None
+        # Base URL to send ERP requests to instead of the real one (e.g. a local stand-in)
+        self.origin = origin.rstrip("/") if origin else None
+        # Extra AsyncOTPListener arguments (host/port/use_ssl)
+        self.imap_options = {}
+        self.imap_state: Dict[str, dict] = {}
+        self.logged_in_at: Optional[float] = None
+        self.alive: Optional[bool] = None
+        self.checked_at = 0.0
+        self.ttl = 60
+        self.probes = 0
+
+        self._probe_task: Optional[asyncio.Task] = None
+        self._probe_started = 0.0
+        self._login_task: Optional[asyncio.Task] = None
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Ubuntu Chromium/37.0.2062.94 Chrome/37.0.2062.94 Safari/537.36'
+        }
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=self.origin is not None))
+        return self._session
+
+    async def close(self):
+        if self._own_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # --- HTTP ---
+
+    def _url(self, url: str) -> str:
+        if self.origin and url.startswith(ERP_ORIGIN):
+            return self.origin + url[len(ERP_ORIGIN):]
+        return url
+
+    async def _request(self, method: str, url: str, data=None, follow: bool = True, consume=None, **kwargs):
+        """
+        Sends a request, following redirects by hand so they stay on ``origin``.
+        Returns the final response (body read) and the redirect responses before it.
+        ``consume``, if given, is awaited with the final response instead of reading its body.
+        """
+        connect, read = STAGE_TIMEOUTS.get(stage_for(url), DEFAULT_TIMEOUT)
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(sock_connect=connect, sock_read=read))
+        history = []
+        for _ in range(MAX_REDIRECTS + 1):
+            async with self.session.request(method, self._url(url), data=data, headers=self.headers,
+                                            allow_redirects=False, **kwargs) as r:
+                location = r.headers.get("Location")
+                final = not follow or r.status not in (301, 302, 303, 307, 308) or not location
+                if final and consume is not None:
+                    await consume(r)
+                else:
+                    await r.read()
+            if final:
+                if r.status >= 400 and stage_for(url) not in IDEMPOTENT_STAGES:
+                    # Same rule as ERPSession: an error page is never a login step's answer
+                    raise aiohttp.ClientResponseError(r.request_info, tuple(history), status=r.status,
+                                                      message=r.reason or "", headers=r.headers)
+                return r, history
+            history.append(r)
+            url = str(r.url.join(URL(location)))
+            if r.status in (301, 302, 303):
+                method, data = "GET", None
+        raise aiohttp.TooManyRedirects(r.request_info, tuple(history))
+
+    async def fetch(self, url: str, method: str = "GET", data=None) -> str:
+        """Fetches an ERP page with this client's session and returns its text."""
+        r, _ = await self._request(method, url, data=data)
+        return await r.text()
+
+    # --- liveness ---
+
+    async def is_session_alive(self, max_age: Optional[float] = None) -> bool:
+        """Cached like SessionMonitor: reuses a result for ``ttl`` seconds and merges concurrent probes
+        (a probe sent more than ``max_age`` before the call isn't joined)."""
+        max_age = self.ttl if max_age is None else max_age
+        called = time.monotonic()
+        while True:
+            if self.alive is not None and time.monotonic() - self.checked_at <= max_age:
+                return self.alive
+            task = self._probe_task
+            if task is None or task.done():
+                task = self._probe_task = asyncio.ensure_future(self._probe())
+                self._probe_started = time.monotonic()
+                joinable = True
+            else:
+                # One sent before this call may have used cookies a login has replaced since
+                joinable = self._probe_started >= called - max_age
+            try:
+                result = await asyncio.shield(task)
+            finally:
+                if task.done() and self._probe_task is task:
+                    self._probe_task = None
+            if joinable:
+                return result
+
+    async def _probe(self) -> bool:
+        self.probes += 1
+        try:
+            timeout = aiohttp.ClientTimeout(sock_connect=PROBE_TIMEOUT[0], sock_read=PROBE_TIMEOUT[1])
+            async with self.session.get(self._url(WELCOMEPAGE_URL), headers=self.headers,
+                                        allow_redirects=False, timeout=timeout) as r:
+                # Status line and headers are all we need; leaving the block drops the body
+                alive = r.status == 200 and r.headers.get("Content-Length") == WELCOME_CONTENT_LENGTH
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"Session probe failed: {e}")
+            alive = False
+        self.alive = alive
+        self.checked_at = time.monotonic()
+        return alive
+
+    # --- login ---
+
+    async def get_sessiontoken(self) -> str:
+        scanner = TokenScanner()
+
+        async def scan(r):
+            # Stops reading once the token has gone past, as the sync client does
+            async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                if scanner.feed(chunk):
+                    return
+            scanner.finish(r.get_encoding())
+
+        try:
+            await self._request("GET", HOMEPAGE_URL, consume=scan)
+            if not scanner.token:
+                raise KeyError("sessionToken")
+            return scanner.token
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as e:
+            raise ErpLoginError(f"Failed to generate sessionToken: {str(e)}")
+
+    async def get_secret_question(self, roll_number: str) -> str:
+        try:
+            r, _ = await self._request("POST", SECRET_QUESTION_URL, data={'user_id': roll_number})
+            text = await r.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ErpLoginError(f"Failed to fetch Security Question: {str(e)}")
+        if text == "FALSE":
+            raise ErpLoginError("Invalid Roll Number")
+        return text
+
+    async def request_otp(self, login_details: dict):
+        try:
+            r, _ = await self._request("POST", OTP_URL, data=login_details)
+            res = json.loads(await r.text())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ErpLoginError(f"Failed to request OTP: {str(e)}")
+        match res['msg']:
+            case erp_responses.ANSWER_MISMATCH_ERROR:
+                raise ErpLoginError("Invalid Security Question Answer")
+            case erp_responses.PASSWORD_MISMATCH_ERROR:
+                raise ErpLoginError("Invalid Password")
+            case erp_responses.OTP_SENT_MESSAGE:
+                pass
+            case _:
+                raise ErpLoginError(f"Failed to request OTP: {res['msg']}")
+
+    async def signin(self, login_details: dict) -> str:
+        try:
+            r, history = await self._request("POST", LOGIN_URL, data=login_details)
+            if erp_responses.OTP_MISMATCH_ERROR in await r.text():
+                raise ErpLoginError("Invalid OTP")
+            sso_token = _SSO_RE.search(history[1].headers['Location']).group(1)
+        except (aiohttp.ClientError, asyncio.TimeoutError, IndexError, KeyError, AttributeError) as e:
+            raise ErpLoginError(f"ERP login failed: {str(e)}")
+        return sso_token
+
+    async def login_with_credentials(self, creds: Dict, status_callback=None) -> bool:
+        """
+        Same creds and status messages as ERPClient.login_with_credentials. Concurrent
+        calls on one client share the running attempt.
+        """
+        if not creds.get('roll_number') or not creds.get('erp_password'):
+            raise ValueError("Missing Roll Number or Password")
+
+        if self._login_task is None or self._login_task.done():
+            self._login_task = asyncio.ensure_future(self._run_login(creds, status_callback))
+        elif status_callback:
+            status_callback("Login already in progress...")
+        return await asyncio.shield(self._login_task)
+
+    async def _open_mailbox(self, creds: Dict) -> AsyncOTPListener:
+        email = creds['google_email']
+        try:
+            return await AsyncOTPListener(
+                email, creds['google_app_password'],
+                state=dict(self.imap_state.get(email, {})), **self.imap_options
+            ).start()
+        except Exception as e:
+            logger.error(f"IMAP Init Error: {e}")
+            raise ValueError(f"Could not connect to mailbox for OTP: {e}")
+
+    async def _run_login(self, creds: Dict, status_callback=None) -> bool:
+        roll = creds['roll_number']
+        sec_answers = creds.get('security_answers', {})
+
+        if status_callback: status_callback(f"Initiating login for {roll}...")
+        started = time.time()
+
+        try:
+            # The mailbox opens while the token and then the question are fetched; those two
+            # share the cookie jar's JSESSIONID, so they go in order (see ERPClient._run_login)
+            email = creds.get('google_email')
+            use_imap = bool(email and creds.get('google_app_password'))
+            if use_imap and status_callback: status_callback("Connecting to mailbox...")
+
+            async def token_then_question():
+                token = await self.get_sessiontoken()
+                return token, await self.get_secret_question(roll)
+
+            erp_side, listener = await asyncio.gather(
+                token_then_question(),
+                self._open_mailbox(creds) if use_imap else asyncio.sleep(0),
+                return_exceptions=True
+            )
+            session_token, question = (erp_side, erp_side) if isinstance(erp_side, BaseException) else erp_side
+            error = next((r for r in (session_token, question, listener) if isinstance(r, BaseException)), None)
+            if isinstance(listener, BaseException):
+                listener = None
+
+            try:
+                if error is not None:
+                    raise error
+                if not is_question(question):
+                    raise ValueError(f"ERP sent something other than a security question: {question[:80]!r}")
+                answer = find_answer(sec_answers, question)
+                if not answer:
+                    raise ValueError(f"No answer stored for security question: {question}")
+                login_details = get_login_details(roll, creds['erp_password'], answer, session_token)
+
+                if status_callback: status_callback("Requesting OTP...")
+                await self.request_otp(login_details)
+
+                otp = msg_id = None
+                if listener:
+                    if status_callback: status_callback("Listening for new OTP email...")
+                    otp, msg_id = await listener.wait_for_otp()
+                if not otp:
+                    raise ValueError("Could not fetch OTP via IMAP. Email/AppPassword missing or retrieval failed.")
+                login_details['email_otp'] = otp
+
+                if status_callback: status_callback("Submitting valid OTP...")
+                await self.signin(login_details)
+
+                if await self.is_session_alive(max_age=0):
+                    if status_callback: status_callback("Login Successful!")
+                    self.logged_in_at = time.time()
+                    logger.info(f"Logged in {roll} in {self.logged_in_at - started:.1f}s")
+                    if msg_id:
+                        await listener.delete(msg_id)
+                    return True
+                if status_callback: status_callback("Login flow finished but session not alive.")
+                return False
+            finally:
+                if listener:
+                    await listener.close()
+                    self.imap_state[email] = dict(listener.state)
+        except Exception as e:
+            if status_callback: status_callback(f"Login failed: {str(e)}")
+            logger.error(f"Login Exception: {e}")
+            raise
@@ -0,0 +1,249 @@
+import asyncio
+import datetime
+import re
+import ssl
+from typing import Optional
+
+from iitkgp_erp_login.logger import logger
+
+from .otp_extract import MAX_BODY_BYTES, extract_otp, parse_response, pick_text_part
+from .otp_listener import IMAP_HOST, OTP_SENDER, OTP_SUBJECT
+
+_CODE_RE = re.compile(rb"\[(UIDNEXT|UIDVALIDITY) (\d+)\]")
+_LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n$")
+
+
+class AsyncOTPListener:
+    """
+    The asyncio twin of OTPListener: same IDLE/NOOP strategy, UID tracking and partial
+    fetches, on top of asyncio streams so one event loop can wait for many OTPs at once.
+    """
+
+    IDLE_SLICE = 10
+    POLL_MIN = 0.5
+    POLL_MAX = 4
+
+    def __init__(self, email_addr: str, app_password: str, host: str = IMAP_HOST,
+                 port: Optional[int] = None, use_ssl: bool = True, state: Optional[dict] = None):
+        self.email_addr = email_addr
+        self.app_password = app_password
+        self.host = host
+        self.port = port or (993 if use_ssl else 143)
+        self.use_ssl = use_ssl
+        self.state = state if state is not None else {}
+
+        self.supports_idle = False
+        self.baseline_uid = 0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tag = 0
+        self._idle_tag: Optional[bytes] = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self) -> "AsyncOTPListener":
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+        greeting = await self._reader.readline()
+        if not greeting.startswith(b"* OK"):
+            raise ConnectionError(f"Unexpected IMAP greeting: {greeting!r}")
+
+        await self._command(f"LOGIN {_quote(self.email_addr)} {_quote(self.app_password)}")
+        caps = b" ".join(await self._command("CAPABILITY")).upper()
+        self.supports_idle = b" IDLE" in caps
+
+        untagged = await self._command("SELECT INBOX")
+        codes = {k: int(v) for line in untagged for k, v in _CODE_RE.findall(line)}
+        validity, uidnext = codes.get(b"UIDVALIDITY"), codes.get(b"UIDNEXT")
+        if uidnext is None:
+            if validity is not None and self.state.get("uidvalidity") == validity:
+                uidnext = self.state.get("uidnext", 1)
+            else:
+                uidnext = await self._latest_otp_uid(1) + 1
+        if self.state.get("uidvalidity") != validity:
+            self.state.clear()
+        self.state["uidvalidity"] = validity
+        self.state["uidnext"] = max(uidnext, self.state.get("uidnext", 0))
+        self.baseline_uid = self.state["uidnext"]
+
+        if self.supports_idle:
+            await self._idle_start()
+        return self
+
+    async def wait_for_otp(self, timeout: float = 60) -> tuple[Optional[str], Optional[int]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        interval = self.POLL_MIN
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                if self.supports_idle:
+                    await self._idle_wait(min(self.IDLE_SLICE, remaining))
+                    await self._idle_done()
+                    changed = True
+                else:
+                    await asyncio.sleep(min(interval, remaining))
+                    interval = min(interval * 1.5, self.POLL_MAX)
+                    changed = any(line.rstrip().upper().endswith(b"EXISTS") for line in await self._command("NOOP"))
+
+                if changed:
+                    otp, uid = await self._check_new()
+                    if otp:
+                        return otp, uid
+                if self.supports_idle:
+                    await self._idle_start()
+            except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+                logger.error(f"IMAP Listener Error: {e}")
+                break
+        return None, None
+
+    async def delete(self, uid: int):
+        try:
+            await self._idle_done()
+            await self._command(f"UID STORE {uid} +FLAGS (\\Deleted)")
+            await self._command("EXPUNGE")
+        except Exception as e:
+            logger.error(f"Failed to delete email: {e}")
+
+    async def close(self):
+        if self._writer is None:
+            return
+        try:
+            await self._idle_done()
+            await self._command("LOGOUT")
+        except Exception:
+            pass
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except Exception:
+            pass
+        self._writer = None
+
+    async def _latest_otp_uid(self, since_uid: int) -> int:
+        since_date = (datetime.date.today() - datetime.timedelta(days=1)).strftime("%d-%b-%Y")
+        untagged = await self._command(
+            f'UID SEARCH UID {since_uid}:* SINCE {since_date} FROM "{OTP_SENDER}" SUBJECT "{OTP_SUBJECT}"'
+        )
+        uids = []
+        for line in untagged:
+            if line.upper().startswith(b"* SEARCH"):
+                uids += [int(u) for u in line.split()[2:] if int(u) >= since_uid]
+        return max(uids, default=0)
+
+    async def _check_new(self) -> tuple[Optional[str], Optional[int]]:
+        uid = await self._latest_otp_uid(self.baseline_uid)
+        if not uid:
+            return None, None
+        self.state["uidnext"] = max(self.state.get("uidnext", 0), uid + 1)
+
+        structure = _fetch_value(await self._command(f"UID FETCH {uid} (BODYSTRUCTURE)"), "BODYSTRUCTURE")
+        part = pick_text_part(structure) if isinstance(structure, list) else None
+        if part is not None:
+            raw = _fetch_value(
+                await self._command(f"UID FETCH {uid} (BODY.PEEK[{part.spec}]<0.{MAX_BODY_BYTES}>)"),
+                f"BODY[{part.spec}]"
+            )
+            if isinstance(raw, str):
+                raw = raw.encode()
+            otp = extract_otp(raw, part) if raw else None
+            if otp:
+                return otp, uid
+
+        self.baseline_uid = uid + 1
+        return None, None
+
+    async def _command(self, command: str) -> list[bytes]:
+        """Sends one command and returns its untagged responses (literals inlined)."""
+        self._tag += 1
+        tag = f"A{self._tag:04d}".encode()
+        self._writer.write(tag + b" " + command.encode() + b"\r\n")
+        await self._writer.drain()
+
+        untagged = []
+        while True:
+            line = await self._read_response()
+            if line.startswith(tag + b" "):
+                status = line[len(tag) + 1:].split(b" ", 1)[0]
+                if status != b"OK":
+                    raise ConnectionError(f"IMAP {command.split()[0]} failed: {line.strip()!r}")
+                return untagged
+            untagged.append(line)
+
+    async def _read_response(self) -> bytes:
+        return await self._read_literals(await self._read_line())
+
+    async def _read_line(self) -> bytes:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("IMAP connection closed")
+        return line
+
+    async def _read_literals(self, line: bytes) -> bytes:
+        """The rest of a response whose first line is ``line``: any {n} literals and what follows them."""
+        while (literal := _LITERAL_RE.search(line)) is not None:
+            line += await self._reader.readexactly(int(literal.group(1)))
+            line += await self._reader.readline()
+        return line
+
+    async def _idle_start(self):
+        self._tag += 1
+        tag = f"A{self._tag:04d}".encode()
+        self._writer.write(tag + b" IDLE\r\n")
+        await self._writer.drain()
+        line = await self._read_response()
+        while line.startswith(b"*"):
+            line = await self._read_response()
+        if not line.startswith(b"+"):
+            raise ConnectionError(f"IDLE rejected: {line!r}")
+        self._idle_tag = tag
+
+    async def _idle_wait(self, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            # Only the wait for a line may time out. readline() keeps a partial line buffered
+            # when cancelled, but cutting a response off inside a literal would leave the rest
+            # of it to be read as the next response.
+            try:
+                line = await asyncio.wait_for(self._read_line(), remaining)
+            except asyncio.TimeoutError:
+                return False
+            line = await self._read_literals(line)
+            if line.startswith(b"*") and line.rstrip().upper().endswith(b"EXISTS"):
+                return True
+
+    async def _idle_done(self):
+        if self._idle_tag is None:
+            return
+        tag, self._idle_tag = self._idle_tag, None
+        self._writer.write(b"DONE\r\n")
+        await self._writer.drain()
+        while not (await self._read_response()).startswith(tag):
+            pass
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _fetch_value(untagged: list[bytes], name: str):
+    for line in untagged:
+        for entry in parse_response(line):
+            if not isinstance(entry, list):
+                continue
+            for i in range(0, len(entry) - 1, 2):
+                key = entry[i]
+                if isinstance(key, str) and key.upper().split("<")[0] == name:
+                    return entry[i + 1]
+    return None
@@ -0,0 +1,299 @@
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from iitkgp_erp_login.logger import logger
+
+from .telemetry import TELEMETRY
+
+# Where local clients find the broker: {"port", "token", "pid"}, readable by this user only
+BROKER_FILE = os.path.expanduser("~/.iitkgp_erp_manager/broker.json")
+
+# A lease not renewed for this long is dropped (every /wait renews it)
+LEASE_TTL = 300
+# Longest a /wait long-poll is held open
+MAX_WAIT = 30
+
+# roll -> (the ERPClient holding that account's session, its credentials)
+Accounts = Callable[[], Dict[str, Tuple[object, Dict]]]
+
+
+class BrokerError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Lease:
+    def __init__(self, roll: str, ttl: float):
+        self.id = secrets.token_urlsafe(16)
+        self.roll = roll
+        self.ttl = ttl
+        self.expires = time.monotonic() + ttl
+
+    def renew(self):
+        self.expires = time.monotonic() + self.ttl
+
+
+class SessionBroker:
+    """
+    Hands the app's live ERP session to other local processes, so scripts get logged in
+    without an OTP round trip of their own.
+
+    A client takes a lease on an account (POST /lease) and gets its cookies with a
+    version number. Cookie changes (a re-login, a refresh) bump the version and wake up
+    everyone long-polling GET /wait. A client whose cookies stop working asks for
+    POST /relogin with the version it holds: the broker re-checks the session and, if it
+    really is dead, logs in again through the account's ERPClient, so many clients
+    reporting the same dead session still cause one login. Leases that aren't renewed
+    within their ttl are dropped.
+
+    Listens on localhost only; every request needs the token from BROKER_FILE.
+    """
+
+    def __init__(self, accounts: Accounts, port: int = 0, path: str = BROKER_FILE,
+                 lease_ttl: float = LEASE_TTL, host: str = "127.0.0.1"):
+        self.accounts = accounts
+        self.port = port
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self.host = host
+        self.token = secrets.token_urlsafe(32)
+        self.server: Optional[ThreadingHTTPServer] = None
+
+        self._cond = threading.Condition()
+        self._leases: Dict[str, Lease] = {}
+        # roll -> (ssoToken the version was taken at, version)
+        self._versions: Dict[str, Tuple[Optional[str], int]] = {}
+        # Clients whose session_listeners already include us
+        self._watched = weakref.WeakSet()
+
+    # --- lifecycle ---
+
+    def start(self) -> "SessionBroker":
+        self.server = ThreadingHTTPServer((self.host, self.port), _BrokerHandler)
+        self.server.daemon_threads = True
+        self.server.broker = self
+        self.port = self.server.server_address[1]
+        self._write_file()
+        threading.Thread(target=self.server.serve_forever, name="session-broker", daemon=True).start()
+        logger.info(f"Session broker listening on {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        try:
+            with open(self.path) as f:
+                if json.load(f).get("token") == self.token:
+                    os.remove(self.path)
+        except (OSError, ValueError):
+            pass
+        with self._cond:
+            self._cond.notify_all()
+
+    def _write_file(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"port": self.port, "token": self.token, "pid": os.getpid()}, f)
+        os.replace(tmp, self.path)
+
+    def authorized(self, header: Optional[str]) -> bool:
+        expected = f"Bearer {self.token}"
+        return bool(header) and hmac.compare_digest(header.encode(), expected.encode())
+
+    # --- operations (one per endpoint) ---
+
+    def lease(self, roll: Optional[str] = None, ttl: Optional[float] = None) -> dict:
+        """A new lease on ``roll`` (default: the first account), logging in first if needed."""
+        roll, client, creds = self._account(roll)
+        self._ensure_alive(client, creds, max_age=None)
+        lease = Lease(roll, min(float(ttl or self.lease_ttl), self.lease_ttl))
+        with self._cond:
+            self._expire()
+            self._leases[lease.id] = lease
+        TELEMETRY.incr("erp_broker_leases_total", roll=roll)
+        return dict(self._grant(roll, client), lease=lease.id, ttl=lease.ttl)
+
+    def renew(self, lease_id: str) -> dict:
+        lease = self._lease(lease_id)
+        return {"lease": lease.id, "ttl": lease.ttl, "version": self._version(lease.roll)}
+
+    def release(self, lease_id: str) -> dict:
+        with self._cond:
+            self._leases.pop(lease_id, None)
+        return {}
+
+    def relogin(self, lease_id: str, version: Optional[int] = None) -> dict:
+        """
+        For a client whose cookies were rejected. If the session was already replaced
+        since ``version`` the new cookies are returned straight away.
+        """
+        lease = self._lease(lease_id)
+        roll, client, creds = self._account(lease.roll)
+        if version is None or version >= self._version(roll):
+            TELEMETRY.incr("erp_broker_relogins_total", roll=roll)
+            self._ensure_alive(client, creds, max_age=0)
+        return self._grant(roll, client)
+
+    def wait(self, lease_id: str, since: int, timeout: float) -> Optional[dict]:
+        """Blocks until the cookies are newer than ``since``; None on timeout. Renews the lease."""
+        lease = self._lease(lease_id)
+        roll, client, _ = self._account(lease.roll)
+        deadline = time.monotonic() + min(timeout, MAX_WAIT)
+        with self._cond:
+            while self._versions.get(roll, (None, 0))[1] <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.server is None:
+                    return None
+                self._cond.wait(remaining)
+            lease.renew()
+        return self._grant(roll, client)
+
+    def status(self) -> dict:
+        with self._cond:
+            self._expire()
+            leases = [l.roll for l in self._leases.values()]
+        return {
+            "accounts": {
+                roll: {"alive": client.liveness.peek(), "version": self._version(roll),
+                       "leases": leases.count(roll)}
+                for roll, (client, _) in self.accounts().items()
+            },
+        }
+
+    # --- helpers ---
+
+    def _account(self, roll: Optional[str]):
+        accounts = self.accounts()
+        if not accounts:
+            raise BrokerError(503, "No ERP credentials saved yet")
+        if roll is None:
+            roll = next(iter(accounts))
+        if roll not in accounts:
+            raise BrokerError(404, f"Unknown roll number: {roll}")
+        client, creds = accounts[roll]
+        with self._cond:
+            if client not in self._watched:
+                self._watched.add(client)
+                client.session_listeners.append(lambda roll=roll, client=client: self._refresh(roll, client))
+        return roll, client, creds
+
+    def _lease(self, lease_id: str) -> Lease:
+        with self._cond:
+            self._expire()
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                raise BrokerError(404, "Unknown or expired lease")
+            lease.renew()
+            return lease
+
+    def _expire(self):
+        now = time.monotonic()
+        for lease_id in [i for i, l in self._leases.items() if l.expires < now]:
+            del self._leases[lease_id]
+
+    def _ensure_alive(self, client, creds: Dict, max_age: Optional[float]):
+        if client.is_session_alive(max_age=max_age):
+            return
+        try:
+            ok = client.login_with_credentials(creds)
+        except Exception as e:
+            raise BrokerError(502, f"Login failed: {e}")
+        if not ok:
+            raise BrokerError(502, "Login finished but the session is not alive")
+
+    def _refresh(self, roll: str, client) -> int:
+        """Bumps the version if the ssoToken changed and wakes up waiting clients."""
+        sso = client.session.cookies.get('ssoToken')
+        with self._cond:
+            seen, version = self._versions.get(roll, (None, 0))
+            if sso != seen or version == 0:
+                version += 1
+                self._versions[roll] = (sso, version)
+                self._cond.notify_all()
+            return version
+
+    def _version(self, roll: str) -> int:
+        with self._cond:
+            return self._versions.get(roll, (None, 0))[1]
+
+    def _grant(self, roll: str, client) -> dict:
+        return {"roll": roll, "version": self._refresh(roll, client), "cookies": client.session_cookies()}
+
+
+class _BrokerHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        broker: SessionBroker = self.server.broker
+        if not broker.authorized(self.headers.get("Authorization")):
+            self._reply(401, {"error": "Bad or missing token"})
+            return
+
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = {}
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._reply(400, {"error": "Body must be JSON"})
+                return
+
+        try:
+            route = (method, url.path)
+            if route == ("POST", "/lease"):
+                result = broker.lease(body.get("roll"), body.get("ttl"))
+            elif route == ("POST", "/renew"):
+                result = broker.renew(body.get("lease"))
+            elif route == ("POST", "/release"):
+                result = broker.release(body.get("lease"))
+            elif route == ("POST", "/relogin"):
+                result = broker.relogin(body.get("lease"), body.get("version"))
+            elif route == ("GET", "/wait"):
+                result = broker.wait(query.get("lease"), int(query.get("since", 0)),
+                                     float(query.get("timeout", MAX_WAIT)))
+                if result is None:
+                    self._reply(204, None)
+                    return
+            elif route == ("GET", "/status"):
+                result = broker.status()
+            else:
+                raise BrokerError(404, f"No such endpoint: {method} {url.path}")
+        except BrokerError as e:
+            self._reply(e.status, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Session broker error: {e}")
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(200, result)
+
+    def _reply(self, status: int, payload):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,127 @@
+import json
+import threading
+from typing import Optional
+
+import requests
+
+from iitkgp_erp_login.endpoints import HOMEPAGE_URL
+
+from .broker import BROKER_FILE, MAX_WAIT
+
+# Leasing may have to wait for a full OTP login on the broker's side
+LOGIN_TIMEOUT = 120
+
+
+class BrokerSession(requests.Session):
+    """
+    A requests.Session that is already logged in to the ERP, with the cookies of the
+    session the running app (or ``main.py --daemon --broker``) holds:
+
+        from src.broker_client import BrokerSession
+
+        with BrokerSession() as session:
+            r = session.get("https://erp.iitkgp.ac.in/IIT_ERP3/...")
+
+    A background thread long-polls the broker, which renews the lease and swaps in new
+    cookies as soon as they change. A request that gets bounced to the ERP login page is
+    reported to the broker (which re-logs in once for everybody) and sent again, once.
+    """
+
+    def __init__(self, roll: Optional[str] = None, path: str = BROKER_FILE):
+        super().__init__()
+        self.roll = roll
+        self.path = path
+        self.lease: Optional[str] = None
+        self.version = 0
+        # Talks to the broker; must never carry the ERP cookies
+        self._rpc = requests.Session()
+        self._closed = threading.Event()
+
+        self._take_lease()
+        self._watcher = threading.Thread(target=self._watch, name="erp-broker-watch", daemon=True)
+        self._watcher.start()
+
+    def request(self, method, url, *args, **kwargs):
+        r = super().request(method, url, *args, **kwargs)
+        if self._logged_out(r, url):
+            self.relogin()
+            r = super().request(method, url, *args, **kwargs)
+        return r
+
+    def relogin(self):
+        """Tells the broker these cookies stopped working and takes whatever it has now."""
+        self._apply(self._call("POST", "/relogin", json={"lease": self.lease, "version": self.version},
+                               timeout=LOGIN_TIMEOUT))
+
+    def close(self):
+        self._closed.set()
+        if self.lease:
+            try:
+                self._call("POST", "/release", json={"lease": self.lease}, timeout=5)
+            except (requests.RequestException, RuntimeError):
+                pass
+            self.lease = None
+        self._rpc.close()
+        super().close()
+
+    # --- broker protocol ---
+
+    def _take_lease(self):
+        # The port and token change whenever the app restarts, so they're read every time
+        with open(self.path) as f:
+            info = json.load(f)
+        self._base = f"http://127.0.0.1:{info['port']}"
+        self._rpc.headers["Authorization"] = f"Bearer {info['token']}"
+        grant = self._call("POST", "/lease", json={"roll": self.roll}, timeout=LOGIN_TIMEOUT)
+        self.lease = grant["lease"]
+        self.roll = grant["roll"]
+        # A restarted broker counts versions from scratch
+        self.version = 0
+        self._apply(grant)
+
+    def _call(self, method: str, endpoint: str, **kwargs) -> Optional[dict]:
+        r = self._rpc.request(method, self._base + endpoint, **kwargs)
+        if r.status_code == 204:
+            return None
+        if r.status_code != 200:
+            try:
+                message = r.json().get("error")
+            except ValueError:
+                message = r.text
+            raise RuntimeError(f"Session broker: {message} ({r.status_code})")
+        return r.json()
+
+    def _apply(self, grant: Optional[dict]):
+        if not grant or grant["version"] < self.version:
+            return
+        self.version = grant["version"]
+        for c in grant["cookies"]:
+            self.cookies.set(c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'),
+                             expires=c.get('expires'), secure=c.get('secure', False))
+
+    def _watch(self):
+        delay = 1.0
+        while not self._closed.is_set():
+            try:
+                grant = self._call("GET", "/wait", params={"lease": self.lease, "since": self.version,
+                                                           "timeout": MAX_WAIT}, timeout=MAX_WAIT + 10)
+                self._apply(grant)
+                delay = 1.0
+            except (requests.RequestException, RuntimeError, OSError, ValueError):
+                if self._closed.is_set():
+                    return
+                # Lease expired or the broker restarted: back off, then lease again
+                if self._closed.wait(delay):
+                    return
+                delay = min(delay * 2, 30)
+                try:
+                    self._take_lease()
+                except (requests.RequestException, RuntimeError, OSError, ValueError):
+                    pass
+
+    @staticmethod
+    def _logged_out(r: requests.Response, url: str) -> bool:
+        # The ERP answers requests from logged-out sessions by redirecting to the login page
+        def page(u):
+            return u.split("?")[0].rstrip("/")
+        return bool(r.history) and page(r.url) == page(HOMEPAGE_URL) and page(url) != page(HOMEPAGE_URL)
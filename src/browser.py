@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Iterable, Optional
+
+from iitkgp_erp_login.logger import logger
+
+ERP_URL = "https://erp.iitkgp.ac.in/"
+DASHBOARD_URL = "https://erp.iitkgp.ac.in/IIT_ERP3/"
+SESSION_COOKIES = ("ssoToken", "JSID#/IIT_ERP3")
+
+
+def cookie_params(jar, names: Iterable[str] = SESSION_COOKIES) -> list[dict]:
+    """The session cookies from a requests cookie jar, as DevTools Network.CookieParam dicts."""
+    params = []
+    for c in jar:
+        if c.name not in names:
+            continue
+        param = {"name": c.name, "value": c.value, "path": c.path or "/", "secure": bool(c.secure)}
+        if c.domain:
+            param["domain"] = c.domain
+        else:
+            param["url"] = ERP_URL
+        params.append(param)
+    return params
+
+
+class BrowserManager:
+    """
+    Owns the Chromium window the ERP is shown in.
+
+    prewarm() starts the browser off-screen on a blank page while nobody is waiting for
+    it (e.g. as soon as a session is known to be alive). launch() then puts the session
+    cookies straight into the browser's cookie store over DevTools, loads the dashboard
+    once and brings the window on screen. A cold launch does the same minus the head start.
+    """
+
+    def __init__(self):
+        self.page = None
+        # One entry per launch: {"warm": bool, "seconds": click to dashboard loaded}
+        self.timings: list[dict] = []
+        self._hidden = False
+        self._lock = threading.Lock()
+
+    def is_running(self) -> bool:
+        try:
+            return bool(self.page and self.page.process_id)
+        except Exception:
+            return False
+
+    def prewarm(self):
+        """Starts the browser in the background if it isn't running. Safe to call often."""
+        with self._lock:
+            if self.is_running():
+                return
+            try:
+                self._start(hidden=True)
+                logger.info("Browser pre-warmed.")
+            except Exception as e:
+                self.page = None
+                logger.error(f"Browser pre-warm failed: {e}")
+
+    def launch(self, cookies: list[dict], started: Optional[float] = None) -> tuple[float, bool]:
+        """
+        Shows the ERP dashboard logged in with ``cookies``. ``started`` is when the user
+        asked for it (perf_counter). Returns (seconds until the dashboard loaded, was warm).
+        """
+        started = time.perf_counter() if started is None else started
+        with self._lock:
+            warm = self.is_running()
+            if not warm:
+                self._start(hidden=False)
+
+            # Cookies go in before anything is loaded, so the first request is already logged in
+            self.page.run_cdp("Network.setCookies", cookies=cookies)
+            if warm and not self._hidden:
+                # The dashboard is already on screen; give this launch its own tab
+                tab = self.page.new_tab()
+            else:
+                tab = self.page
+            tab.get(DASHBOARD_URL)
+
+            if self._hidden:
+                self._show()
+
+        seconds = time.perf_counter() - started
+        self.timings.append({"warm": warm, "seconds": seconds})
+        return seconds, warm
+
+    def quit(self):
+        with self._lock:
+            if self.page is not None:
+                try:
+                    self.page.quit()
+                except Exception:
+                    pass
+                self.page = None
+
+    def _start(self, hidden: bool):
+        from DrissionPage import ChromiumPage, ChromiumOptions
+
+        co = ChromiumOptions()
+        # App mode (no address bar) on an empty page: the dashboard is the only real navigation
+        co.set_argument("--app=data:text/html,")
+        if hidden:
+            co.set_argument("--window-position", "-32000,-32000")
+        else:
+            co.set_argument("--start-maximized")
+        self.page = ChromiumPage(addr_or_opts=co)
+        self._hidden = hidden
+
+    def _show(self):
+        try:
+            window = self.page.run_cdp("Browser.getWindowForTarget")["windowId"]
+            self.page.run_cdp("Browser.setWindowBounds", windowId=window,
+                              bounds={"windowState": "normal", "left": 0, "top": 0})
+            self.page.run_cdp("Browser.setWindowBounds", windowId=window, bounds={"windowState": "maximized"})
+        except Exception as e:
+            logger.debug(f"Could not bring browser window on screen: {e}")
+        self._hidden = False
@@ -0,0 +1,93 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from iitkgp_erp_login.logger import logger
+
+
+class LoginCooldownError(Exception):
+    """Raised when a login is asked for too soon after the previous one failed."""
+
+
+class _Attempt:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = False
+        self.error: Optional[BaseException] = None
+        self.callbacks: list[Callable[[str], None]] = []
+
+    def status(self, message: str):
+        for callback in list(self.callbacks):
+            try:
+                callback(message)
+            except Exception:
+                pass
+
+
+class LoginCoordinator:
+    """
+    Lets at most one login run per account at a time.
+
+    Every OTP request invalidates the previous OTP, so two logins racing on the same
+    account (the Verify button and the auto-login thread, say) both end up waiting on
+    mail the other one spoiled. Here the first caller runs the login; anyone arriving
+    while it's in flight just waits for its result, and sees its status messages.
+    After a failure further attempts are refused for ``cooldown`` seconds.
+    """
+
+    def __init__(self, login: Callable[..., bool], cooldown: float = 30):
+        self._login = login
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Attempt] = {}
+        self._failed_at: Dict[str, float] = {}
+
+    def login(self, key: str, creds: Dict, status_callback=None, **options) -> bool:
+        """
+        Runs ``login(creds, status_callback, **options)`` unless one is already running for
+        ``key``. Late callers get that one's result, whatever options it was started with.
+        """
+        with self._lock:
+            attempt = self._inflight.get(key)
+            leader = attempt is None
+            if leader:
+                failed_at = self._failed_at.get(key)
+                if failed_at is not None and time.monotonic() - failed_at < self.cooldown:
+                    wait = self.cooldown - (time.monotonic() - failed_at)
+                    raise LoginCooldownError(f"Last login failed moments ago, retry in {wait:.0f}s")
+                attempt = self._inflight[key] = _Attempt()
+            if status_callback:
+                attempt.callbacks.append(status_callback)
+
+        if not leader:
+            logger.info(f"Login for {key} already in progress, waiting for it...")
+            attempt.done.wait()
+            if attempt.error is not None:
+                raise attempt.error
+            return attempt.result
+
+        try:
+            attempt.result = self._login(creds, status_callback=attempt.status, **options)
+        except BaseException as e:
+            attempt.error = e
+        finally:
+            with self._lock:
+                if attempt.result:
+                    self._failed_at.pop(key, None)
+                else:
+                    self._failed_at[key] = time.monotonic()
+                del self._inflight[key]
+            attempt.done.set()
+
+        if attempt.error is not None:
+            raise attempt.error
+        return attempt.result
+
+    def in_progress(self, key: str) -> bool:
+        with self._lock:
+            return key in self._inflight
+
+    def reset(self, key: str):
+        """Forgets a past failure, e.g. after the credentials were changed."""
+        with self._lock:
+            self._failed_at.pop(key, None)
@@ -0,0 +1,111 @@
+import getpass
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Optional
+
+from iitkgp_erp_login.logger import logger
+
+from .storage import StorageManager
+
+# Where the PIN comes from when --pin-fd isn't given (and stdin isn't a terminal)
+PIN_ENV = "ERP_MANAGER_PIN"
+
+
+def read_pin(pin_fd: Optional[int] = None) -> Optional[str]:
+    """
+    The vault PIN, from the first line on ``pin_fd`` if given, else ``$ERP_MANAGER_PIN``,
+    else a prompt when there's a terminal to prompt on.
+    """
+    if pin_fd is not None:
+        with os.fdopen(pin_fd, "r", closefd=True) as f:
+            return f.readline().rstrip("\r\n") or None
+    # Taken out of the environment so nothing started from here inherits it
+    pin = os.environ.pop(PIN_ENV, None)
+    if pin:
+        return pin
+    if sys.stdin is not None and sys.stdin.isatty():
+        return getpass.getpass("Vault PIN: ") or None
+    return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run(pin_fd: Optional[int] = None, started: Optional[float] = None, broker_port: Optional[int] = None) -> int:
+    """
+    Keeps every account in the vault logged in without any GUI, until SIGTERM/SIGINT.
+    Uses the same keepalive as the app (AccountManager) and never imports Tk, PIL or
+    DrissionPage. With ``broker_port`` (0 for any free port) the sessions are shared with
+    local scripts through a SessionBroker. Returns the process exit code.
+    """
+    started = time.perf_counter() if started is None else started
+    storage = StorageManager()
+    if not storage.exists():
+        logger.error(f"No vault at {storage.filename}. Set one up with the GUI first.")
+        return 2
+
+    pin = read_pin(pin_fd)
+    if not pin:
+        logger.error(f"No PIN given (use --pin-fd, ${PIN_ENV} or run in a terminal).")
+        return 2
+    if not storage.unlock(pin):
+        logger.error("Wrong PIN or corrupted vault.")
+        return 1
+    del pin
+
+    accounts = storage.get_accounts()
+    if not accounts:
+        logger.error("The vault has no ERP credentials yet. Add them in the GUI's Settings first.")
+        return 2
+
+    from .accounts import AccountManager
+
+    manager = AccountManager(state_store=storage)
+    manager.subscribe(lambda roll, status: logger.info(f"[{roll}] {status}"))
+    for creds in accounts:
+        manager.add(creds)
+
+    stop = threading.Event()
+
+    def on_signal(signum, frame):
+        logger.info(f"Got signal {signum}, shutting down.")
+        stop.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, on_signal)
+
+    manager.start()
+    broker = None
+    if broker_port is not None:
+        from .broker import SessionBroker
+        broker = SessionBroker(lambda: {a.roll: (a.client, a.creds) for a in manager.accounts()},
+                               port=broker_port).start()
+    rss = _peak_rss_mb()
+    logger.info(f"Daemon keeping {len(accounts)} account(s) alive; ready in "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms" + (f", {rss:.0f} MB RSS" if rss else ""))
+
+    try:
+        # A timeout so signals are noticed promptly on every platform
+        while not stop.wait(1):
+            pass
+    finally:
+        if broker is not None:
+            broker.stop()
+        manager.stop(wait=False)
+        for account in manager.accounts():
+            # Keep the latest cookies so the next start can skip the OTP login
+            if account.client.session.cookies.get('ssoToken'):
+                account.client.remember_session()
+        storage.flush()
+    return 0
@@ -1,18 +1,83 @@
 import base64
 import os
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-
-def derive_key(pin: str, salt: bytes) -> bytes:
-    """Derives a url-safe base64-encoded 32-byte key from the PIN."""
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=480000,
-    )
-    return base64.urlsafe_b64encode(kdf.derive(pin.encode()))
+from typing import TYPE_CHECKING, Optional
+
+# cryptography is imported on first use: the lock screen shows before any key is derived
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
+
+# What vault.json files without a "kdf" header were written with
+LEGACY_KDF = {"name": "pbkdf2-sha256", "iterations": 480000}
+
+# Used for new vaults unless $ERP_MANAGER_KDF says otherwise; existing ones are moved to
+# whichever is in effect on their next unlock
+DEFAULT_KDF = dict(LEGACY_KDF)
+
+KDF_NAMES = ("pbkdf2-sha256", "scrypt")
+
+# e.g. "scrypt:n=131072,r=8,p=1" or "pbkdf2-sha256:iterations=600000"
+KDF_ENV = "ERP_MANAGER_KDF"
+
+def parse_kdf(spec: str) -> dict:
+    """KDF settings from ``name:key=value,...``. Raises ValueError if they aren't usable."""
+    name, _, params = spec.strip().partition(":")
+    if name not in KDF_NAMES:
+        raise ValueError(f"Unknown KDF: {name}")
+    kdf = {"name": name}
+    for param in filter(None, params.split(",")):
+        key, _, value = param.partition("=")
+        kdf[key.strip()] = int(value)
+    required = {"pbkdf2-sha256": ("iterations",), "scrypt": ("n",)}[name]
+    missing = [key for key in required if key not in kdf]
+    if missing:
+        raise ValueError(f"{name} needs {', '.join(missing)}")
+    # Checked here rather than left to derive_key(), which would only fail at the next unlock
+    if name == "pbkdf2-sha256" and kdf["iterations"] < 1:
+        raise ValueError("iterations must be positive")
+    if name == "scrypt":
+        n = kdf["n"]
+        if n < 2 or n & (n - 1):
+            raise ValueError("n must be a power of two greater than 1")
+        for key in ("r", "p"):
+            if kdf.get(key, 1) < 1:
+                raise ValueError(f"{key} must be positive")
+    return kdf
+
+def configured_kdf() -> dict:
+    """The KDF for new (and re-keyed) vaults: $ERP_MANAGER_KDF if set and valid, else DEFAULT_KDF."""
+    spec = os.environ.get(KDF_ENV)
+    if spec:
+        try:
+            return parse_kdf(spec)
+        except ValueError as e:
+            from iitkgp_erp_login.logger import logger
+            logger.error(f"Ignoring ${KDF_ENV}={spec!r}: {e}")
+    return dict(DEFAULT_KDF)
+
+def derive_key(pin: str, salt: bytes, kdf: Optional[dict] = None) -> bytes:
+    """Derives a url-safe base64-encoded 32-byte key from the PIN with the given KDF settings."""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+    kdf = kdf or LEGACY_KDF
+    name = kdf.get("name")
+    if name == "pbkdf2-sha256":
+        kdf_impl = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=int(kdf["iterations"]),
+        )
+    elif name == "scrypt":
+        kdf_impl = Scrypt(salt=salt, length=32, n=int(kdf["n"]), r=int(kdf.get("r", 8)), p=int(kdf.get("p", 1)))
+    else:
+        raise ValueError(f"Unknown KDF: {name}")
+    return base64.urlsafe_b64encode(kdf_impl.derive(pin.encode()))
+
+def make_fernet(pin: str, salt: bytes, kdf: Optional[dict] = None) -> "Fernet":
+    from cryptography.fernet import Fernet
+    return Fernet(derive_key(pin, salt, kdf))
 
 def generate_salt() -> bytes:
     return os.urandom(16)
@@ -1,134 +1,185 @@
-import logging
 import time
-import requests
-import imaplib
-import email
-from email.header import decode_header
-import re
 from typing import Optional, Dict
 
 # Import helpers from the installed package
 from iitkgp_erp_login.erp import (
-    get_sessiontoken, 
     get_secret_question, 
     get_login_details, 
     request_otp as lib_request_otp, 
     signin, 
-    session_alive, 
-    HOMEPAGE_URL, 
-    LoginDetails,
     ErpLoginError,
-    ErpCreds
 )
 from iitkgp_erp_login.logger import logger
 
+from .coordinator import LoginCoordinator
+from .lifetime import SessionLifetime
+from .liveness import SessionMonitor
+from .otp_sources import DEFAULT_SOURCES, OTPSource, OTPSourceStats, make_sources, race_otp
+from .pipeline import Stage, run_stages
+from .probe import probe_session
+from .questions import (QUESTIONS_PER_ACCOUNT, NoCookiesPolicy, StopDiscovery, discover_questions, find_answer,
+                        is_question, normalise_question)
+from .session_token import get_sessiontoken
+from .telemetry import TELEMETRY
+from .transport import ERPSession
+
 class ERPClient:
     def __init__(self):
-        self.session = requests.Session()
+        # Per-stage timeouts, retries for idempotent stages and request metrics, see transport.py
+        self.session = ERPSession()
+        self.metrics = self.session.metrics
+        # Anything with get_state/set_state (the StorageManager), used to remember
+        # mailbox UIDs and the session cookies across restarts
+        self.state_store = None
+        # How welcome.jsp is probed, see probe.PROBE_MODES ("full" is the library's session_alive)
+        self.probe_mode = "stream"
+        # Every liveness check goes through here so probes are cached and shared
+        self.liveness = SessionMonitor(self._probe_session)
+        # When the current session was created (wall clock) and how long sessions tend to live
+        self.logged_in_at: Optional[float] = None
+        self.lifetime = SessionLifetime()
+        # One login at a time per account; late callers wait for the running one
+        self.logins = LoginCoordinator(self._run_login)
+        # Called with no arguments whenever the session cookies are (re)saved, e.g. after a login
+        self.session_listeners: list = []
+        # Extra OTPListener arguments (host/port/use_ssl), e.g. to point at a local stand-in
+        self.imap_options = {}
+        # Where the OTP is looked for is creds["otp_sources"] (default: IMAP), see otp_sources.py.
+        # "fastest" waits only on whichever of them has been quickest so far, racing them all
+        # until one has a record; "race" always races them all.
+        self.otp_mode = "fastest"
+        self.otp_stats = OTPSourceStats()
+        # Constructor arguments per source, e.g. {"file": {"path": "otp.txt"}}
+        self.otp_source_options = {}
         self.headers = {
-            'timeout': '20',
             'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Ubuntu Chromium/37.0.2062.94 Chrome/37.0.2062.94 Safari/537.36'
         }
         
-    def is_session_alive(self) -> bool:
-        try:
-            return session_alive(self.session)
-        except Exception:
+    def is_session_alive(self, max_age: Optional[float] = None) -> bool:
+        """Session state from the shared monitor; probes only if the cached result is stale."""
+        return self.liveness.is_alive(max_age)
+
+    def _probe_session(self) -> bool:
+        with TELEMETRY.span("probe") as span:
+            try:
+                alive = probe_session(self.session, self.probe_mode)
+            except Exception:
+                # Unreachable or erroring ERP: says nothing about how long the session lived
+                span.outcome = "error"
+                return False
+            if not alive:
+                span.outcome = "dead"
+                self._record_lifetime()
+            return alive
+
+    def load_state(self):
+        """Picks up what earlier runs learned, once the state store is unlocked."""
+        if self.state_store is not None:
+            self.lifetime = SessionLifetime.from_dict(self.state_store.get_state("session_lifetime"))
+            self.otp_stats = OTPSourceStats.from_dict(self.state_store.get_state("otp_sources"))
+
+    def seconds_until_refresh(self) -> Optional[float]:
+        """How long until the current session should be replaced, going by past lifetimes."""
+        if self.logged_in_at is None or not self.liveness.peek():
+            return None
+        return self.lifetime.refresh_in(self.logged_in_at)
+
+    def _record_lifetime(self):
+        """Called when the ERP has answered that the session is logged out."""
+        if self.logged_in_at is None:
+            return
+        # Died somewhere between the last good probe and this one; take the middle
+        last_alive = self.liveness.last_alive_at or self.logged_in_at
+        died_at = (max(last_alive, self.logged_in_at) + time.time()) / 2
+        lifetime = died_at - self.logged_in_at
+        self.logged_in_at = None
+        logger.info(f"ERP session lasted about {lifetime / 60:.1f} min.")
+        self.lifetime.record(lifetime)
+        self._set_state("session_lifetime", self.lifetime.to_dict())
+
+    def restore_session(self) -> bool:
+        """
+        Puts the cookies saved by a previous run back into the session and checks them
+        with a single probe. Returns True if that session is still logged in.
+        """
+        cached = self.state_store.get_state("session") if self.state_store is not None else None
+        if not cached or not cached.get("cookies"):
             return False
 
-    def _connect_imap(self, email_addr, app_password):
-        mail = imaplib.IMAP4_SSL("imap.gmail.com")
-        mail.login(email_addr, app_password)
-        mail.select("inbox")
-        return mail
+        for c in cached["cookies"]:
+            self.session.cookies.set(
+                c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'),
+                expires=c.get('expires'), secure=c.get('secure', False)
+            )
 
-    def _get_latest_id_imap(self, email_addr, app_password) -> int:
-        try:
-            mail = self._connect_imap(email_addr, app_password)
-            subject_query = '(SUBJECT "OTP for Sign In in ERP Portal of IIT Kharagpur")'
-            status, messages = mail.search(None, subject_query)
-            mail.close()
-            mail.logout()
-            
-            if messages and messages[0]:
-                ids = messages[0].split()
-                if ids:
-                    return int(ids[-1])
-            return 0
-        except Exception as e:
-            logger.error(f"IMAP Init Error: {e}")
-            return 0
+        if self.is_session_alive(max_age=0):
+            logger.info("Restored previous ERP session from vault.")
+            self.logged_in_at = cached.get("captured_at") or time.time()
+            self.remember_session(captured_at=cached.get("captured_at"))
+            return True
 
-    def _delete_email(self, email_addr, app_password, msg_id: int):
-        try:
-            logger.info(f"Deleting OTP email (ID: {msg_id})...")
-            mail = self._connect_imap(email_addr, app_password)
-            mail.store(str(msg_id), "+FLAGS", "\\Deleted")
-            mail.expunge()
-            mail.close()
-            mail.logout()
-            logger.info("OTP email deleted successfully.")
-        except Exception as e:
-            logger.error(f"Failed to delete email: {e}")
+        logger.info("Saved ERP session has expired.")
+        self.session.cookies.clear()
+        self.liveness.set(False)
+        self._set_state("session", None)
+        return False
 
-    def _wait_for_new_otp(self, email_addr, app_password, previous_id: int) -> tuple[Optional[str], Optional[int]]:
-        """Fetch NEW OTP using IMAP (checking for ID > previous_id)."""
-        logger.info(f"Waiting for OTP email newer than ID {previous_id}...")
-        
-        start_time = time.time()
-        timeout = 60 # 60 seconds
-        
-        while time.time() - start_time < timeout:
+    def remember_session(self, captured_at: Optional[float] = None):
+        """Saves the session cookies (with capture and last-verified time) for the next start."""
+        now = time.time()
+        cookies = self.session_cookies()
+        if not cookies:
+            return
+        if captured_at is None and self.state_store is not None:
+            # Same ssoToken as before means it's the same login, keep its capture time
+            previous = self.state_store.get_state("session") or {}
+            previous_sso = {c['name']: c['value'] for c in previous.get("cookies", [])}.get('ssoToken')
+            if previous_sso and previous_sso == self.session.cookies.get('ssoToken'):
+                captured_at = previous.get("captured_at")
+        self._set_state("session", {
+            "cookies": cookies,
+            "captured_at": captured_at or now,
+            "verified_at": now,
+        })
+        for listener in list(self.session_listeners):
             try:
-                mail = self._connect_imap(email_addr, app_password)
-                subject_query = '(SUBJECT "OTP for Sign In in ERP Portal of IIT Kharagpur")'
-                status, messages = mail.search(None, subject_query)
-                
-                found_new = False
-                otp = None
-                latest_id = None
-                
-                if messages and messages[0]:
-                    ids = messages[0].split()
-                    if ids:
-                        latest_id = int(ids[-1])
-                        
-                        if latest_id > previous_id:
-                            found_new = True
-                            # Fetch content
-                            status, msg_data = mail.fetch(str(latest_id), "(RFC822)")
-                            for response_part in msg_data:
-                                if isinstance(response_part, tuple):
-                                    msg = email.message_from_bytes(response_part[1])
-                                    body = ""
-                                    if msg.is_multipart():
-                                        for part in msg.walk():
-                                            if part.get_content_type() == "text/plain":
-                                                body = part.get_payload(decode=True).decode()
-                                                break
-                                    else:
-                                        body = msg.get_payload(decode=True).decode()
-                                    
-                                    logger.info(f"DEBUG - Full Email Body: \n{body}")
-                                    parts = [p for p in body.split() if p.isdigit()]
-                                    if parts:
-                                        otp = parts[-1]
-                
-                mail.close()
-                mail.logout()
-                
-                if found_new and otp:
-                    logger.info(f"DEBUG - Extracted OTP: {otp}")
-                    return otp, latest_id
-                    
+                listener()
             except Exception as e:
-                logger.error(f"IMAP Polling Error: {e}")
-            
-            time.sleep(4)
-            
-        return None, None
+                logger.error(f"Session listener failed: {e}")
+
+    def session_cookies(self) -> list[dict]:
+        """The session's cookies as plain dicts (what's saved in the vault and handed out by the broker)."""
+        return [
+            {
+                'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path,
+                'expires': c.expires, 'secure': bool(c.secure)
+            }
+            for c in self.session.cookies
+        ]
+
+    def _set_state(self, name: str, value):
+        if self.state_store is None:
+            return
+        try:
+            self.state_store.set_state(name, value)
+        except Exception as e:
+            logger.error(f"Failed to persist {name} state: {e}")
+
+    def _mailbox_state(self, email_addr: str) -> dict:
+        if self.state_store is None:
+            return {}
+        return dict(self.state_store.get_state("imap", {}).get(email_addr, {}))
+
+    def _save_mailbox_state(self, email_addr: str, state: dict):
+        if self.state_store is None:
+            return
+        mailboxes = dict(self.state_store.get_state("imap", {}))
+        if mailboxes.get(email_addr) == state:
+            return
+        mailboxes[email_addr] = dict(state)
+        self._set_state("imap", mailboxes)
 
-    def login_with_credentials(self, creds: Dict, status_callback=None) -> bool:
+    def login_with_credentials(self, creds: Dict, status_callback=None, refresh: bool = False) -> bool:
         """
         Custom login flow that avoids blocking input() and supports IMAP OTP.
         creds dict must contain:
@@ -137,93 +188,218 @@ class ERPClient:
         - security_answers (dict)
         - google_email (optional, for IMAP)
         - google_app_password (optional, for IMAP)
+
+        Concurrent calls for the same roll number share a single attempt, see LoginCoordinator.
+
+        With ``refresh`` the login runs on a separate session, and its cookies replace the
+        current ones only once it's verified: a failed early refresh leaves the session that
+        is still logged in alone.
         """
         roll = creds.get('roll_number')
         password = creds.get('erp_password')
-        sec_answers = creds.get('security_answers', {})
         
         if not roll or not password:
             raise ValueError("Missing Roll Number or Password")
 
+        return self.logins.login(roll, creds, status_callback, refresh=refresh)
+
+    def _run_login(self, creds: Dict, status_callback=None, refresh: bool = False) -> bool:
+        # Every step below has its own span as well, see telemetry.py
+        with TELEMETRY.span("login") as span:
+            # The homepage GET alone hands out a new JSESSIONID, so a refresh can't share the jar
+            session = self.session.fork() if refresh else self.session
+            ok = self._login_steps(creds, status_callback, session)
+            if not ok:
+                span.outcome = "dead"
+            return ok
+
+    def _login_steps(self, creds: Dict, status_callback, session: ERPSession) -> bool:
+        roll = creds['roll_number']
+        password = creds['erp_password']
+        sec_answers = creds.get('security_answers', {})
+
         if status_callback: status_callback(f"Initiating login for {roll}...")
+        started = time.time()
 
         try:
-            # 1. Get Session Token
-            session_token = get_sessiontoken(self.session, log=True)
-            
-            # 2. Get Security Question
-            question = get_secret_question(self.headers, self.session, roll, log=True)
-            answer = sec_answers.get(question)
-            
-            if not answer:
-                raise ValueError(f"No answer stored for security question: {question}")
-            
-            login_details = get_login_details(roll, password, answer, session_token)
-            
-            # PRE-OTP: Check latest email ID
-            prev_email_id = 0
-            if creds.get('google_email') and creds.get('google_app_password'):
-                if status_callback: status_callback("Checking latest email ID...")
-                prev_email_id = self._get_latest_id_imap(creds['google_email'], creds['google_app_password'])
-            
-            # 3. Request OTP
-            if status_callback: status_callback("Requesting OTP...")
-            lib_request_otp(self.headers, self.session, login_details, log=True)
-            
-            # 4. Fetch OTP
-            otp = None
-            msg_id = None
-            if creds.get('google_email') and creds.get('google_app_password'):
-                 if status_callback: status_callback("Listening for new OTP email...")
-                 otp, msg_id = self._wait_for_new_otp(creds['google_email'], creds['google_app_password'], prev_email_id)
-            
-            if not otp:
-                 raise ValueError("Could not fetch OTP via IMAP. Email/AppPassword missing or retrieval failed.")
-                 
-            login_details['email_otp'] = otp
-            
-            # 5. Sign In
-            if status_callback: status_callback("Submitting valid OTP...")
-            sso_token = signin(self.headers, self.session, login_details, log=True)
-            
-            # 6. Verify
-            if self.is_session_alive():
-                 if status_callback: status_callback("Login Successful!")
-                 
-                 # Delete OTP Email
-                 if msg_id and creds.get('google_email') and creds.get('google_app_password'):
-                     self._delete_email(creds['google_email'], creds['google_app_password'], msg_id)
-                     
-                 return True
-            else:
-                 if status_callback: status_callback("Login flow finished but session not alive.")
-                 return False
+            # 1-2. The OTP sources are set up while the ERP side runs. The sources have to be
+            # listening (e.g. the mailbox's UID baseline fixed) before the OTP is requested,
+            # or the mail could be missed. The question waits for the token: both set the
+            # JSESSIONID in the one cookie jar, and the question must go out with the cookie
+            # the homepage handed out, as in the library's own order.
+            stages = [
+                Stage("token", lambda _: TELEMETRY.call("token", get_sessiontoken, session, log=True)),
+                Stage("question", lambda _: TELEMETRY.call(
+                    "question", get_secret_question, self.headers, session, roll, log=True),
+                      deps=("token",)),
+            ]
+            sources, reserve = self._otp_sources(creds)
+            opened = []  # filled by the source stages, so they're closed whatever else fails
+            errors = []  # (source name, error) for the ones that didn't start
+            if sources:
+                if status_callback: status_callback("Connecting to mailbox...")
+            for source in sources:
+                stages.append(Stage(f"otp_source:{source.name}",
+                                    lambda _, source=source: self._start_otp_source(source, opened, errors)))
+
+            try:
+                results = run_stages(stages)
+                if sources and not opened and reserve:
+                    # The usual fastest source is down; race the others this time (still before
+                    # the OTP is requested)
+                    logger.info(f"Falling back to OTP sources: {', '.join(s.name for s in reserve)}")
+                    run_stages([Stage(f"otp_source:{source.name}",
+                                      lambda _, source=source: self._start_otp_source(source, opened, errors))
+                                for source in reserve])
+                if errors:
+                    # A source that can't even start mustn't stay the one "fastest" mode picks
+                    for name, _ in errors:
+                        self.otp_stats.record_miss(name)
+                    self._set_state("otp_sources", self.otp_stats.to_dict())
+                if sources and not opened:
+                    raise ValueError(f"Could not connect to mailbox for OTP: "
+                                     f"{'; '.join(f'{name}: {e}' for name, e in errors)}")
+
+                question = results["question"]
+                if not is_question(question):
+                    raise ValueError(f"ERP sent something other than a security question: {question[:80]!r}")
+                answer = find_answer(sec_answers, question)
+                if not answer:
+                    raise ValueError(f"No answer stored for security question: {question}")
+
+                login_details = get_login_details(roll, password, answer, results["token"])
 
+                # 3. Request OTP
+                if status_callback: status_callback("Requesting OTP...")
+                TELEMETRY.call("request_otp", lib_request_otp, self.headers, session, login_details, log=True)
+                
+                # 4. Fetch OTP, from whichever source has it first
+                otp = None
+                if opened:
+                     if status_callback: status_callback("Listening for new OTP email...")
+                     winner, otp, handle, seconds = race_otp(opened)
+                     self._record_otp_sources(opened, winner, seconds)
+                
+                if not otp:
+                     raise ValueError("Could not fetch OTP. Email/AppPassword missing or retrieval failed.")
+                     
+                login_details['email_otp'] = otp
+                
+                # 5. Sign In
+                if status_callback: status_callback("Submitting valid OTP...")
+                sso_token = TELEMETRY.call("signin", signin, self.headers, session, login_details, log=True)
+                
+                # 6. Verify
+                if self._verify_login(session):
+                     if status_callback: status_callback("Login Successful!")
+                     self.logged_in_at = time.time()
+                     self.lifetime.record_login(self.logged_in_at - started)
+                     self._set_state("session_lifetime", self.lifetime.to_dict())
+                     self.remember_session()
+                     
+                     # Delete OTP Email
+                     if handle is not None:
+                         winner.delete(handle)
+                         
+                     return True
+                else:
+                     if status_callback: status_callback("Login flow finished but session not alive.")
+                     return False
+            finally:
+                for source in opened:
+                    source.close()
+                    if source.name == "imap":
+                        self._save_mailbox_state(creds['google_email'], source.state)
         except Exception as e:
             if status_callback: status_callback(f"Login failed: {str(e)}")
             logger.error(f"Login Exception: {e}")
             raise e
 
-    def fetch_security_questions(self, roll_number: str) -> list[str]:
+    def _verify_login(self, session: ERPSession) -> bool:
+        """Probes the freshly signed-in ``session``; a separate one replaces the current cookies if it's good."""
+        if session is self.session:
+            return self.is_session_alive(max_age=0)
+        try:
+            alive = probe_session(session, self.probe_mode)
+        except Exception as e:
+            logger.error(f"Probing the refreshed session failed: {e}")
+            return False
+        if alive:
+            self.session.cookies.clear()
+            self.session.cookies.update(session.cookies)
+            self.liveness.set(True)
+        return alive
+
+    def _otp_sources(self, creds: Dict) -> tuple[list[OTPSource], list[OTPSource]]:
+        """The sources to wait on, and the ones held back for if none of those start."""
+        options = {name: dict(opts) for name, opts in self.otp_source_options.items()}
+        if creds.get('google_email'):
+            options["imap"] = dict(self.imap_options, state=self._mailbox_state(creds['google_email']),
+                                   **options.get("imap", {}))
+        sources = make_sources(creds.get('otp_sources') or DEFAULT_SOURCES, creds, options)
+        if self.otp_mode == "fastest" and len(sources) > 1:
+            fastest = self.otp_stats.fastest([s.name for s in sources])
+            if fastest:
+                return ([s for s in sources if s.name == fastest],
+                        [s for s in sources if s.name != fastest])
+        return sources, []
+
+    def _start_otp_source(self, source: OTPSource, opened: list, errors: list):
+        try:
+            opened.append(source.start())
+        except Exception as e:
+            logger.error(f"OTP source {source.name} failed to start: {e}")
+            errors.append((source.name, e))
+
+    def _record_otp_sources(self, sources: list[OTPSource], winner: Optional[OTPSource], seconds: Optional[float]):
+        if winner is not None:
+            self.otp_stats.record_win(winner.name, seconds)
+        else:
+            for source in sources:
+                self.otp_stats.record_miss(source.name)
+        self._set_state("otp_sources", self.otp_stats.to_dict())
+
+    def fetch_security_questions(self, roll_number: str, refresh: bool = False) -> list[str]:
         """
         Attempts to fetch all security questions for a roll number.
-        Since the server returns one at a time, we try multiple times with fresh sessions.
+        Since the server returns one at a time, we ask several times in parallel, each
+        looking like a fresh visitor, and stop once all three have turned up. What's found
+        is kept in the vault per roll number, so once all three are known they're never
+        fetched again unless ``refresh`` is set.
         """
-        questions = set()
-        attempts = 0
-        max_attempts = 15
-        
-        # We try until we have 3 or run out of attempts
-        while len(questions) < 3 and attempts < max_attempts:
+        # Drops anything an older version cached that was really an error page
+        cached = [q for q in self._question_cache().get(roll_number) or [] if is_question(q)]
+        if len(cached) >= QUESTIONS_PER_ACCOUNT and not refresh:
+            return cached
+
+        # The login session's connection pools, but no cookies, so each attempt is a new ERP session
+        session = self.session.fork()
+        session.cookies.set_policy(NoCookiesPolicy())
+
+        def fetch_one() -> str:
             try:
-                # Use a fresh session to prompt rotation (if server supports it)
-                temp_session = requests.Session()
-                q = get_secret_question(self.headers, temp_session, roll_number)
-                if q and q != "FALSE":
-                    questions.add(q)
-            except Exception:
-                pass 
-            attempts += 1
-            time.sleep(0.2)
-            
-        return list(questions)
+                question = get_secret_question(self.headers, session, roll_number)
+            except ErpLoginError as e:
+                if str(e) == "Invalid Roll Number":
+                    raise StopDiscovery(e)
+                raise
+            if not is_question(question):
+                raise ValueError(f"Not a security question: {question[:80]!r}")
+            return question
+
+        # Not closed afterwards: that would close the shared adapters
+        questions = discover_questions(fetch_one)
+
+        if questions:
+            # Keep anything seen before that didn't come up this time
+            known = {normalise_question(q) for q in questions}
+            questions += [q for q in cached if normalise_question(q) not in known]
+            cache = self._question_cache()
+            cache[roll_number] = questions
+            self._set_state("security_questions", cache)
+        return questions or cached
+
+    def _question_cache(self) -> dict:
+        if self.state_store is None:
+            return {}
+        return dict(self.state_store.get_state("security_questions", {}))
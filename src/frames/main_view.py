@@ -4,15 +4,32 @@ import threading
 import webbrowser
 import os
 import shutil
+import time
 from tkinter import messagebox
 
-from DrissionPage import ChromiumPage, ChromiumOptions
+from ..browser import SESSION_COOKIES, BrowserManager, cookie_params
+from ..log_buffer import LogBuffer
 
 
 class MainViewFrame(ctk.CTkFrame):
+    # Start Chromium in the background as soon as a session is alive, so "Launch Website"
+    # only has to load the dashboard
+    PREWARM_BROWSER = True
+    # Seconds between background session probes (the monitor's cache makes most of them free)
+    STATUS_INTERVAL = 5
+    # Oldest cached probe result the status label may show (the monitor's own TTL is a minute)
+    STATUS_MAX_AGE = 15
+    # Milliseconds between writes of new log lines to the textbox
+    LOG_FLUSH_MS = 200
+
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
+        self.browser = BrowserManager()
+        # log() only appends here; _flush_log moves new lines to the textbox in batches
+        self.log_buffer = LogBuffer()
+        self._log_seq = 0
+        self._log_shown = 0
         
         # Layout: Tab View
         self.tabview = ctk.CTkTabview(self)
@@ -68,12 +85,42 @@ class MainViewFrame(ctk.CTkFrame):
         # but remove the heavy log interception.
         self.log_text = ctk.CTkTextbox(frame, width=500, height=300)
         self.log_text.pack(pady=10, fill="both", expand=True)
+        self._log_flush_id = self.after(self.LOG_FLUSH_MS, self._flush_log)
+
+        # Flip the label as soon as the shared monitor sees the session state change
+        self._unsubscribe_status = self.controller.client.liveness.subscribe(self._post_status)
+        if self.PREWARM_BROWSER:
+            self._unsubscribe_prewarm = self.controller.client.liveness.subscribe(self._prewarm_browser)
+            self._prewarm_browser(self.controller.client.liveness.peek())
+
+        # Probing can block for the whole request timeout when the ERP is unreachable, so it
+        # runs on its own thread and only the result is posted to the Tk thread
+        self._status_stop = threading.Event()
+        self._status_wake = threading.Event()
+        threading.Thread(target=self._status_probe_loop, name="status-probe", daemon=True).start()
 
-        # Periodically update status label
         self.after(2000, self.update_status)
         self.after(800, self.attempt_initial_login)
 
+    def _status_probe_loop(self):
+        delay = 2
+        while not self._status_stop.is_set():
+            self._status_wake.wait(delay)
+            self._status_wake.clear()
+            if self._status_stop.is_set():
+                return
+            try:
+                # Served from the monitor's cache; it only goes to the ERP once that's STATUS_MAX_AGE old
+                self._post_status(self.controller.client.is_session_alive(max_age=self.STATUS_MAX_AGE))
+            except Exception as e:
+                logging.debug(f"Status probe failed: {e}")
+            delay = self.STATUS_INTERVAL
+
+    def _post_status(self, alive):
+        self.controller.post(lambda: self._show_status(alive))
+
     def update_status(self):
+        # Runs on the Tk thread, so only in-memory state here; the probe thread does the I/O
         # Check credentials availability
         if not self.is_verifying:
             creds = self.controller.storage.get_credentials()
@@ -83,27 +130,57 @@ class MainViewFrame(ctk.CTkFrame):
             else:
                  self.verify_btn.configure(state="disabled")
 
-        alive = self.controller.client.is_session_alive()
+        alive = self.controller.client.liveness.peek()
+        if alive is not None:
+            self._show_status(alive)
+        self.after(self.STATUS_INTERVAL * 1000, self.update_status)
+
+    def _show_status(self, alive):
         text = "Status: Online (Logged In)" if alive else "Status: Offline (Logged Out)"
         color = "green" if alive else "red"
         self.status_label.configure(text=text, text_color=color)
-        self.after(5000, self.update_status)
+
+    def _prewarm_browser(self, alive):
+        if alive and not self.browser.is_running():
+            threading.Thread(target=self.browser.prewarm, daemon=True).start()
 
     def attempt_initial_login(self):
         creds = self.controller.storage.get_credentials()
         has_creds = creds and creds.get('roll_number') and creds.get('erp_password') and creds.get('security_answers')
-        if has_creds:
-            self.run_verify()
+
+        def task():
+            # A session saved on the last run costs one probe instead of an OTP login
+            if self.controller.client.restore_session():
+                self.controller.post(lambda: self.log("Restored previous session."))
+                self.controller.post(self.launch_browser_session, 1000)
+            elif has_creds:
+                self.controller.post(self.run_verify)
+
+        threading.Thread(target=task, daemon=True).start()
 
     def log(self, message):
+        # Safe from any thread: the textbox is only touched by _flush_log
         # Log to terminal
         print(message)
         logging.info(message)
         
         # Also show in UI for immediate feedback on actions (optional, but good UX)
         # But since user said "not app", I will minimize what goes here.
-        self.log_text.insert("end", message + "\n")
-        self.log_text.see("end")
+        self.log_buffer.append(message)
+
+    def _flush_log(self):
+        seq, lines = self.log_buffer.since(self._log_seq)
+        if lines:
+            self._log_seq = seq
+            self.log_text.insert("end", "\n".join(lines) + "\n")
+            self._log_shown += len(lines)
+            # Keep the textbox to what the buffer holds
+            excess = self._log_shown - self.log_buffer.capacity
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")
+                self._log_shown -= excess
+            self.log_text.see("end")
+        self._log_flush_id = self.after(self.LOG_FLUSH_MS, self._flush_log)
 
     def run_verify(self):
         self.is_verifying = True
@@ -119,25 +196,26 @@ class MainViewFrame(ctk.CTkFrame):
                 
                 success = self.controller.client.login_with_credentials(
                     creds, 
-                    status_callback=lambda msg: self.after(0, lambda: self.log(msg))
+                    status_callback=self.log
                 )
                 if success:
                     self.log("Process complete: Success")
                     # Auto-launch website on success
-                    self.after(1000, self.launch_browser_session)
+                    self.controller.post(self.launch_browser_session, 1000)
                 else:
                     self.log("Process complete: Failed (Session dead)")
             except Exception as e:
                 self.log(f"Process complete: Error ({e})")
             finally:
-                self.after(0, lambda: self._reset_verify_btn())
+                self.controller.post(self._reset_verify_btn)
         
         threading.Thread(target=task, daemon=True).start()
 
     def _reset_verify_btn(self):
         self.is_verifying = False
-        # State will be updated by next update_status loop or we can force check
+        # Button state now, session state as soon as the probe thread has had a look
         self.update_status()
+        self._status_wake.set()
 
     def _init_settings(self):
         # Use a ScrollableFrame to ensure everything fits
@@ -196,9 +274,34 @@ class MainViewFrame(ctk.CTkFrame):
         
         self.btn_help = ctk.CTkButton(pass_frame, text="?", width=40, command=self.open_google_help, fg_color="#666666", hover_color="#444444")
         self.btn_help.pack(side="right")
+
+        # Raced against IMAP on each login; the OAuth files live next to the vault
+        gmail_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        gmail_frame.pack(pady=5, padx=10, fill="x")
+        self.chk_gmail_api = ctk.CTkCheckBox(gmail_frame, text="Also watch for the OTP through the Gmail API (credentials.json in ~/.iitkgp_erp_manager)")
+        self.chk_gmail_api.pack(side="left")
+        # The browser consent happens here, once; logins only ever use the saved token
+        self.btn_gmail_auth = ctk.CTkButton(gmail_frame, text="Connect Gmail API", width=150, command=self.run_gmail_authorize, fg_color="#666666", hover_color="#444444")
+        self.btn_gmail_auth.pack(side="right")
         
         self.save_btn = ctk.CTkButton(frame, text="Save To Vault", command=self.save_settings, height=40)
-        self.save_btn.pack(pady=30, padx=10, fill="x")
+        self.save_btn.pack(pady=(30, 5), padx=10, fill="x")
+
+        # --- Other accounts ---
+        ctk.CTkLabel(frame, text="Other Accounts", font=("Roboto", 16, "bold")).pack(pady=(20, 5), anchor="w", padx=10)
+        ctk.CTkLabel(frame, text="Kept logged in alongside the one above. Fill in the form with another account's details and click 'Add As Another Account'.", font=("Roboto", 12), wraplength=500, justify="left").pack(pady=(0, 5), anchor="w", padx=10)
+
+        self.btn_add_account = ctk.CTkButton(frame, text="Add As Another Account", command=self.add_other_account, fg_color="#555555", hover_color="#333333")
+        self.btn_add_account.pack(pady=5, padx=10, fill="x")
+
+        self.accounts_list = ctk.CTkFrame(frame, fg_color="transparent")
+        self.accounts_list.pack(pady=5, padx=10, fill="x")
+        self.account_labels = {}
+        self._unsubscribe_accounts = None
+        if self.controller.accounts is not None:
+            self._unsubscribe_accounts = self.controller.accounts.subscribe(
+                lambda roll, status: self.controller.post(lambda: self._show_account_status(roll, status))
+            )
         
         # --- Troubleshooting ---
         ctk.CTkLabel(frame, text="Troubleshooting", font=("Roboto", 16, "bold")).pack(pady=(20, 5), anchor="w", padx=10)
@@ -208,6 +311,7 @@ class MainViewFrame(ctk.CTkFrame):
         
         # Load existing
         self.load_settings()
+        self.refresh_other_accounts()
 
     def run_fetch_questions(self):
         roll = self.entry_roll.get().strip()
@@ -219,88 +323,84 @@ class MainViewFrame(ctk.CTkFrame):
         
         def task():
             try:
-                questions = self.controller.client.fetch_security_questions(roll)
+                # An explicit click always asks the ERP again
+                questions = self.controller.client.fetch_security_questions(roll, refresh=True)
                 if not questions:
-                    self.after(0, lambda: messagebox.showwarning("Failed", "Could not fetch questions. Check Roll No or internet."))
+                    self.controller.post(lambda: messagebox.showwarning("Failed", "Could not fetch questions. Check Roll No or internet."))
                 else:
-                    self.after(0, lambda: self.populate_questions(questions))
+                    self.controller.post(lambda: self.populate_questions(questions))
             except Exception as e:
-                self.after(0, lambda: messagebox.showerror("Error", f"Fetch failed: {e}"))
+                err_msg = str(e)
+                self.controller.post(lambda: messagebox.showerror("Error", f"Fetch failed: {err_msg}"))
             finally:
-                self.after(0, lambda: self.btn_fetch.configure(state="normal", text="Fetch Security Questions"))
+                self.controller.post(lambda: self.btn_fetch.configure(state="normal", text="Fetch Security Questions"))
                 
         threading.Thread(target=task, daemon=True).start()
 
+    def run_gmail_authorize(self):
+        from ..gmail_otp import GmailAPISource
+        source = GmailAPISource()
+        if not os.path.exists(source.credentials_path):
+            messagebox.showerror("Gmail API", f"Put the OAuth client file from Google Cloud Console at {source.credentials_path} first.")
+            return
+
+        self.btn_gmail_auth.configure(state="disabled", text="Waiting for browser...")
+
+        def task():
+            try:
+                source.authorize()
+                self.log("Gmail API connected.")
+                self.controller.post(self.chk_gmail_api.select)
+            except Exception as e:
+                err_msg = str(e)
+                self.log(f"Gmail API authorisation failed: {err_msg}")
+                self.controller.post(lambda: messagebox.showerror("Gmail API", f"Authorisation failed: {err_msg}"))
+            finally:
+                self.controller.post(lambda: self.btn_gmail_auth.configure(state="normal", text="Connect Gmail API"))
+
+        threading.Thread(target=task, daemon=True).start()
+
     def launch_browser_session(self):
+        clicked = time.perf_counter()
         self.log("Launching authenticated browser session...")
         
         def task():
             try:
                 # Check if we have an active session
                 if not self.controller.client.is_session_alive():
-                    self.after(0, lambda: messagebox.showwarning("No active session", "Please login/verify first."))
-                    self.after(0, lambda: self.log("Launch cancelled: No active session."))
+                    self.controller.post(lambda: messagebox.showwarning("No active session", "Please login/verify first."))
+                    self.log("Launch cancelled: No active session.")
                     return
 
                 # Get cookies from python session
-                cookies = self.controller.client.session.cookies.get_dict()
-                sso = cookies.get('ssoToken')
-                jsid = cookies.get('JSID#/IIT_ERP3')
-                
-                if not sso or not jsid:
-                     self.after(0, lambda: messagebox.showerror("Error", "Session tokens missing from active session."))
+                cookies = cookie_params(self.controller.client.session.cookies)
+                if {c['name'] for c in cookies} < set(SESSION_COOKIES):
+                     self.controller.post(lambda: messagebox.showerror("Error", "Session tokens missing from active session."))
                      return
 
-                # Check if browser is already running
-                if hasattr(self, 'browser_page') and self.browser_page:
-                    try:
-                        if self.browser_page.process_id:
-                            self.after(0, lambda: self.log("Opening new tab in existing session..."))
-                            tab = self.browser_page.new_tab()
-                            tab.set.cookies({'ssoToken': sso, 'JSID#/IIT_ERP3': jsid})
-                            tab.get("https://erp.iitkgp.ac.in/IIT_ERP3/")
-                            return
-                    except Exception:
-                        self.browser_page = None
-
-                # Configure DrissionPage
-                co = ChromiumOptions()
-                # Launch in App Mode (no address bar)
-                co.set_argument("--app=https://erp.iitkgp.ac.in/")
-                co.set_argument("--start-maximized")
-                
-                # Initialize Page (controls the browser)
-                page = ChromiumPage(addr_or_opts=co)
-                
-                # Navigate to base to ensure cookie domain scope matches
-                page.get("https://erp.iitkgp.ac.in/")
-                
-                # Inject Cookies
-                # DrissionPage accepts a simple dict for cookies
-                page.set.cookies({'ssoToken': sso, 'JSID#/IIT_ERP3': jsid})
-                
-                # Navigate to Authenticated Dashboard
-                page.get("https://erp.iitkgp.ac.in/IIT_ERP3/")
-                
-                self.after(0, lambda: self.log("Browser launched with session."))
-                
-                # Keep reference to prevent garbage collection issues if any
-                self.browser_page = page
+                seconds, warm = self.browser.launch(cookies, started=clicked)
+                how = "pre-warmed browser" if warm else "cold start"
+                self.log(f"Browser launched with session. Dashboard ready in {seconds:.2f}s ({how}).")
                 
             except Exception as e:
                 err_msg = str(e)
-                self.after(0, lambda: self.log(f"Browser launch failed: {err_msg}"))
-                self.after(0, lambda: messagebox.showerror("Launch Error", f"Could not launch browser: {err_msg}"))
+                self.log(f"Browser launch failed: {err_msg}")
+                self.controller.post(lambda: messagebox.showerror("Launch Error", f"Could not launch browser: {err_msg}"))
 
         threading.Thread(target=task, daemon=True).start()
 
     def cleanup(self):
-        if hasattr(self, 'browser_page') and self.browser_page:
-            try:
-                self.log("Closing browser session...")
-                self.browser_page.quit()
-            except Exception:
-                pass
+        self.after_cancel(self._log_flush_id)
+        if self._unsubscribe_accounts:
+            self._unsubscribe_accounts()
+        self._status_stop.set()
+        self._status_wake.set()
+        self._unsubscribe_status()
+        if self.PREWARM_BROWSER:
+            self._unsubscribe_prewarm()
+        if self.browser.is_running():
+            self.log("Closing browser session...")
+        self.browser.quit()
 
     def populate_questions(self, questions):
         # Clear existing
@@ -326,6 +426,8 @@ class MainViewFrame(ctk.CTkFrame):
             self.entry_email.insert(0, creds['google_email'])
         if creds.get('google_app_password'): 
             self.entry_app_pass.insert(0, creds['google_app_password'])
+        if "gmail" in creds.get('otp_sources', []):
+            self.chk_gmail_api.select()
             
         qa_dict = creds.get('security_answers', {})
         # Convert dict to list of items to populate
@@ -340,7 +442,69 @@ class MainViewFrame(ctk.CTkFrame):
                 entry_a.insert(0, a)
                 idx += 1
 
-    def save_settings(self):
+    def refresh_other_accounts(self):
+        for child in self.accounts_list.winfo_children():
+            child.destroy()
+        self.account_labels = {}
+
+        primary = (self.controller.storage.get_credentials() or {}).get('roll_number')
+        others = [c for c in self.controller.storage.get_accounts() if c['roll_number'] != primary]
+        if not others:
+            ctk.CTkLabel(self.accounts_list, text="None yet.", font=("Roboto", 12)).pack(anchor="w")
+        for creds in others:
+            roll = creds['roll_number']
+            row = ctk.CTkFrame(self.accounts_list)
+            row.pack(pady=2, fill="x")
+            account = self.controller.accounts.get(roll) if self.controller.accounts else None
+            label = ctk.CTkLabel(row, text=f"{roll}: {account.status if account else 'Unknown'}")
+            label.pack(side="left", padx=5)
+            self.account_labels[roll] = label
+            ctk.CTkButton(row, text="Remove", width=80, fg_color="#884444", hover_color="#663333",
+                          command=lambda roll=roll: self.remove_other_account(roll)).pack(side="right", padx=5, pady=2)
+
+    def _show_account_status(self, roll, status):
+        label = self.account_labels.get(roll)
+        if label is not None:
+            label.configure(text=f"{roll}: {status}")
+
+    def add_other_account(self):
+        creds = self._form_creds()
+        if creds is None:
+            return
+        storage = self.controller.storage
+        primary = (storage.get_credentials() or {}).get('roll_number')
+        if not creds['roll_number'] or creds['roll_number'] == primary:
+            messagebox.showwarning("Incomplete", "Enter a Roll Number other than the main account's.")
+            return
+
+        others = [c for c in storage.get_accounts() if c['roll_number'] not in (primary, creds['roll_number'])]
+        if not storage.save_accounts(others + [creds]):
+            messagebox.showerror("Error", "Failed to save.")
+            return
+        self.controller.sync_accounts()
+        self.log(f"Added account {creds['roll_number']}.")
+
+        # Back to showing the main account
+        for entry in (self.entry_roll, self.entry_pass, self.entry_email, self.entry_app_pass):
+            entry.delete(0, "end")
+        for entry_q, entry_a in self.qa_entries:
+            entry_q.delete(0, "end")
+            entry_a.delete(0, "end")
+        self.chk_gmail_api.deselect()
+        self.load_settings()
+        self.refresh_other_accounts()
+
+    def remove_other_account(self, roll):
+        if not messagebox.askyesno("Confirm", f"Stop keeping {roll} logged in and delete its credentials?"):
+            return
+        storage = self.controller.storage
+        storage.save_accounts([c for c in storage.get_accounts() if c['roll_number'] != roll])
+        self.controller.sync_accounts()
+        self.log(f"Removed account {roll}.")
+        self.refresh_other_accounts()
+
+    def _form_creds(self):
+        """The credentials in the Settings form, or None (after saying why) if incomplete."""
         roll = self.entry_roll.get().strip()
         pwd = self.entry_pass.get().strip()
         email_addr = self.entry_email.get().strip()
@@ -355,17 +519,28 @@ class MainViewFrame(ctk.CTkFrame):
                 
         if not qa_dict:
              messagebox.showwarning("Incomplete", "Please add at least one security question.")
-             return
+             return None
 
-        creds = {
+        return {
             "roll_number": roll,
             "erp_password": pwd,
             "security_answers": qa_dict,
             "google_email": email_addr,
-            "google_app_password": app_pass
+            "google_app_password": app_pass,
+            "otp_sources": ["imap", "gmail"] if self.chk_gmail_api.get() else ["imap"]
         }
-        
+
+    def save_settings(self):
+        creds = self._form_creds()
+        if creds is None:
+            return
+        roll = creds['roll_number']
+
         if self.controller.storage.save_credentials(self.controller.pin, creds):
+            self.controller.sync_accounts()
+            self.refresh_other_accounts()
+            # New credentials deserve a fresh attempt even if the old ones just failed
+            self.controller.client.logins.reset(roll)
             self.log("Settings saved to encrypted vault.")
             messagebox.showinfo("Saved", "Credentials saved successfully.")
         else:
@@ -0,0 +1,137 @@
+import base64
+import json
+import os
+import time
+from typing import Any, Optional, Tuple
+
+from iitkgp_erp_login.logger import logger
+
+from .otp_extract import find_otp
+from .otp_listener import OTP_SENDER, OTP_SUBJECT
+from .otp_sources import OTPSource
+
+DATA_DIR = os.path.expanduser("~/.iitkgp_erp_manager")
+# OAuth files, in the same format iitkgp_erp_login's generate_token() uses
+TOKEN_PATH = os.path.join(DATA_DIR, "gmail_token.json")
+CREDENTIALS_PATH = os.path.join(DATA_DIR, "credentials.json")
+SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
+
+
+class GmailAPISource(OTPSource):
+    """
+    Reads the OTP mail through the Gmail API instead of IMAP.
+
+    Unlike the library's getOTP (newest message id, polled every few seconds for ten
+    minutes), start() notes the time and the wait asks for OTP mails after it, polling
+    quickly at first and backing off. The scope is read-only, so delete() does nothing.
+    The Google client libraries are only imported when a source is actually started.
+
+    It only ever uses a saved token: the browser consent has to be given once beforehand
+    with authorize() (the Settings tab does that), never in the middle of a login.
+    """
+
+    name = "gmail"
+    POLL_MIN = 0.5
+    POLL_MAX = 4
+
+    def __init__(self, token_path: str = TOKEN_PATH, credentials_path: str = CREDENTIALS_PATH):
+        super().__init__()
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.service = None
+        self.started_at = 0.0
+
+    def configured(self) -> bool:
+        """True if there's a saved token that can be used (or refreshed) without a browser."""
+        try:
+            with open(self.token_path) as f:
+                token = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return bool(token.get("refresh_token") or token.get("token"))
+
+    def authorize(self):
+        """
+        The one-off interactive consent: opens a browser and blocks until it's given, then
+        saves the token. Needs the OAuth client secrets in ``credentials_path``.
+        """
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        creds = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES).run_local_server(port=0)
+        self._save(creds)
+
+    def start(self) -> "GmailAPISource":
+        from googleapiclient.discovery import build
+
+        # Gmail's after: has second resolution and the mail can't predate the OTP request
+        self.started_at = time.time() - 1
+        self.service = build("gmail", "v1", credentials=self._credentials(), cache_discovery=False)
+        return self
+
+    def _credentials(self):
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+
+        creds = None
+        if os.path.exists(self.token_path):
+            creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+        if creds and creds.valid:
+            return creds
+        if not (creds and creds.expired and creds.refresh_token):
+            raise RuntimeError("Gmail API isn't authorised (or the token was revoked); connect it in Settings")
+        creds.refresh(Request())
+        self._save(creds)
+        return creds
+
+    def _save(self, creds):
+        os.makedirs(os.path.dirname(self.token_path), exist_ok=True)
+        fd = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(creds.to_json())
+
+    def _wait(self, timeout: float) -> Tuple[Optional[str], Any]:
+        query = f'from:{OTP_SENDER} subject:"{OTP_SUBJECT}" after:{int(self.started_at)}'
+        deadline = time.monotonic() + timeout
+        interval = self.POLL_MIN
+        seen = set()
+        while not self._cancelled.is_set():
+            try:
+                listing = self.service.users().messages().list(userId="me", q=query, maxResults=5).execute()
+                for ref in listing.get("messages", []):
+                    if ref["id"] in seen:
+                        continue
+                    seen.add(ref["id"])
+                    message = self.service.users().messages().get(userId="me", id=ref["id"]).execute()
+                    if int(message.get("internalDate", 0)) / 1000 < self.started_at:
+                        continue
+                    otp = self._otp_from(message.get("payload", {}))
+                    if otp:
+                        return otp, ref["id"]
+            except Exception as e:
+                logger.error(f"Gmail API error: {e}")
+                self.error = e
+                return None, None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cancelled.wait(min(interval, remaining))
+            interval = min(interval * 1.5, self.POLL_MAX)
+        return None, None
+
+    def _otp_from(self, payload: dict) -> Optional[str]:
+        """Looks in the text/plain part first, then text/html, then the top-level body."""
+        parts = []
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            stack.extend(part.get("parts", []))
+            if part.get("body", {}).get("data"):
+                parts.append(part)
+        parts.sort(key=lambda p: {"text/plain": 0, "text/html": 1}.get(p.get("mimeType"), 2))
+        for part in parts:
+            text = base64.urlsafe_b64decode(part["body"]["data"]).decode("utf-8", "replace")
+            otp = find_otp(text, is_html=part.get("mimeType") == "text/html")
+            if otp:
+                return otp
+        return None
@@ -0,0 +1,58 @@
+import time
+from typing import Optional
+
+
+class SessionLifetime:
+    """
+    Learns how long an ERP session lasts so we can log in again just before it dies.
+
+    Each sample is the time from login to the session's death, taken halfway between
+    the last probe that saw it alive and the first one that didn't. The estimate is the
+    lower quartile of recent samples, so one unusually long session doesn't make us late.
+    """
+
+    MAX_SAMPLES = 20
+    # Start the refresh at least this long before the predicted expiry
+    MIN_LEAD = 60
+
+    def __init__(self, samples: Optional[list] = None, login_seconds: Optional[float] = None):
+        self.samples: list[float] = list(samples or [])[-self.MAX_SAMPLES:]
+        self.login_seconds = login_seconds
+
+    def record(self, seconds: float):
+        if seconds <= 0:
+            return
+        self.samples.append(seconds)
+        del self.samples[:-self.MAX_SAMPLES]
+
+    def record_login(self, seconds: float):
+        """Keeps a running average of how long a full login takes."""
+        if self.login_seconds is None:
+            self.login_seconds = seconds
+        else:
+            self.login_seconds = 0.7 * self.login_seconds + 0.3 * seconds
+
+    def estimate(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[(len(ordered) - 1) // 4]
+
+    def refresh_in(self, logged_in_at: float, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until a refresh login should start (<= 0 means now); None if we can't tell yet."""
+        expected = self.estimate()
+        if expected is None:
+            return None
+        lead = max(self.MIN_LEAD, 2 * (self.login_seconds or 0))
+        # Never plan to refresh in the first half of a session
+        lead = min(lead, expected / 2)
+        now = time.time() if now is None else now
+        return logged_in_at + expected - lead - now
+
+    def to_dict(self) -> dict:
+        return {"samples": self.samples, "login_seconds": self.login_seconds}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "SessionLifetime":
+        data = data or {}
+        return cls(data.get("samples"), data.get("login_seconds"))
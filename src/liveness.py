@@ -0,0 +1,107 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from iitkgp_erp_login.logger import logger
+
+
+class SessionMonitor:
+    """
+    The one place that probes whether the ERP session is alive.
+
+    The status label, the auto-login loop and the browser launcher all ask it instead of
+    hitting welcome.jsp themselves. A result is reused for ``ttl`` seconds, callers that
+    arrive while a probe is running wait for that probe rather than starting their own
+    (unless it was sent longer than their ``max_age`` ago, e.g. with cookies a login has
+    since replaced), and subscribers are told whenever the state flips.
+    """
+
+    def __init__(self, probe: Callable[[], bool], ttl: float = 60):
+        self._probe = probe
+        self.ttl = ttl
+        self.alive: Optional[bool] = None
+        self.checked_at = 0.0
+        # Wall-clock time of the last check that found the session alive
+        self.last_alive_at: Optional[float] = None
+        self.probes = 0
+
+        self._lock = threading.Lock()
+        self._inflight: Optional[threading.Event] = None
+        # When the running probe was sent, and what the last one found
+        self._inflight_started = 0.0
+        self._inflight_result = False
+        self._subscribers: list[Callable[[bool], None]] = []
+
+    def is_alive(self, max_age: Optional[float] = None) -> bool:
+        """Returns the session state, probing only if the cached one is older than ``max_age``."""
+        max_age = self.ttl if max_age is None else max_age
+        called = time.monotonic()
+        while True:
+            with self._lock:
+                if self.alive is not None and time.monotonic() - self.checked_at <= max_age:
+                    return self.alive
+                if self._inflight is None:
+                    waiter = self._inflight = threading.Event()
+                    self._inflight_started = time.monotonic()
+                    break
+                waiter = self._inflight
+                # A probe sent before this call may have used cookies that are gone now
+                joinable = self._inflight_started >= called - max_age
+            waiter.wait()
+            if joinable:
+                return self._inflight_result
+            # Otherwise go round again: start a probe of our own, or join one newer than the call
+
+        result = False
+        try:
+            self.probes += 1
+            result = bool(self._probe())
+        except Exception as e:
+            logger.debug(f"Session probe failed: {e}")
+        finally:
+            self.set(result)
+            with self._lock:
+                self._inflight_result = result
+                self._inflight = None
+            waiter.set()
+        return result
+
+    def refresh(self) -> bool:
+        """Probes now, ignoring the cache and any probe that was already running."""
+        return self.is_alive(max_age=0)
+
+    def peek(self) -> Optional[bool]:
+        """The last known state without any network traffic; None if never probed."""
+        return self.alive
+
+    def set(self, alive: bool):
+        """Records a state learned some other way (e.g. a login that just succeeded)."""
+        with self._lock:
+            changed = alive != self.alive
+            self.alive = alive
+            self.checked_at = time.monotonic()
+            if alive:
+                self.last_alive_at = time.time()
+            subscribers = list(self._subscribers) if changed else []
+        for callback in subscribers:
+            try:
+                callback(alive)
+            except Exception as e:
+                logger.error(f"Session state subscriber failed: {e}")
+
+    def invalidate(self):
+        """Forgets the cached result so the next caller probes."""
+        with self._lock:
+            self.checked_at = 0.0
+
+    def subscribe(self, callback: Callable[[bool], None]) -> Callable[[], None]:
+        """Calls ``callback(alive)`` on every state change. Returns an unsubscribe function."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
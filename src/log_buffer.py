@@ -0,0 +1,40 @@
+import itertools
+import threading
+from collections import deque
+from typing import List, Tuple
+
+# Lines kept for the log view; older ones are dropped
+LOG_CAPACITY = 1000
+
+
+class LogBuffer:
+    """
+    The last ``capacity`` log lines, appendable from any thread. Readers keep the
+    sequence number they were last given and ask for what is newer with since(); lines
+    that fell off the end in the meantime are simply gone.
+    """
+
+    def __init__(self, capacity: int = LOG_CAPACITY):
+        self.capacity = capacity
+        self._lines = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, message: str):
+        # One entry per line, so the buffer and a text widget count lines the same way
+        lines = str(message).splitlines() or [""]
+        with self._lock:
+            self._lines.extend(lines)
+            self._seq += len(lines)
+
+    def since(self, seq: int) -> Tuple[int, List[str]]:
+        """(current sequence number, the lines added after ``seq`` that are still here)."""
+        with self._lock:
+            new = min(self._seq - seq, len(self._lines))
+            if new <= 0:
+                return self._seq, []
+            return self._seq, list(itertools.islice(self._lines, len(self._lines) - new, None))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._lines)
@@ -0,0 +1,218 @@
+import base64
+import binascii
+import html
+import re
+from typing import Iterable, Iterator, Optional
+
+# Never pull more than this from the server for one OTP mail; the code sits near the top.
+MAX_BODY_BYTES = 8192
+
+# The OTP is the last standalone run of 4-10 digits in the text
+OTP_RE = re.compile(r"(?<![\w.,/:-])(\d{4,10})(?![\w/:-]|[.,]\d)")
+_TAG_RE = re.compile(r"<(?:script|style)\b.*?</(?:script|style)\s*>|<[^>]*>", re.I | re.S)
+
+_ATOM_END = b' ()[]{"\r\n'
+
+
+class Part:
+    """A leaf of a BODYSTRUCTURE tree."""
+
+    def __init__(self, spec: str, fields: list):
+        self.spec = spec
+        self.type = (fields[0] or "").lower()
+        self.subtype = (fields[1] or "").lower()
+        params = fields[2] if isinstance(fields[2], list) else []
+        self.params = {str(params[i]).lower(): params[i + 1] for i in range(0, len(params) - 1, 2)}
+        self.encoding = (fields[5] or "7bit").lower() if len(fields) > 5 else "7bit"
+        self.size = int(fields[6]) if len(fields) > 6 and str(fields[6]).isdigit() else 0
+
+    @property
+    def charset(self) -> str:
+        return self.params.get("charset") or "utf-8"
+
+    def __repr__(self):
+        return f"Part({self.spec} {self.type}/{self.subtype} {self.encoding} {self.size}B)"
+
+
+def parse_response(data: bytes) -> list:
+    """Parses an IMAP response line (lists, quoted strings, literals, atoms) into nested lists."""
+    pos = 0
+    root: list = []
+    stack = [root]
+    n = len(data)
+
+    while pos < n:
+        c = data[pos:pos + 1]
+        if c in (b" ", b"\r", b"\n"):
+            pos += 1
+        elif c == b"(":
+            child: list = []
+            stack[-1].append(child)
+            stack.append(child)
+            pos += 1
+        elif c == b")":
+            if len(stack) > 1:
+                stack.pop()
+            pos += 1
+        elif c == b'"':
+            pos += 1
+            out = bytearray()
+            while pos < n and data[pos:pos + 1] != b'"':
+                if data[pos:pos + 1] == b"\\":
+                    pos += 1
+                out += data[pos:pos + 1]
+                pos += 1
+            stack[-1].append(out.decode("utf-8", "replace"))
+            pos += 1
+        elif c == b"{":
+            end = data.index(b"}", pos)
+            size = int(data[pos + 1:end])
+            start = data.index(b"\n", end) + 1
+            stack[-1].append(data[start:start + size])
+            pos = start + size
+        else:
+            start = pos
+            depth = 0
+            # atoms may carry a section spec, e.g. BODY[1.2]<0>
+            while pos < n and (data[pos:pos + 1] not in _ATOM_END or depth or data[pos:pos + 1] == b"["):
+                if data[pos:pos + 1] == b"[":
+                    depth += 1
+                elif data[pos:pos + 1] == b"]":
+                    depth -= 1
+                pos += 1
+            atom = data[start:pos].decode("ascii", "replace")
+            stack[-1].append(None if atom.upper() == "NIL" else atom)
+
+    return root
+
+
+def join_fetch_data(data: list) -> bytes:
+    """Glues imaplib's FETCH result (bytes and (header, literal) tuples) back into wire form."""
+    out = bytearray()
+    for item in data:
+        if isinstance(item, tuple):
+            out += item[0] + b"\r\n" + item[1]
+        elif item:
+            out += item
+    return bytes(out)
+
+
+def fetch_item(data: list, name: str):
+    """Returns the value of a FETCH data item (e.g. BODYSTRUCTURE) from imaplib's result."""
+    name = name.upper()
+    for entry in parse_response(join_fetch_data(data)):
+        if not isinstance(entry, list):
+            continue
+        for i in range(0, len(entry) - 1, 2):
+            key = entry[i]
+            if isinstance(key, str) and key.upper().split("<")[0] == name.split("<")[0]:
+                return entry[i + 1]
+    return None
+
+
+def iter_parts(structure: list, prefix: str = "") -> Iterator[Part]:
+    """Yields the leaves of a BODYSTRUCTURE with their IMAP part specifiers."""
+    if structure and isinstance(structure[0], list):
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break  # multipart subtype and extension data follow the children
+            index += 1
+            yield from iter_parts(child, f"{prefix}.{index}" if prefix else str(index))
+    elif structure:
+        yield Part(prefix or "1", structure)
+
+
+def pick_text_part(structure: list) -> Optional[Part]:
+    """Prefers text/plain, falls back to text/html for HTML-only mails."""
+    html_part = None
+    for part in iter_parts(structure):
+        if part.type != "text" or "name" in part.params:
+            continue
+        if part.subtype == "plain":
+            return part
+        if part.subtype == "html" and html_part is None:
+            html_part = part
+    return html_part
+
+
+def iter_decode(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Decodes a transfer encoding chunk by chunk, carrying partial units across chunks."""
+    encoding = (encoding or "").lower()
+    pending = b""
+
+    if encoding == "base64":
+        for chunk in chunks:
+            pending += bytes(b for b in chunk if b not in b" \t\r\n")
+            usable = len(pending) - len(pending) % 4
+            if usable:
+                yield base64.b64decode(pending[:usable])
+                pending = pending[usable:]
+        if pending:
+            # A byte cap can cut a quantum in half, pad what's left
+            try:
+                yield base64.b64decode(pending + b"=" * (-len(pending) % 4))
+            except binascii.Error:
+                pass
+    elif encoding == "quoted-printable":
+        for chunk in chunks:
+            pending += chunk
+            cut = pending.rfind(b"\n") + 1
+            if cut:
+                yield binascii.a2b_qp(pending[:cut])
+                pending = pending[cut:]
+        if pending:
+            # Don't hand a soft break or half an escape to the decoder
+            tail = pending.rfind(b"=", max(0, len(pending) - 2))
+            yield binascii.a2b_qp(pending[:tail] if tail != -1 else pending)
+    else:
+        yield from chunks
+
+
+def find_otp(text: str, is_html: bool = False) -> Optional[str]:
+    """Returns the last OTP-looking number in a mail body."""
+    if is_html:
+        text = html.unescape(_TAG_RE.sub(" ", text))
+    found = OTP_RE.findall(text)
+    return found[-1] if found else None
+
+
+def extract_otp(raw: bytes, part: Part, chunk_size: int = 1024) -> Optional[str]:
+    """Decodes a fetched body part and pulls the OTP out of it."""
+    chunks = (raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size))
+    decoded = b"".join(iter_decode(chunks, part.encoding))
+    try:
+        text = decoded.decode(part.charset, "replace")
+    except LookupError:
+        text = decoded.decode("utf-8", "replace")
+    return find_otp(text, is_html=part.subtype == "html")
+
+
+def fetch_otp(mail, uid: str, max_bytes: int = MAX_BODY_BYTES, stats: Optional[dict] = None) -> Optional[str]:
+    """
+    Fetches only what's needed to read the OTP from one message.
+
+    Asks for BODYSTRUCTURE first, then peeks at most ``max_bytes`` of the text part
+    without touching headers, attachments or the \\Seen flag.
+    """
+    typ, data = mail.uid("FETCH", uid, "(BODYSTRUCTURE)")
+    if typ != "OK" or not data or data[0] is None:
+        return None
+    structure = fetch_item(data, "BODYSTRUCTURE")
+    part = pick_text_part(structure) if isinstance(structure, list) else None
+    if part is None:
+        return None
+
+    typ, data = mail.uid("FETCH", uid, f"(BODY.PEEK[{part.spec}]<0.{max_bytes}>)")
+    if typ != "OK" or not data or data[0] is None:
+        return None
+    raw = fetch_item(data, f"BODY[{part.spec}]")
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if not raw:
+        return None
+
+    if stats is not None:
+        stats["part"] = part
+        stats["bytes"] = stats.get("bytes", 0) + len(raw)
+    return extract_otp(raw, part)
@@ -0,0 +1,276 @@
+import datetime
+import imaplib
+import re
+import select
+import socket
+import ssl
+import time
+from typing import Optional
+
+from iitkgp_erp_login.logger import logger
+
+from .otp_extract import fetch_otp
+from .otp_sources import OTPSource
+from .telemetry import TELEMETRY
+
+IMAP_HOST = "imap.gmail.com"
+OTP_SUBJECT = "OTP for Sign In in ERP Portal of IIT Kharagpur"
+# IMAP FROM is a substring match, this covers every ERP sender address
+OTP_SENDER = "iitkgp.ac.in"
+
+_STATUS_RE = re.compile(rb"(UIDNEXT|UIDVALIDITY) (\d+)")
+
+
+class OTPListener(OTPSource):
+    """
+    Holds one authenticated IMAP connection open while an OTP is requested.
+
+    The listener is started *before* the ERP is asked to send the OTP: it logs in,
+    selects INBOX, notes the mailbox's UIDNEXT and parks the connection in IDLE,
+    so the server pushes the new message to us as soon as it lands. Servers without
+    IDLE get NOOP polling on the same connection, fast at first and backing off.
+
+    Messages are tracked by UID, never by sequence number: only ``UID n:*`` is ever
+    searched, where n is the mailbox's UIDNEXT when we started listening. ``state``
+    holds {"uidvalidity", "uidnext"} from the previous run and is updated in place
+    so the caller can persist it.
+
+    This is the "imap" OTP source, see otp_sources.py.
+    """
+
+    name = "imap"
+
+    # Even while idling we re-check the mailbox this often, in case a push was missed.
+    IDLE_SLICE = 10
+    POLL_MIN = 0.5
+    POLL_MAX = 4
+    CANCEL_CHECK = 0.25
+
+    def __init__(self, email_addr: str, app_password: str, host: str = IMAP_HOST,
+                 port: Optional[int] = None, use_ssl: bool = True, state: Optional[dict] = None):
+        super().__init__()
+        self.email_addr = email_addr
+        self.app_password = app_password
+        self.host = host
+        self.port = port or (993 if use_ssl else 143)
+        self.use_ssl = use_ssl
+        self.state = state if state is not None else {}
+
+        self.mail = None
+        self.supports_idle = False
+        self.baseline_uid = 0
+        self._idle_tag = None
+
+    def start(self) -> "OTPListener":
+        """Connects, selects INBOX, records where new mail will start and starts waiting."""
+        with TELEMETRY.span("imap_connect"):
+            return self._start()
+
+    def _start(self) -> "OTPListener":
+        if self.use_ssl:
+            self.mail = imaplib.IMAP4_SSL(self.host, self.port)
+        else:
+            self.mail = imaplib.IMAP4(self.host, self.port)
+        self.mail.login(self.email_addr, self.app_password)
+
+        # Capabilities advertised before login may differ from the authenticated ones
+        typ, data = self.mail.capability()
+        caps = data[0].upper().split() if typ == "OK" and data and data[0] else []
+        self.supports_idle = b"IDLE" in caps
+
+        self.mail.select("INBOX")
+        self.mail.response("EXISTS")  # drop the count from SELECT, NOOP polling watches for new ones
+        self.baseline_uid = self._initial_uidnext()
+        logger.info(f"OTP listener ready (IDLE: {self.supports_idle}, baseline UID: {self.baseline_uid})")
+
+        if self.supports_idle:
+            self._idle_start()
+        return self
+
+    def _wait(self, timeout: float) -> tuple[Optional[str], Optional[int]]:
+        """Blocks until an OTP mail newer than the baseline arrives. Returns (otp, msg_id)."""
+        logger.info(f"Waiting for OTP email with UID >= {self.baseline_uid}...")
+        deadline = time.monotonic() + timeout
+        interval = self.POLL_MIN
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._cancelled.is_set():
+                break
+
+            try:
+                if self.supports_idle:
+                    self._idle_wait(min(self.IDLE_SLICE, remaining))
+                    self._idle_done()
+                    changed = True  # cheap enough to re-check after every slice
+                else:
+                    self._cancelled.wait(min(interval, remaining))
+                    interval = min(interval * 1.5, self.POLL_MAX)
+                    self.mail.noop()
+                    typ, data = self.mail.response("EXISTS")
+                    changed = any(data)
+
+                if changed:
+                    otp, msg_id = self._check_new()
+                    if otp:
+                        logger.info(f"DEBUG - Extracted OTP: {otp}")
+                        return otp, msg_id
+
+                if self.supports_idle:
+                    self._idle_start()
+            except (imaplib.IMAP4.error, OSError) as e:
+                logger.error(f"IMAP Listener Error: {e}")
+                self.error = e
+                break
+
+        return None, None
+
+    def delete(self, msg_id: int):
+        """Deletes the OTP mail (by UID) over the already open connection."""
+        with TELEMETRY.span("imap_delete") as span:
+            try:
+                logger.info(f"Deleting OTP email (UID: {msg_id})...")
+                self._idle_done()
+                self.mail.uid("STORE", str(msg_id), "+FLAGS", "\\Deleted")
+                self.mail.expunge()
+                logger.info("OTP email deleted successfully.")
+            except Exception as e:
+                span.outcome = "error"
+                logger.error(f"Failed to delete email: {e}")
+
+    def close(self):
+        if self.mail is None:
+            return
+        try:
+            self._idle_done()
+            self.mail.close()
+            self.mail.logout()
+        except Exception:
+            pass
+        self.mail = None
+
+    def _initial_uidnext(self) -> int:
+        """Works out the first UID a new OTP mail can have."""
+        typ, validity = self.mail.response("UIDVALIDITY")
+        typ, uidnext = self.mail.response("UIDNEXT")
+        validity = int(validity[-1]) if validity and validity[-1] else None
+        uidnext = int(uidnext[-1]) if uidnext and uidnext[-1] else None
+
+        if validity is None or uidnext is None:
+            # Server left them out of SELECT, ask explicitly
+            typ, data = self.mail.status("INBOX", "(UIDNEXT UIDVALIDITY)")
+            found = dict(_STATUS_RE.findall(data[0] or b"")) if typ == "OK" and data else {}
+            validity = validity or int(found.get(b"UIDVALIDITY", 0)) or None
+            uidnext = uidnext or int(found.get(b"UIDNEXT", 0)) or None
+
+        if uidnext is None:
+            if validity is not None and self.state.get("uidvalidity") == validity:
+                uidnext = self.state.get("uidnext", 1)
+            else:
+                # No usable hint at all: one full scan, then we're incremental again
+                uidnext = self._latest_otp_uid(1) + 1
+
+        if self.state.get("uidvalidity") != validity:
+            self.state.clear()
+        self.state["uidvalidity"] = validity
+        self.state["uidnext"] = max(uidnext, self.state.get("uidnext", 0))
+        return self.state["uidnext"]
+
+    def _latest_otp_uid(self, since_uid: int) -> int:
+        since_date = (datetime.date.today() - datetime.timedelta(days=1)).strftime("%d-%b-%Y")
+        query = f'(UID {since_uid}:* SINCE {since_date} FROM "{OTP_SENDER}" SUBJECT "{OTP_SUBJECT}")'
+        status, messages = self.mail.uid("SEARCH", None, query)
+        if status != "OK" or not messages or not messages[0]:
+            return 0
+        # "n:*" always matches the newest mail even if its UID is below n
+        uids = [int(u) for u in messages[0].split() if int(u) >= since_uid]
+        return max(uids, default=0)
+
+    def _check_new(self) -> tuple[Optional[str], Optional[int]]:
+        latest_uid = self._latest_otp_uid(self.baseline_uid)
+        if not latest_uid:
+            return None, None
+        self.state["uidnext"] = max(self.state.get("uidnext", 0), latest_uid + 1)
+
+        otp = fetch_otp(self.mail, str(latest_uid))
+        if otp:
+            return otp, latest_uid
+
+        # Newest matching mail had no OTP in it, don't look at it again
+        self.baseline_uid = latest_uid + 1
+        return None, None
+
+    # --- IDLE (RFC 2177); imaplib before 3.14 has no support for it ---
+
+    def _idle_start(self):
+        tag = self.mail._new_tag()
+        self.mail.send(tag + b" IDLE\r\n")
+        line = self.mail.readline()
+        while line.startswith(b"*"):
+            line = self.mail.readline()
+        if not line.startswith(b"+"):
+            self.mail.tagged_commands.pop(tag, None)
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+        self._idle_tag = tag
+
+    def _idle_wait(self, timeout: float) -> bool:
+        """Waits for an untagged EXISTS while idling. Returns True if one was seen."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._readable(remaining):
+                return False
+            line = self.mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed while idling")
+            if line.startswith(b"*") and line.rstrip().upper().endswith(b"EXISTS"):
+                return True
+
+    def _idle_done(self):
+        if self._idle_tag is None:
+            return
+        tag, self._idle_tag = self._idle_tag, None
+        self.mail.send(b"DONE\r\n")
+        while True:
+            line = self.mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed while leaving IDLE")
+            if line.startswith(tag):
+                break
+        self.mail.tagged_commands.pop(tag, None)
+
+    def _buffered(self) -> bool:
+        """
+        True if data is already waiting above the socket, where select() can't see it:
+        in imaplib's buffered reader (e.g. an EXISTS that came in the same segment as
+        "+ idling") or in a decrypted TLS record. Never blocks.
+        """
+        sock = self.mail.sock
+        if isinstance(sock, ssl.SSLSocket) and sock.pending():
+            return True
+        timeout = sock.gettimeout()
+        # peek() hands back what's buffered; only with an empty buffer does it touch the
+        # socket, which non-blocking just comes up empty
+        sock.settimeout(0)
+        try:
+            return bool(self.mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError, socket.timeout):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def _readable(self, timeout: float) -> bool:
+        """Waits for data on the connection; False on timeout or cancel()."""
+        if self._buffered():
+            return True
+        sock = self.mail.sock
+        deadline = time.monotonic() + timeout
+        while not self._cancelled.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Short selects so a cancel() from another thread is noticed quickly
+            readable, _, _ = select.select([sock], [], [], min(remaining, self.CANCEL_CHECK))
+            if readable:
+                return True
+        return False
@@ -0,0 +1,300 @@
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from iitkgp_erp_login.logger import logger
+
+from .otp_extract import find_otp
+from .telemetry import TELEMETRY
+
+# How long a login waits for the OTP, whichever source it comes from
+OTP_TIMEOUT = 60
+
+
+class OTPSource:
+    """
+    Somewhere the ERP's OTP can turn up (a mailbox, an API, a file).
+
+    Used in this order: start() before the OTP is requested, so everything already there
+    is ignored; wait_for_otp() once it has been requested; delete() with the handle of the
+    message the OTP came from; close() always. cancel() may be called from any thread and
+    makes a running wait_for_otp() return (None, None) promptly.
+    """
+
+    name = "source"
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        # Why the last wait_for_otp() gave up early, if it did
+        self.error: Optional[Exception] = None
+
+    def start(self) -> "OTPSource":
+        return self
+
+    def wait_for_otp(self, timeout: float = OTP_TIMEOUT) -> Tuple[Optional[str], Any]:
+        """Blocks until a new OTP arrives. Returns (otp, handle), or (None, None)."""
+        with TELEMETRY.span(f"otp_source_{self.name}") as span:
+            self.error = None
+            otp, handle = self._wait(timeout)
+            if not otp:
+                span.outcome = "cancelled" if self._cancelled.is_set() else "error" if self.error else "timeout"
+            return otp, handle
+
+    def _wait(self, timeout: float) -> Tuple[Optional[str], Any]:
+        raise NotImplementedError
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def delete(self, handle):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _StdinReader:
+    """
+    The one thread that reads stdin, for the whole process. A thread per source would
+    never end (a line may never come) and the extra ones would swallow lines meant for
+    the next login, so lines go to whichever queue attached last, and are dropped while
+    none is attached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._target: "Optional[queue.Queue[str]]" = None
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, lines: "queue.Queue[str]"):
+        with self._lock:
+            # None in a windowed (e.g. PyInstaller --noconsole) build
+            if sys.stdin is None:
+                raise OSError("No stdin to read the OTP from")
+            self._target = lines
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="otp-stdin", daemon=True)
+                self._thread.start()
+
+    def detach(self, lines: "queue.Queue[str]"):
+        with self._lock:
+            if self._target is lines:
+                self._target = None
+
+    def _run(self):
+        try:
+            for line in sys.stdin:
+                with self._lock:
+                    target = self._target
+                if target is not None:
+                    target.put(line)
+        except (OSError, ValueError) as e:
+            logger.error(f"Reading the OTP from stdin stopped: {e}")
+        finally:
+            with self._lock:
+                self._thread = None
+
+
+_STDIN = _StdinReader()
+
+
+class FileOTPSource(OTPSource):
+    """
+    Takes the OTP from lines appended to a file after start(), or typed on stdin when
+    ``path`` is "-". For testing, or for piping OTPs in from some other tool.
+    """
+
+    name = "file"
+    POLL = 0.2
+
+    def __init__(self, path: str = "-"):
+        super().__init__()
+        self.path = path
+        self._offset = 0
+        self._lines: "queue.Queue[str]" = queue.Queue()
+
+    def start(self) -> "FileOTPSource":
+        if self.path == "-":
+            _STDIN.attach(self._lines)
+        else:
+            self._offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return self
+
+    def _wait(self, timeout: float) -> Tuple[Optional[str], Any]:
+        if self.path == "-":
+            print("Enter the ERP OTP: ", end="", file=sys.stderr, flush=True)
+        deadline = time.monotonic() + timeout
+        while not self._cancelled.is_set():
+            if self.path != "-":
+                self._read_file()
+            try:
+                otp = find_otp(self._lines.get(timeout=self.POLL))
+            except queue.Empty:
+                otp = None
+            if otp:
+                return otp, None
+            if time.monotonic() >= deadline:
+                break
+        return None, None
+
+    def _read_file(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        # Only whole lines; a half-written one is picked up next time
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].decode("utf-8", "replace").splitlines():
+            self._lines.put(line)
+
+    def close(self):
+        if self.path == "-":
+            _STDIN.detach(self._lines)
+
+
+# name -> factory(creds, options) returning a source, or None if ``creds`` don't set it up
+SourceFactory = Callable[[Dict, Dict], Optional[OTPSource]]
+OTP_SOURCES: Dict[str, SourceFactory] = {}
+
+# What's used when the credentials don't name any sources
+DEFAULT_SOURCES = ("imap",)
+
+
+def register_source(name: str, factory: SourceFactory):
+    OTP_SOURCES[name] = factory
+
+
+def make_sources(names, creds: Dict, options: Optional[Dict[str, Dict]] = None) -> List[OTPSource]:
+    """The configured sources among ``names`` (not started). Unknown names are skipped."""
+    options = options or {}
+    sources = []
+    for name in names:
+        factory = OTP_SOURCES.get(name)
+        if factory is None:
+            logger.error(f"Unknown OTP source: {name}")
+            continue
+        source = factory(creds, options.get(name, {}))
+        if source is not None:
+            sources.append(source)
+    return sources
+
+
+def _imap_source(creds: Dict, options: Dict) -> Optional[OTPSource]:
+    if not creds.get('google_email') or not creds.get('google_app_password'):
+        return None
+    from .otp_listener import OTPListener
+    return OTPListener(creds['google_email'], creds['google_app_password'], **options)
+
+
+def _gmail_source(creds: Dict, options: Dict) -> Optional[OTPSource]:
+    from .gmail_otp import GmailAPISource
+    source = GmailAPISource(**options)
+    return source if source.configured() else None
+
+
+def _file_source(creds: Dict, options: Dict) -> Optional[OTPSource]:
+    return FileOTPSource(options.get("path") or creds.get("otp_file") or "-")
+
+
+register_source("imap", _imap_source)
+register_source("gmail", _gmail_source)
+register_source("file", _file_source)
+
+
+def race_otp(sources: List[OTPSource], timeout: float = OTP_TIMEOUT
+             ) -> Tuple[Optional[OTPSource], Optional[str], Any, Optional[float]]:
+    """
+    Waits on every source at once and takes the first OTP. Returns (source, otp, handle,
+    seconds it took), all None if nothing came. The others are cancelled and have
+    returned by the time this does, so they can be closed straight away.
+    """
+    with TELEMETRY.span("otp_wait") as span:
+        started = time.perf_counter()
+        if len(sources) == 1:
+            otp, handle = sources[0].wait_for_otp(timeout)
+            if not otp:
+                span.outcome = "timeout"
+                return None, None, None, None
+            return sources[0], otp, handle, time.perf_counter() - started
+
+        results: "queue.Queue[tuple]" = queue.Queue()
+
+        def wait(source: OTPSource):
+            try:
+                results.put((source, *source.wait_for_otp(timeout), time.perf_counter() - started))
+            except Exception as e:
+                logger.error(f"OTP source {source.name} failed: {e}")
+                results.put((source, None, None, None))
+
+        threads = [threading.Thread(target=wait, args=(s,), name=f"otp-{s.name}", daemon=True) for s in sources]
+        for thread in threads:
+            thread.start()
+
+        winner = (None, None, None, None)
+        for _ in sources:
+            result = results.get()
+            if result[1]:
+                winner = result
+                break
+        for source in sources:
+            source.cancel()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        if winner[0] is None:
+            span.outcome = "timeout"
+        else:
+            logger.info(f"OTP from {winner[0].name} after {winner[3]:.2f}s")
+        return winner
+
+
+class OTPSourceStats:
+    """
+    How quickly each OTP source has delivered, kept in the vault. A source's latency is
+    a running average over the logins it won; missing an OTP clears it, so that source
+    has to prove itself in a race again.
+    """
+
+    ALPHA = 0.3
+
+    def __init__(self, sources: Optional[Dict[str, Dict]] = None):
+        self.sources: Dict[str, Dict] = {name: dict(entry) for name, entry in (sources or {}).items()}
+
+    def _entry(self, name: str) -> Dict:
+        return self.sources.setdefault(name, {"latency": None, "wins": 0, "misses": 0})
+
+    def record_win(self, name: str, seconds: float):
+        entry = self._entry(name)
+        entry["wins"] += 1
+        latency = entry["latency"]
+        entry["latency"] = seconds if latency is None else (1 - self.ALPHA) * latency + self.ALPHA * seconds
+
+    def record_miss(self, name: str):
+        entry = self._entry(name)
+        entry["misses"] += 1
+        entry["latency"] = None
+
+    def fastest(self, names) -> Optional[str]:
+        """The quickest of ``names`` that has delivered before; None if none has a record."""
+        known = [(self.sources[n]["latency"], n) for n in names
+                 if n in self.sources and self.sources[n]["latency"] is not None]
+        return min(known)[1] if known else None
+
+    def to_dict(self) -> Dict:
+        return {name: dict(entry) for name, entry in self.sources.items()}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "OTPSourceStats":
+        return cls(data or {})
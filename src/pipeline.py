@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence
+
+
+class Stage(NamedTuple):
+    """One step of a pipeline: ``fn(results)`` runs once every stage in ``deps`` has finished."""
+    name: str
+    fn: Callable[[Dict[str, Any]], Any]
+    deps: Sequence[str] = ()
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _default_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Shared by every login in the process; stages never wait on each other
+            # from inside the pool, so a bounded pool can only queue, not deadlock
+            _pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="erp-stage")
+        return _pool
+
+
+def run_stages(stages: Sequence[Stage], executor: Optional[Executor] = None) -> Dict[str, Any]:
+    """
+    Runs a small dependency graph of stages, each as soon as its dependencies are done,
+    and returns ``{name: result}``.
+
+    If stages fail, nothing new is started, the ones already running are allowed to
+    finish (so their results can still be cleaned up by the caller) and the error of the
+    first failed stage, in the order given, is raised.
+    """
+    executor = executor or _default_pool()
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+
+    results: Dict[str, Any] = {}
+    errors: Dict[str, BaseException] = {}
+    running: Dict[Future, str] = {}
+    pending = list(stages)
+
+    while pending or running:
+        if not errors:
+            for stage in [s for s in pending if all(d in results for d in s.deps)]:
+                pending.remove(stage)
+                running[executor.submit(stage.fn, dict(results))] = stage.name
+        if not running:
+            if pending and not errors:
+                raise ValueError(f"Stages can never run: {[s.name for s in pending]}")
+            break
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = running.pop(future)
+            try:
+                results[name] = future.result()
+            except BaseException as e:
+                errors[name] = e
+
+    if errors:
+        raise next(errors[s.name] for s in stages if s.name in errors)
+    return results
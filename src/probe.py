@@ -0,0 +1,58 @@
+import requests
+
+from iitkgp_erp_login.endpoints import WELCOMEPAGE_URL
+from iitkgp_erp_login.erp import session_alive
+
+
+def _library_welcome_length(default: str = '1034') -> str:
+    """
+    The Content-Length the installed library's session_alive takes to mean "logged in".
+    Releases differ, so it's read from the function itself (its constants, which frozen
+    builds keep too) for the "stream"/"head" modes to agree with "full".
+    """
+    lengths = [c for c in session_alive.__code__.co_consts if isinstance(c, str) and c.isdigit()]
+    return lengths[0] if len(lengths) == 1 else default
+
+
+# welcome.jsp is exactly this long when the session is logged in
+WELCOME_CONTENT_LENGTH = _library_welcome_length()
+
+# (connect, read) seconds; a probe that takes longer than this is as good as dead
+PROBE_TIMEOUT = (3.05, 5)
+# All attempts of one probe together, retries and their backoff included
+PROBE_DEADLINE = 8
+
+PROBE_MODES = ("stream", "head", "full")
+
+
+def probe_session(session: requests.Session, mode: str = "stream", timeout=PROBE_TIMEOUT) -> bool:
+    """
+    Checks whether the ERP session is logged in.
+
+    ``full`` is the library's session_alive: follow redirects and download everything.
+    ``stream`` sends a GET without following redirects and closes the connection as soon
+    as the status line and headers are in, so the body is never read. ``head`` asks for
+    the headers only, for servers that answer HEAD the same way as GET.
+
+    Raises on network errors and 5xx answers rather than calling the session dead.
+    """
+    if mode == "full":
+        return session_alive(session)
+    if mode not in PROBE_MODES:
+        raise ValueError(f"Unknown probe mode: {mode}")
+
+    if mode == "head":
+        r = session.head(WELCOMEPAGE_URL, allow_redirects=False, timeout=timeout)
+    else:
+        r = session.get(WELCOMEPAGE_URL, allow_redirects=False, stream=True, timeout=timeout)
+
+    try:
+        if r.status_code >= 500:
+            # The ERP is having trouble, which says nothing about the session
+            r.raise_for_status()
+        # Logged-out sessions get bounced to the login page; don't go there
+        if r.is_redirect or r.status_code != 200:
+            return False
+        return r.headers.get("Content-Length") == WELCOME_CONTENT_LENGTH
+    finally:
+        r.close()
@@ -0,0 +1,94 @@
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.cookiejar import DefaultCookiePolicy
+from typing import Callable, Dict, Optional
+
+from iitkgp_erp_login.logger import logger
+
+# The ERP has three security questions per account
+QUESTIONS_PER_ACCOUNT = 3
+
+# Longer than any real question; error pages easily are
+MAX_QUESTION_LENGTH = 300
+
+_SPACE_RE = re.compile(r"\s+")
+_MARKUP_RE = re.compile(r"<\s*[a-zA-Z!/]")
+
+
+def normalise_question(question: str) -> str:
+    """Key for matching questions: case, surrounding and repeated whitespace don't count."""
+    return _SPACE_RE.sub(" ", question).strip().casefold()
+
+
+def is_question(text: Optional[str]) -> bool:
+    """False for what can't be a security question: empty, too long, or an HTML (error) page."""
+    if not text or not text.strip():
+        return False
+    return len(text) <= MAX_QUESTION_LENGTH and not _MARKUP_RE.search(text)
+
+
+def find_answer(answers: Dict[str, str], question: str) -> Optional[str]:
+    """The stored answer for ``question``, tolerating whitespace/case drift on the ERP side."""
+    if question in answers:
+        return answers[question]
+    key = normalise_question(question)
+    for stored, answer in answers.items():
+        if normalise_question(stored) == key:
+            return answer
+    return None
+
+
+class NoCookiesPolicy(DefaultCookiePolicy):
+    """Neither keeps nor sends cookies, so every request looks like a brand-new visitor."""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+class StopDiscovery(Exception):
+    """Raised by a fetch function when more attempts can't help (e.g. unknown roll number)."""
+
+
+def discover_questions(fetch_one: Callable[[], str], want: int = QUESTIONS_PER_ACCOUNT,
+                       max_attempts: int = 15, concurrency: int = 4) -> list[str]:
+    """
+    Calls ``fetch_one`` (which returns one randomly served question) until ``want``
+    distinct questions have been seen or ``max_attempts`` is used up, with up to
+    ``concurrency`` calls in flight. A failed call just uses up an attempt; StopDiscovery
+    ends the search with whatever was found so far.
+    """
+    questions: list[str] = []
+    seen = set()
+    attempts = 0
+    running = set()
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="erp-question")
+    try:
+        while True:
+            while len(seen) < want and attempts < max_attempts and len(running) < concurrency:
+                running.add(pool.submit(fetch_one))
+                attempts += 1
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    question = future.result()
+                except StopDiscovery as e:
+                    logger.error(f"Security question discovery stopped: {e}")
+                    return questions
+                except Exception as e:
+                    logger.debug(f"Security question attempt failed: {e}")
+                    continue
+                key = normalise_question(question) if question else None
+                if key and key not in seen:
+                    seen.add(key)
+                    questions.append(question)
+            if len(seen) >= want:
+                break
+    finally:
+        # Early stop: calls still in flight finish in the background and are ignored
+        pool.shutdown(wait=False, cancel_futures=True)
+    return questions
@@ -0,0 +1,96 @@
+import html
+import re
+from typing import Iterable, Optional
+
+import requests
+
+from iitkgp_erp_login.endpoints import HOMEPAGE_URL
+from iitkgp_erp_login.erp import ErpLoginError
+from iitkgp_erp_login.logger import logger
+
+CHUNK_SIZE = 8 * 1024
+
+# How far back a new chunk's search starts, so a tag split across two chunks is still found
+_OVERLAP = 1024
+
+_TOKEN_TAG_RE = re.compile(rb"<(?i:input)\b[^>]*?\b(?i:id)\s*=\s*([\"']?)sessionToken\1(?=[\s/>])[^>]*>")
+_VALUE_RE = re.compile(rb"\b(?i:value)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'>]+))")
+
+
+def find_session_token(page: bytes, start: int = 0) -> Optional[str]:
+    """The value of the ``id="sessionToken"`` input in ``page``, if the whole tag is there."""
+    tag = _TOKEN_TAG_RE.search(page, start)
+    if not tag:
+        return None
+    value = _VALUE_RE.search(tag.group(0))
+    if not value:
+        return None
+    raw = next(g for g in value.groups() if g is not None)
+    return html.unescape(raw.decode("ascii", "replace"))
+
+
+def parse_session_token(page: bytes, encoding: Optional[str] = None) -> Optional[str]:
+    """Slow path: a full BeautifulSoup parse, for markup the regex doesn't understand."""
+    from bs4 import BeautifulSoup as bs
+
+    soup = bs(page, 'html.parser', from_encoding=encoding)
+    tag = soup.find(id='sessionToken')
+    return tag.get('value') if tag else None
+
+
+class TokenScanner:
+    """
+    Finds the session token in a homepage fed in chunks, so the caller can stop
+    downloading as soon as it's found. ``bytes_read`` is how much was fed.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.bytes_read = 0
+        self.token: Optional[str] = None
+        self.used_fallback = False
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        start = max(0, len(self.buffer) - _OVERLAP)
+        self.buffer += chunk
+        self.bytes_read += len(chunk)
+        self.token = find_session_token(self.buffer, start)
+        return self.token
+
+    def finish(self, encoding: Optional[str] = None) -> Optional[str]:
+        """Called when the page ended without a match: falls back to the full parse."""
+        if self.token is None:
+            self.used_fallback = True
+            logger.debug("sessionToken not found by the fast path, parsing the whole homepage")
+            self.token = parse_session_token(bytes(self.buffer), encoding)
+        return self.token
+
+
+def scan_session_token(chunks: Iterable[bytes], encoding: Optional[str] = None) -> TokenScanner:
+    """Feeds ``chunks`` until the token turns up; stops consuming them right there."""
+    scanner = TokenScanner()
+    for chunk in chunks:
+        if scanner.feed(chunk):
+            break
+    else:
+        scanner.finish(encoding)
+    return scanner
+
+
+def get_sessiontoken(session: requests.Session, log: bool = False) -> str:
+    """
+    Like iitkgp_erp_login's get_sessiontoken, but streams the homepage and stops
+    reading once the hidden input has gone past instead of parsing the whole page.
+    """
+    try:
+        with session.get(HOMEPAGE_URL, stream=True) as r:
+            # Closing early drops the rest of the body (and that keep-alive connection)
+            scanner = scan_session_token(r.iter_content(CHUNK_SIZE), r.encoding)
+        if not scanner.token:
+            raise KeyError("sessionToken")
+        if log:
+            logger.info(" Generated sessionToken")
+    except (requests.exceptions.RequestException, KeyError) as e:
+        raise ErpLoginError(f"Failed to generate sessionToken: {str(e)}")
+
+    return scanner.token
@@ -0,0 +1,106 @@
+import sys
+import threading
+import time
+from importlib.abc import MetaPathFinder
+from typing import Optional
+
+# Set by main.py before anything else is imported
+PROCESS_START: Optional[float] = None
+
+
+class _TimedLoader:
+    """Wraps a module loader so executing the module is timed."""
+
+    def __init__(self, loader, profiler: "ImportProfiler", name: str):
+        self._loader = loader
+        self._profiler = profiler
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._leave(self._name)
+
+    def __getattr__(self, item):
+        return getattr(self._loader, item)
+
+
+class ImportProfiler(MetaPathFinder):
+    """
+    Times every module import from install() on, like ``python -X importtime`` but
+    switchable from inside the app (and so usable in the frozen build too).
+
+    ``records`` holds ``(module, self_seconds, cumulative_seconds, depth)`` in import order.
+    Only imports on the thread that installed the profiler are timed.
+    """
+
+    def __init__(self):
+        self.records: list[tuple[str, float, float, int]] = []
+        self.marks: list[tuple[str, float]] = []
+        self._stack: list[list] = []
+        self._thread = threading.get_ident()
+        self._finding = False
+
+    def install(self) -> "ImportProfiler":
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        if self._finding or threading.get_ident() != self._thread:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(spec.loader, self, fullname)
+                    return spec
+            return None
+        finally:
+            self._finding = False
+
+    def mark(self, label: str):
+        """Records a milestone (e.g. "first frame") relative to process start."""
+        self.marks.append((label, time.perf_counter()))
+
+    def _enter(self, name: str):
+        # [name, started, time spent in nested imports]
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _leave(self, name: str):
+        _, started, nested = self._stack.pop()
+        cumulative = time.perf_counter() - started
+        if self._stack:
+            self._stack[-1][2] += cumulative
+        self.records.append((name, cumulative - nested, cumulative, len(self._stack)))
+
+    def report(self, top: int = 25) -> str:
+        start = PROCESS_START or (self.marks[0][1] if self.marks else time.perf_counter())
+        lines = [f"{'cumulative ms':>14}{'self ms':>10}  module (top-level imports, slowest first)"]
+        top_level = sorted((r for r in self.records if r[3] == 0), key=lambda r: r[2], reverse=True)
+        for name, self_time, cumulative, _ in top_level[:top]:
+            lines.append(f"{cumulative * 1000:>14.1f}{self_time * 1000:>10.1f}  {name}")
+
+        lines.append("")
+        lines.append(f"{'self ms':>14}  module (all imports, slowest first)")
+        for name, self_time, _, depth in sorted(self.records, key=lambda r: r[1], reverse=True)[:top]:
+            lines.append(f"{self_time * 1000:>14.1f}  {name}")
+
+        lines.append("")
+        total = sum(r[2] for r in self.records if r[3] == 0)
+        lines.append(f"{len(self.records)} modules imported in {total * 1000:.0f} ms")
+        for label, at in self.marks:
+            lines.append(f"{label}: {(at - start) * 1000:.0f} ms after start")
+        return "\n".join(lines)
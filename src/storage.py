@@ -1,11 +1,31 @@
+import atexit
+import base64
+import hmac
 import json
 import os
-from typing import Dict, Optional, Tuple
-from cryptography.fernet import Fernet, InvalidToken
-from .encryption import derive_key, generate_salt
+import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from iitkgp_erp_login.logger import logger
+from .encryption import LEGACY_KDF, configured_kdf, generate_salt, make_fernet
+
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
+
+# Runtime state (mailbox UIDs etc.) lives next to the creds inside the encrypted payload
+STATE_KEY = "_state"
+
+# vault.json layout: 1 was just salt + data (PBKDF2 with LEGACY_KDF), 2 adds the KDF header
+VAULT_VERSION = 2
+
+# Changes are written at most this often; everything that comes in meanwhile shares one write
+WRITE_DELAY = 1.0
+# After failed writes the write-behind thread waits longer and longer, up to this
+MAX_RETRY_DELAY = 60.0
 
 class StorageManager:
-    def __init__(self, filename: str = None):
+    def __init__(self, filename: str = None, kdf: Optional[Dict] = None):
         if filename is None:
             # Use a persistent user directory
             data_dir = os.path.expanduser("~/.iitkgp_erp_manager")
@@ -13,83 +33,227 @@ class StorageManager:
             self.filename = os.path.join(data_dir, "vault.json")
         else:
             self.filename = filename
-            
+
+        # KDF settings for new vaults; an unlocked vault using anything else is re-keyed to these.
+        # Set with $ERP_MANAGER_KDF (see encryption.configured_kdf) unless given here
+        self.kdf: Dict = dict(kdf or configured_kdf())
+
         self.cached_creds: Optional[Dict] = None
+        self.cached_state: Dict[str, Any] = {}
+        self._pin: Optional[str] = None
+        # The derived key is kept while unlocked so saves only have to encrypt
+        self._fernet: Optional["Fernet"] = None
+        self._salt: Optional[bytes] = None
+        self._vault_kdf: Dict = self.kdf
+
+        # Write-behind: set_state/save_credentials only update the cache and mark it dirty,
+        # a background thread writes the whole vault once per ``write_delay``
+        self.write_delay = WRITE_DELAY
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._dirty = threading.Condition(self._lock)
+        self._dirty_since: Optional[float] = None
+        self._writer: Optional[threading.Thread] = None
+        self._failures = 0
 
     def exists(self) -> bool:
         return os.path.exists(self.filename)
 
     def init_vault(self, pin: str) -> None:
         """Initializes a new empty vault secured with the PIN."""
-        salt = generate_salt()
-        key = derive_key(pin, salt)
-        fernet = Fernet(key)
-        
-        # Initial empty data
-        data = {}
-        encrypted_data = fernet.encrypt(json.dumps(data).encode())
-        
-        vault_content = {
-            "salt": base64.b64encode(salt).decode('utf-8'),
-            "data": base64.b64encode(encrypted_data).decode('utf-8')
-        }
-        
-        with open(self.filename, 'w') as f:
-            json.dump(vault_content, f)
+        with self._lock:
+            self._rekey(pin)
+
+            # Initial empty data
+            self.cached_creds = {}
+            self.cached_state = {}
+            self._pin = pin
+            self._mark_dirty()
+        self.flush()
 
     def unlock(self, pin: str) -> bool:
         """Attempts to unlock the vault with the PIN. Returns True if successful."""
         if not self.exists():
             return False
-            
+
+        from cryptography.fernet import InvalidToken
         try:
             with open(self.filename, 'r') as f:
                 vault_content = json.load(f)
-            
+
             salt = base64.b64decode(vault_content["salt"])
-            key = derive_key(pin, salt)
-            fernet = Fernet(key)
-            
+            vault_kdf = vault_content.get("kdf", LEGACY_KDF)
+            fernet = make_fernet(pin, salt, vault_kdf)
+
             encrypted_data = base64.b64decode(vault_content["data"])
             decrypted_data = fernet.decrypt(encrypted_data)
-            self.cached_creds = json.loads(decrypted_data.decode())
-            return True
+            data = json.loads(decrypted_data.decode())
         except (InvalidToken, KeyError, json.JSONDecodeError, ValueError):
             return False
 
+        with self._lock:
+            self.cached_state = data.pop(STATE_KEY, {})
+            self.cached_creds = data
+            self._pin = pin
+            self._fernet, self._salt, self._vault_kdf = fernet, salt, vault_kdf
+
+        if vault_content.get("version") != VAULT_VERSION or vault_kdf != self.kdf:
+            self._migrate(pin, vault_content.get("version", 1))
+        return True
+
+    def _migrate(self, pin: str, from_version: int):
+        """Rewrites an older or differently tuned vault with the current header and KDF."""
+        with self._lock:
+            if self._vault_kdf != self.kdf:
+                self._rekey(pin)
+            self._mark_dirty()
+        # If this fails the write-behind thread keeps trying
+        if self.flush():
+            logger.info(f"Migrated vault from version {from_version} to {VAULT_VERSION} ({self._vault_kdf['name']}).")
+
     def save_credentials(self, pin: str, creds: Dict) -> bool:
-        """Saves credentials to the vault."""
-        # We need to re-encrypt everything with the PIN derived key
-        # Ideally, we should already have the key if unlocked, but for safety
-        # we re-derive since we don't store the key permanently in memory?
-        # Actually storage manager keeps cached_creds, but not the key.
-        # So we strictly need the PIN to save.
-        
-        try:
-            with open(self.filename, 'r') as f:
-                vault_content = json.load(f)
-            salt = base64.b64decode(vault_content["salt"])
-        except:
-             # If file is corrupted or missing, start fresh
-             salt = generate_salt()
-
-        key = derive_key(pin, salt)
-        fernet = Fernet(key)
-        
-        encrypted_data = fernet.encrypt(json.dumps(creds).encode())
-        
-        new_vault_content = {
+        """Saves credentials to the vault, written straight away. Returns False if that failed."""
+        with self._lock:
+            # The key derived at unlock is reused; only a different PIN costs a new derivation
+            if self._fernet is None or self._pin is None or not hmac.compare_digest(pin.encode(), self._pin.encode()):
+                self._rekey(pin)
+
+            self.cached_creds = creds
+            self._pin = pin
+            self._mark_dirty()
+        # Unlike runtime state, the user is told whether this made it to disk
+        return self.flush()
+
+    def get_credentials(self) -> Optional[Dict]:
+        return self.cached_creds
+
+    def get_accounts(self) -> List[Dict]:
+        """Every account to keep logged in: the one from Settings first, then any extras."""
+        accounts = []
+        primary = (self.cached_creds or {}).get('roll_number')
+        if primary:
+            accounts.append(self.cached_creds)
+        for creds in self.get_state("accounts", []):
+            if creds.get('roll_number') and creds.get('roll_number') != primary:
+                accounts.append(creds)
+        return accounts
+
+    def save_accounts(self, accounts: List[Dict]) -> bool:
+        """Stores the extra accounts (everything but the Settings one), written straight away."""
+        primary = (self.cached_creds or {}).get('roll_number')
+        return self.set_state("accounts", [c for c in accounts if c.get('roll_number') != primary]) and self.flush()
+
+    def get_state(self, name: str, default: Any = None) -> Any:
+        """Returns a piece of runtime state stored alongside the credentials."""
+        return self.cached_state.get(name, default)
+
+    def set_state(self, name: str, value: Any) -> bool:
+        """Stores a piece of runtime state. Only possible once the vault is unlocked."""
+        with self._lock:
+            if self._fernet is None:
+                return False
+
+            state = dict(self.cached_state)
+            state[name] = value
+            self.cached_state = state
+            self._mark_dirty()
+        return True
+
+    def flush(self) -> bool:
+        """Writes pending changes now. Returns False if the write failed."""
+        with self._write_lock:
+            with self._lock:
+                if self._dirty_since is None:
+                    return True
+                snapshot = (dict(self.cached_creds or {}), self.cached_state,
+                            self._fernet, self._salt, self._vault_kdf)
+                self._dirty_since = None
+            try:
+                self._write_vault(*snapshot)
+            except Exception as e:
+                # Anything (a full disk, state that isn't JSON) must leave the changes pending
+                logger.error(f"Failed to write vault: {e}")
+                with self._lock:
+                    self._failures += 1
+                    if self._dirty_since is None:
+                        self._mark_dirty()
+                return False
+            with self._lock:
+                self._failures = 0
+            return True
+
+    def _mark_dirty(self):
+        # Caller holds self._lock
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_behind, name="vault-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+        self._dirty.notify()
+
+    def _write_behind(self):
+        while True:
+            with self._lock:
+                while self._dirty_since is None:
+                    self._dirty.wait()
+                delay = min(self.write_delay * 2 ** self._failures, MAX_RETRY_DELAY)
+                due = self._dirty_since + delay
+                while self._dirty_since is not None and time.monotonic() < due:
+                    self._dirty.wait(due - time.monotonic())
+            try:
+                self.flush()
+            except Exception as e:
+                # Never let the thread die: _writer stays set, so nothing would restart it
+                logger.error(f"Vault writer error: {e}")
+
+    def _rekey(self, pin: str):
+        """New salt and key for ``pin`` with the configured KDF."""
+        self._salt = generate_salt()
+        self._vault_kdf = dict(self.kdf)
+        self._fernet = make_fernet(pin, self._salt, self._vault_kdf)
+
+    def _write_vault(self, creds: Dict, state: Optional[Dict], fernet: "Fernet", salt: bytes, kdf: Dict) -> None:
+        data = dict(creds)
+        if state:
+            data[STATE_KEY] = state
+        encrypted_data = fernet.encrypt(json.dumps(data).encode())
+
+        vault_content = {
+            "version": VAULT_VERSION,
+            "kdf": kdf,
             "salt": base64.b64encode(salt).decode('utf-8'),
             "data": base64.b64encode(encrypted_data).decode('utf-8')
         }
-        
-        with open(self.filename, 'w') as f:
-            json.dump(new_vault_content, f)
-            
-        self.cached_creds = creds
-        return True
 
-    def get_credentials(self) -> Optional[Dict]:
-        return self.cached_creds
-        
-import base64
+        # Write a temp file next to the vault and rename it over, so a crash (or another
+        # writer) can never leave a half-written vault.json behind
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp_path = tempfile.mkstemp(prefix=".vault-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(vault_content, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.filename)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        _fsync_dir(directory)
+
+
+def _fsync_dir(directory: str):
+    """Makes the rename itself durable. Not possible (or needed) on Windows."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,243 @@
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, NamedTuple, Optional
+
+from iitkgp_erp_login.logger import logger
+
+# Upper bounds (seconds) of the duration histogram buckets: sub-second HTTP stages up to
+# OTP mails that take a minute or two to arrive
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# How many finished spans are kept around for inspection
+RECENT_SPANS = 256
+
+
+class Span(NamedTuple):
+    """One timed step: ``outcome`` is "ok", "error", "timeout" or a stage-specific word like "dead"."""
+    stage: str
+    seconds: float
+    outcome: str
+    retries: int
+    started: float  # wall clock
+
+
+class _OpenSpan:
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.outcome = "ok"
+        self.retries = 0
+
+
+class Telemetry:
+    """
+    Timing spans and the counters/histograms built from them. Thread-safe.
+
+        with TELEMETRY.span("signin"):
+            ...
+
+    A span that exits with an exception gets the outcome "error" ("timeout" for timeouts)
+    unless the code inside set one. ERPSession adds its retries to the span open on the
+    calling thread. prometheus_text() renders everything in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.recent: deque[Span] = deque(maxlen=RECENT_SPANS)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (stage, outcome) -> [bucket counts..., +Inf count, sum]
+        self._histograms: dict[tuple[str, str], list] = {}
+        self._retries: dict[str, int] = {}
+        # (name, ((label, value), ...)) -> count; plain counters like HTTP requests
+        self._counters: dict[tuple[str, tuple], int] = {}
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[_OpenSpan]:
+        current = _OpenSpan(stage)
+        stack = self._stack()
+        stack.append(current)
+        started, wall = time.perf_counter(), time.time()
+        try:
+            yield current
+        except BaseException as e:
+            if current.outcome == "ok":
+                current.outcome = "timeout" if isinstance(e, TimeoutError) or "Timeout" in type(e).__name__ else "error"
+            raise
+        finally:
+            stack.pop()
+            self.record(Span(stage, time.perf_counter() - started, current.outcome, current.retries, wall))
+
+    def call(self, stage: str, fn, *args, **kwargs):
+        """``fn(*args, **kwargs)`` inside a span."""
+        with self.span(stage):
+            return fn(*args, **kwargs)
+
+    def current(self) -> Optional[_OpenSpan]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def note_retry(self):
+        span = self.current()
+        if span is not None:
+            span.retries += 1
+
+    def record(self, span: Span):
+        with self._lock:
+            hist = self._histograms.get((span.stage, span.outcome))
+            if hist is None:
+                hist = self._histograms[(span.stage, span.outcome)] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if span.seconds <= bound:
+                    hist[i] += 1
+            hist[len(BUCKETS)] += 1
+            hist[-1] += span.seconds
+            self._retries[span.stage] = self._retries.get(span.stage, 0) + span.retries
+            self.recent.append(span)
+        logger.debug(f"span stage={span.stage} seconds={span.seconds:.3f} outcome={span.outcome} retries={span.retries}")
+
+    def incr(self, name: str, n: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def quantile(self, stage: str, q: float, outcome: str = "ok") -> Optional[float]:
+        """Estimated like Prometheus' histogram_quantile (linear within the bucket)."""
+        with self._lock:
+            hist = self._histograms.get((stage, outcome))
+            hist = list(hist) if hist else None
+        if not hist or not hist[len(BUCKETS)]:
+            return None
+        rank = q * hist[len(BUCKETS)]
+        lower, below = 0.0, 0
+        for bound, count in zip(BUCKETS, hist):
+            if count >= rank:
+                return lower + (bound - lower) * (rank - below) / max(1, count - below)
+            lower, below = bound, count
+        return BUCKETS[-1]
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            histograms = {key: list(hist) for key, hist in self._histograms.items()}
+            retries = dict(self._retries)
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP erp_stage_duration_seconds Time spent in each login / IMAP / probe stage.",
+            "# TYPE erp_stage_duration_seconds histogram",
+        ]
+        for (stage, outcome), hist in sorted(histograms.items()):
+            labels = f'stage="{stage}",outcome="{outcome}"'
+            for bound, count in zip(BUCKETS, hist):
+                lines.append(f'erp_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'erp_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {hist[len(BUCKETS)]}')
+            lines.append(f"erp_stage_duration_seconds_sum{{{labels}}} {hist[-1]:.6f}")
+            lines.append(f"erp_stage_duration_seconds_count{{{labels}}} {hist[len(BUCKETS)]}")
+
+        lines.append("# HELP erp_stage_retries_total Retries made inside each stage.")
+        lines.append("# TYPE erp_stage_retries_total counter")
+        for stage, n in sorted(retries.items()):
+            lines.append(f'erp_stage_retries_total{{stage="{stage}"}} {n}')
+
+        last_name = None
+        for (name, labels), n in sorted(counters.items()):
+            if name != last_name:
+                lines.append(f"# TYPE {name} counter")
+                last_name = name
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {n}" if label_text else f"{name} {n}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Writes the metrics for node_exporter's textfile collector (atomically, it reads whenever)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+# The process-wide instance everything reports to
+TELEMETRY = Telemetry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.telemetry.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter:
+    """
+    Serves /metrics on ``port`` (localhost only) and/or rewrites ``path`` every
+    ``interval`` seconds, from background threads.
+    """
+
+    def __init__(self, telemetry: Telemetry = TELEMETRY, port: Optional[int] = None,
+                 path: Optional[str] = None, interval: float = 15, host: str = "127.0.0.1"):
+        self.telemetry = telemetry
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self.host = host
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+
+    def start(self) -> "MetricsExporter":
+        if self.port is not None:
+            self.server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+            self.server.daemon_threads = True
+            self.server.telemetry = self.telemetry
+            self.port = self.server.server_address[1]
+            threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"Metrics at http://{self.host}:{self.port}/metrics")
+        if self.path:
+            threading.Thread(target=self._write_loop, name="metrics-file", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.path:
+            self._write()
+
+    def _write_loop(self):
+        while True:
+            self._write()
+            if self._stop.wait(self.interval):
+                return
+
+    def _write(self):
+        try:
+            self.telemetry.write_prometheus(self.path)
+        except OSError as e:
+            logger.error(f"Could not write metrics to {self.path}: {e}")
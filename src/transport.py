@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from iitkgp_erp_login.endpoints import HOMEPAGE_URL, LOGIN_URL, OTP_URL, SECRET_QUESTION_URL, WELCOMEPAGE_URL
+from iitkgp_erp_login.logger import logger
+
+from .probe import PROBE_DEADLINE, PROBE_TIMEOUT
+from .telemetry import TELEMETRY
+
+# Which login stage a request belongs to, by path
+STAGES = {
+    urlsplit(HOMEPAGE_URL).path: "homepage",
+    urlsplit(SECRET_QUESTION_URL).path: "question",
+    urlsplit(OTP_URL).path: "otp",
+    urlsplit(LOGIN_URL).path: "signin",
+    urlsplit(WELCOMEPAGE_URL).path: "probe",
+}
+
+# (connect, read) seconds per stage. The OTP request and sign-in are slow on a busy ERP
+STAGE_TIMEOUTS = {
+    "homepage": (3.05, 10),
+    "question": (3.05, 10),
+    "otp": (3.05, 20),
+    "signin": (3.05, 20),
+    "probe": PROBE_TIMEOUT,
+}
+DEFAULT_TIMEOUT = (3.05, 20)
+
+# Seconds all attempts of a request together may take, for stages that have a limit.
+# Each attempt's timeouts are cut down to what's left, and no retry starts without this much
+# of it.
+STAGE_DEADLINES = {"probe": PROBE_DEADLINE}
+MIN_ATTEMPT = 0.5
+
+# Only stages that can be sent twice without side effects are retried. The question
+# POST rotates the question and the OTP/sign-in POSTs must never be doubled, so for those
+# (and anything else) a 4xx/5xx raises instead: the error page must not be parsed as an answer.
+IDEMPOTENT_STAGES = {"homepage", "probe"}
+RETRY_STATUSES = {502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 4.0
+
+# One host, but a login, a probe and the question discovery can overlap
+POOL_MAXSIZE = 8
+
+
+def stage_for(url: str) -> str:
+    return STAGES.get(urlsplit(url).path, "other")
+
+
+def clip_timeout(timeout, remaining: float):
+    """``timeout`` (a number or a (connect, read) pair) with no part longer than ``remaining``."""
+    remaining = max(remaining, 0.001)
+    if isinstance(timeout, tuple):
+        return tuple(min(t, remaining) if t is not None else remaining for t in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class TransportMetrics:
+    """
+    Per-stage request, retry, timeout and error counters. Thread-safe. Every count also
+    goes to the process-wide telemetry as ``erp_http_<kind>_total{stage=...}``.
+    """
+
+    KINDS = ("requests", "retries", "timeouts", "errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: dict[str, dict[str, int]] = defaultdict(lambda: dict.fromkeys(self.KINDS, 0))
+
+    def incr(self, stage: str, kind: str, n: int = 1):
+        with self._lock:
+            self._counts[stage][kind] += n
+        TELEMETRY.incr(f"erp_http_{kind}_total", n, stage=stage)
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {stage: dict(counts) for stage, counts in self._counts.items()}
+
+    def totals(self) -> dict[str, int]:
+        totals = dict.fromkeys(self.KINDS, 0)
+        for counts in self.snapshot().values():
+            for kind, n in counts.items():
+                totals[kind] += n
+        return totals
+
+
+class ERPSession(requests.Session):
+    """
+    A requests.Session for the ERP that never waits forever.
+
+    Every request gets its stage's (connect, read) timeout unless the caller passes one,
+    idempotent stages are retried with jittered backoff on connection errors, timeouts
+    and 502/503/504 (within the stage's deadline, if it has one), the others raise on
+    4xx/5xx, and everything is counted in ``metrics``. Since the library's login
+    helpers only see a Session, this is where the policy has to live.
+    """
+
+    def __init__(self, metrics: Optional[TransportMetrics] = None, timeouts: Optional[dict] = None,
+                 max_retries: int = MAX_RETRIES, pool_maxsize: int = POOL_MAXSIZE):
+        super().__init__()
+        self.metrics = metrics or TransportMetrics()
+        self.timeouts = dict(STAGE_TIMEOUTS, **(timeouts or {}))
+        self.deadlines = dict(STAGE_DEADLINES)
+        self.max_retries = max_retries
+
+        # Keep-alive is on by default; size the pool so parallel work doesn't churn connections.
+        # urllib3's own retries stay off, the policy below decides what may be repeated.
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, max_retries=0)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        stage = stage_for(url)
+        timeout = kwargs.get("timeout")
+        if timeout is None:
+            timeout = self.timeouts.get(stage, DEFAULT_TIMEOUT)
+        idempotent = stage in IDEMPOTENT_STAGES
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        deadline = time.monotonic() + self.deadlines[stage] if stage in self.deadlines else None
+
+        for attempt in range(attempts):
+            delay = backoff(attempt)
+            kwargs["timeout"] = timeout if deadline is None else clip_timeout(timeout, deadline - time.monotonic())
+            self.metrics.incr(stage, "requests")
+            try:
+                r = super().request(method, url, *args, **kwargs)
+            except requests.Timeout:
+                self.metrics.incr(stage, "timeouts")
+                if self._last_attempt(attempt, attempts, deadline, delay):
+                    raise
+            except requests.ConnectionError:
+                self.metrics.incr(stage, "errors")
+                if self._last_attempt(attempt, attempts, deadline, delay):
+                    raise
+            else:
+                if not idempotent:
+                    if r.status_code >= 400:
+                        self.metrics.incr(stage, "errors")
+                    r.raise_for_status()
+                    return r
+                if r.status_code not in RETRY_STATUSES:
+                    return r
+                self.metrics.incr(stage, "errors")
+                if self._last_attempt(attempt, attempts, deadline, delay):
+                    return r
+                r.close()
+
+            logger.debug(f"Retrying {stage} in {delay:.2f}s (attempt {attempt + 2}/{attempts})")
+            self.metrics.incr(stage, "retries")
+            TELEMETRY.note_retry()
+            time.sleep(delay)
+
+    def fork(self) -> "ERPSession":
+        """
+        A session with an empty cookie jar but the same policy, metrics and adapters (so the
+        same connection pool), for a login that mustn't touch this session's cookies.
+        """
+        other = ERPSession(self.metrics, self.timeouts, self.max_retries)
+        other.deadlines = dict(self.deadlines)
+        for prefix, adapter in self.adapters.items():
+            other.mount(prefix, adapter)
+        return other
+
+    @staticmethod
+    def _last_attempt(attempt: int, attempts: int, deadline: Optional[float], delay: float) -> bool:
+        if attempt == attempts - 1:
+            return True
+        return deadline is not None and deadline - time.monotonic() - delay < MIN_ATTEMPT